@@ -0,0 +1,100 @@
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from limpeza import limpar_catser
+
+# Compara a limpeza vetorizada do CATSER com o laço linha a linha que o
+# fix_process.clean_catser usava, num catálogo sintético no formato da
+# planilha "Lista CATSER.xlsx" lida com header=None.
+
+
+def catalogo_sintetico(linhas, seed=0):
+    rng = np.random.default_rng(seed)
+    codigos = rng.integers(10, 999999, size=linhas)
+    descricoes = np.array([f"SERVICO DE TESTE {i} - MANUTENCAO" for i in range(1000)], dtype=object)
+    desc = descricoes[rng.integers(0, 1000, size=linhas)]
+    tipo = rng.random(linhas)
+
+    col_codigo = codigos.astype(object)
+    col_desc = desc.copy()
+    # ~20% com código e descrição juntos na mesma célula
+    juntos = tipo < 0.2
+    col_codigo[juntos] = [f"{c}                   {d}" for c, d in zip(codigos[juntos], desc[juntos])]
+    col_desc[juntos] = np.nan
+    # ~2% de linhas vazias/lixo
+    vazias = (tipo >= 0.2) & (tipo < 0.22)
+    col_codigo[vazias] = np.nan
+    col_desc[vazias] = np.nan
+
+    grupos = np.array(['NAO SE APLICA', 'SERVI¿S  DE DESENVOLVIMENTO E MANUTEN¿O DE SOFTWARE'], dtype=object)
+    corpo = pd.DataFrame({
+        0: grupos[rng.integers(0, 2, size=linhas)],
+        1: 'SERVIÇOS  DE DESENVOLVIMENTO DE SOFTWARE',
+        2: col_codigo,
+        3: col_desc,
+    })
+    topo = pd.DataFrame({0: [np.nan, np.nan, 'Grupo'], 1: [np.nan, np.nan, 'Classe'],
+                         2: [np.nan, np.nan, 'Codigo                Descrição'], 3: [np.nan] * 3})
+    return pd.concat([topo, corpo], ignore_index=True).astype(object)
+
+
+def limpar_catser_laco(df_raw):
+    # Laço original de fix_process.clean_catser
+    data = []
+    for i in range(3, len(df_raw)):
+        row = df_raw.iloc[i]
+        grupo = str(row[0]).strip()
+        classe = str(row[1]).strip()
+        codigo = str(row[2]).strip()
+        descricao = str(row[3]).strip() if len(row) > 3 else ""
+        if (not descricao or descricao == 'nan') and codigo:
+            match = re.match(r'^(\d+)\s*(.*)', codigo)
+            if match:
+                codigo_clean = match.group(1)
+                descricao = match.group(2).strip()
+                codigo = codigo_clean
+        if codigo and codigo != 'nan' and len(codigo) > 1:
+            data.append({'codigo': codigo, 'descricao': descricao, 'Grupo': grupo, 'Classe': classe})
+    df_final = pd.DataFrame(data)
+    df_final = df_final.dropna(subset=['descricao'])
+    return df_final[df_final['descricao'] != 'nan']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da limpeza do CATSER")
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    parser.add_argument('--amostra-laco', type=int, default=50_000,
+                        help="linhas usadas para medir o laço antigo (extrapolado para --linhas)")
+    args = parser.parse_args()
+
+    df_raw = catalogo_sintetico(args.linhas)
+
+    t = time.perf_counter()
+    vetorizado = limpar_catser(df_raw)
+    t_vet = time.perf_counter() - t
+
+    amostra = df_raw.iloc[:args.amostra_laco + 3]
+    t = time.perf_counter()
+    laco = limpar_catser_laco(amostra)
+    t_laco = (time.perf_counter() - t) * args.linhas / max(len(amostra) - 3, 1)
+
+    # A saída tem que ser idêntica à do laço (mesmo CSV)
+    esperado = laco.to_csv(index=False)
+    obtido = limpar_catser(amostra).to_csv(index=False)
+    print(f"Saída idêntica ao laço na amostra: {'sim' if esperado == obtido else 'NÃO'}")
+
+    print(f"Linhas: {args.linhas} ({len(vetorizado)} válidas)")
+    print(f"Vetorizado: {t_vet:.2f}s")
+    print(f"Laço iloc (extrapolado de {len(amostra) - 3} linhas): {t_laco:.2f}s")
+    print(f"Ganho: {t_laco / t_vet:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
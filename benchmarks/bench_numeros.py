@@ -0,0 +1,74 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from numeros_br import converter_colunas
+from planilhas_limpas import ler_matriz_uf
+
+# Compara o conversor por coluna com o clean_num célula a célula que o
+# importar_para_supabase usava, na matriz de preços por UF do SINAPI
+# (itens x 27 UFs) formatada como texto pt-BR ('1.234,56'), repetida até
+# --linhas itens.
+
+
+def clean_num(val):
+    # Versão original do importar_para_supabase
+    if pd.isna(val) or str(val).strip() == '': return None
+    try:
+        s = str(val).replace('.', '').replace(',', '.').replace('R$', '').strip()
+        return float(s)
+    except:
+        return None
+
+
+def matriz_texto(matriz, ufs, linhas):
+    repeticoes = -(-linhas // len(matriz))
+    valores = np.tile(np.asarray(matriz, dtype=np.float64), (repeticoes, 1))[:linhas]
+    df = pd.DataFrame(valores, columns=ufs)
+    # pt-BR com separador de milhar: 1234.5 -> '1.234,50'
+    return df.apply(lambda col: col.map(lambda v: f"{v:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da conversão de números pt-BR")
+    parser.add_argument('--csv', default=os.path.join('Planilhas_Limpas', 'sinapi_limpo.csv'))
+    parser.add_argument('--linhas', type=int, default=100_000)
+    args = parser.parse_args()
+
+    _, ufs, matriz = ler_matriz_uf(args.csv)
+    df = matriz_texto(matriz, list(ufs), args.linhas)
+    print(f"Matriz: {df.shape[0]} itens x {df.shape[1]} UFs ({df.size} células)")
+
+    t = time.perf_counter()
+    laco = df.apply(lambda col: col.map(clean_num))
+    t_laco = time.perf_counter() - t
+
+    vetorizado = df.copy()
+    t = time.perf_counter()
+    invalidos = converter_colunas(vetorizado, list(ufs))
+    t_vet = time.perf_counter() - t
+
+    iguais = np.allclose(laco.to_numpy(np.float64), vetorizado.to_numpy(np.float64), equal_nan=True)
+    print(f"Mesmos valores do clean_num: {'sim' if iguais else 'NÃO'} (inválidas: {sum(invalidos.values())})")
+
+    # Os floats simples ('0.2034') que o clean_num estragava
+    simples = pd.DataFrame(np.asarray(matriz[:1000], dtype=np.float64), columns=ufs).astype(str)
+    errados = (simples.apply(lambda col: col.map(clean_num)).to_numpy(np.float64)
+               != simples.astype(np.float64).to_numpy()).sum()
+    convertidos = simples.copy()
+    converter_colunas(convertidos, list(ufs))
+    certos = np.array_equal(convertidos.to_numpy(np.float64), simples.astype(np.float64).to_numpy())
+    print(f"Floats simples: clean_num erra {errados} de {simples.size}; conversor {'acerta todos' if certos else 'ERRA'}")
+
+    print(f"clean_num por célula: {t_laco:.2f}s")
+    print(f"Por coluna: {t_vet:.2f}s")
+    print(f"Ganho: {t_laco / t_vet:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
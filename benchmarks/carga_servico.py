@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from urllib.parse import quote, urlsplit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Teste de carga do servico_busca: N conexões keep-alive em paralelo
+# mandando buscas sem parar por um tempo fixo; mostra as requisições por
+# segundo sustentadas e a latência (p50/p95/p99/máx).
+#
+#   python servico_busca.py --workers 4 &
+#   python benchmarks/carga_servico.py --conexoes 32 --duracao 30
+#   python benchmarks/carga_servico.py --sinteticos   (servidor em benchmarks/dados/<n>/Planilhas_Limpas)
+#
+# O cliente é um processo só (asyncio); se ele chegar a 100% de CPU antes do
+# servidor, o número medido é o do cliente.
+
+TERMOS = ['cimento', 'dipirona', 'limpeza', 'pedreiro', 'paracetamol', 'manutencao', 'eletricista',
+          'servente', 'amoxicilina', 'locacao', 'pintura', 'vigilancia', 'concreto', 'ibuprofeno',
+          'consultoria', 'encanador', 'losartana', 'transporte', 'limp', 'dipirona sodica']
+
+
+async def _requisicao(reader, writer, caminho, host):
+    writer.write(f"GET {caminho} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode('latin-1'))
+    await writer.drain()
+    cabecalho = await reader.readuntil(b'\r\n\r\n')
+    linhas = cabecalho.decode('latin-1').split('\r\n')
+    status = int(linhas[0].split(' ')[1])
+    tamanho, fechar = 0, False
+    for linha in linhas[1:]:
+        nome, _, valor = linha.partition(':')
+        if nome.lower() == 'content-length':
+            tamanho = int(valor)
+        elif nome.lower() == 'connection':
+            fechar = valor.strip().lower() == 'close'
+    await reader.readexactly(tamanho)
+    return status, fechar
+
+
+async def _cliente(host, porta, caminhos, fim, inicio_medicao, latencias, contagem, seed):
+    rng = np.random.default_rng(seed)
+    conexao = None
+    while time.monotonic() < fim:
+        caminho = caminhos[int(rng.integers(len(caminhos)))]
+        # Uma nova tentativa numa conexão nova: o servidor pode fechar uma
+        # conexão ociosa (troca de geração) bem quando a requisição sai
+        for tentativa in range(2):
+            try:
+                if conexao is None:
+                    conexao = await asyncio.open_connection(host, porta)
+                inicio = time.monotonic()
+                status, fechar = await _requisicao(*conexao, caminho, host)
+                agora = time.monotonic()
+                if inicio >= inicio_medicao:
+                    latencias.append((agora, agora - inicio))
+                    contagem[status] = contagem.get(status, 0) + 1
+                if fechar:
+                    conexao[1].close()
+                    conexao = None
+                break
+            except (ConnectionError, asyncio.IncompleteReadError, OSError) as e:
+                if conexao is not None:
+                    conexao[1].close()
+                conexao = None
+                if tentativa:
+                    contagem[type(e).__name__] = contagem.get(type(e).__name__, 0) + 1
+    if conexao is not None:
+        conexao[1].close()
+
+
+async def carga(url, termos, conexoes, duracao, aquecimento, aproximada, catalogo, limite):
+    partes = urlsplit(url)
+    host, porta = partes.hostname, partes.port or 80
+    extra = f"&limite={limite}" + (f"&catalogo={catalogo}" if catalogo else '')
+    caminhos = [f"/buscar?q={quote(t)}{extra}" for t in termos]
+    if aproximada:
+        # Fração aproximada das buscas com '~' (tolerante a erros)
+        n = int(len(caminhos) * aproximada)
+        caminhos += [f"/buscar?q={quote('~' + t)}{extra}" for t in termos[:max(n, 1)]]
+
+    latencias, contagem = [], {}
+    agora = time.monotonic()
+    inicio_medicao, fim = agora + aquecimento, agora + aquecimento + duracao
+    await asyncio.gather(*(_cliente(host, porta, caminhos, fim, inicio_medicao, latencias, contagem, i)
+                           for i in range(conexoes)))
+    return inicio_medicao, latencias, contagem
+
+
+def resumir(inicio_medicao, latencias, contagem, duracao):
+    if not latencias:
+        return {'requisicoes': 0, 'contagem': contagem}
+    momentos = np.array([m for m, _ in latencias])
+    ms = np.array([l for _, l in latencias]) * 1000
+    # Requisições por segundo, segundo a segundo, para ver se a vazão se sustenta
+    por_segundo = np.bincount((momentos - inicio_medicao).astype(np.int64))[:int(duracao)]
+    return {'requisicoes': len(ms), 'qps': len(ms) / duracao,
+            'qps_min_s': int(por_segundo.min()) if len(por_segundo) else 0,
+            'qps_mediana_s': float(np.median(por_segundo)) if len(por_segundo) else 0,
+            'p50_ms': float(np.percentile(ms, 50)), 'p95_ms': float(np.percentile(ms, 95)),
+            'p99_ms': float(np.percentile(ms, 99)), 'max_ms': float(ms.max()), 'contagem': contagem}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do servico_busca")
+    parser.add_argument('--url', default='http://127.0.0.1:8765')
+    parser.add_argument('--conexoes', type=int, default=32, help="conexões simultâneas")
+    parser.add_argument('--duracao', type=float, default=20.0, help="segundos medidos")
+    parser.add_argument('--aquecimento', type=float, default=3.0, help="segundos iniciais descartados")
+    parser.add_argument('--aproximada', type=float, default=0.2, help="fração de buscas aproximadas")
+    parser.add_argument('--catalogo', help="ex.: CMED (padrão: os três)")
+    parser.add_argument('--limite', type=int, default=5)
+    parser.add_argument('--termos', help="arquivo com um termo por linha")
+    parser.add_argument('--sinteticos', action='store_true', help="termos do vocabulário de sinteticos.py")
+    parser.add_argument('-o', '--saida', help="grava o resumo em JSON")
+    args = parser.parse_args()
+
+    if args.termos:
+        with open(args.termos, encoding='utf-8') as f:
+            termos = [linha.strip() for linha in f if linha.strip()]
+    elif args.sinteticos:
+        from suite import consultas_busca
+        termos = consultas_busca(500)
+    else:
+        termos = TERMOS
+
+    print(f"{args.conexoes} conexões, {args.duracao:.0f}s (+{args.aquecimento:.0f}s de aquecimento) em {args.url}")
+    inicio, latencias, contagem = asyncio.run(carga(args.url, termos, args.conexoes, args.duracao,
+                                                     args.aquecimento, args.aproximada, args.catalogo,
+                                                     args.limite))
+    r = resumir(inicio, latencias, contagem, args.duracao)
+    if not r['requisicoes']:
+        print(f"Nenhuma requisição respondida: {contagem}")
+        return 1
+    print(f"{r['requisicoes']} requisições, {r['qps']:.0f} req/s (por segundo: mín {r['qps_min_s']}, "
+          f"mediana {r['qps_mediana_s']:.0f})")
+    print(f"latência p50 {r['p50_ms']:.1f} ms, p95 {r['p95_ms']:.1f} ms, p99 {r['p99_ms']:.1f} ms, "
+          f"máx {r['max_ms']:.1f} ms")
+    print(f"respostas: {r['contagem']}")
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump({'url': args.url, 'conexoes': args.conexoes, 'duracao': args.duracao, **r}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
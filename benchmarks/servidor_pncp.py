@@ -0,0 +1,142 @@
+import argparse
+import json
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# PNCP local para testar o coletar_pncp sem a API de verdade: responde a
+# consulta de contratações (paginada por modalidade) e os /itens de cada
+# contrato, com dados gerados a partir do número do contrato.
+#
+# Os órgãos se revezam (contrato i é do órgão i % ORGAOS) e o sequencial é
+# modalidade * 1000 + i // ORGAOS + 1, então a mesma página tem contratos
+# de órgãos diferentes com o mesmo sequencialCompra. Com erro_429_a_cada=N, uma requisição a
+# cada N volta 429 (Retry-After: 0).
+#
+#   python benchmarks/servidor_pncp.py --porta 8080 --contratos 500
+#   python coletar_pncp.py --base-url http://localhost:8080 --saida itens.jsonl
+
+ORGAOS = 3
+ANO = 2026
+CAMINHO_CONSULTA = "/consulta/v1/contratacoes/publicacao"
+CAMINHO_ITENS = re.compile(r"/pncp/v1/orgaos/(\d+)/compras/(\d+)/(\d+)/itens")
+
+
+def contrato(mod, i):
+    cnpj = f"{i % ORGAOS + 1:014d}"
+    return {
+        'orgaoEntidade': {'cnpj': cnpj, 'razaoSocial': f"Órgão {i % ORGAOS + 1}", 'ufSigla': 'MG'},
+        'unidadeOrgao': {'municipioNome': 'Belo Horizonte', 'ufSigla': 'MG'},
+        'anoCompra': ANO,
+        'sequencialCompra': mod * 1000 + i // ORGAOS + 1,
+        'dataPublicacaoPncp': '2026-03-05T10:00:00',
+        'modalidadeNome': f"Modalidade {mod}",
+    }
+
+
+def itens(cnpj, seq, quantidade):
+    return [{'descricao': f"Item {k} do contrato {int(cnpj)}/{seq}", 'unidadeMedida': 'UN', 'quantidade': 1,
+             'valorUnitarioHomologado': float(k + 1), 'valorTotal': float(k + 1)} for k in range(quantidade)]
+
+
+class ServidorPNCP:
+    # contratos: {modalidade: quantidade de contratos}
+    def __init__(self, contratos, itens_por_contrato=2, erro_429_a_cada=0, porta=0):
+        self.contratos = contratos
+        self.itens_por_contrato = itens_por_contrato
+        self.erro_429_a_cada = erro_429_a_cada
+        self.requisicoes = 0
+        self.respostas_429 = 0
+        self.paginas = []  # (modalidade, página) de cada consulta respondida
+        self._trava = threading.Lock()
+        self._http = ThreadingHTTPServer(('127.0.0.1', porta), self._tratador())
+        self._http.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._http.server_address[1]}"
+
+    def _tratador(self):
+        servidor = self
+
+        class Tratador(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                status, corpo = servidor.responder(self.path)
+                self.send_response(status)
+                if status == 429:
+                    self.send_header('Retry-After', '0')
+                dados = json.dumps(corpo).encode('utf-8') if corpo is not None else b''
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+        return Tratador
+
+    def responder(self, caminho):
+        # (status, corpo JSON ou None)
+        with self._trava:
+            self.requisicoes += 1
+            if self.erro_429_a_cada and self.requisicoes % self.erro_429_a_cada == 0:
+                self.respostas_429 += 1
+                return 429, None
+        partes = urlsplit(caminho)
+        if partes.path == CAMINHO_CONSULTA:
+            params = {k: v[0] for k, v in parse_qs(partes.query).items()}
+            mod = int(params['codigoModalidadeContratacao'])
+            pagina, tamanho = int(params['pagina']), int(params['tamanhoPagina'])
+            total = self.contratos.get(mod, 0)
+            inicio = (pagina - 1) * tamanho
+            if inicio >= total:
+                return 204, None
+            with self._trava:
+                self.paginas.append((mod, pagina))
+            return 200, {'data': [contrato(mod, i) for i in range(inicio, min(inicio + tamanho, total))],
+                         'totalRegistros': total, 'totalPaginas': -(-total // tamanho)}
+        m = CAMINHO_ITENS.fullmatch(partes.path)
+        if m:
+            return 200, itens(m.group(1), int(m.group(3)), self.itens_por_contrato)
+        return 404, None
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._http.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._http.shutdown()
+        self._http.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PNCP local para testar o coletar_pncp")
+    parser.add_argument('--porta', type=int, default=8080)
+    parser.add_argument('--contratos', type=int, default=500, help="contratos por modalidade")
+    parser.add_argument('--modalidades', default="6,13,8,10,14,15")
+    parser.add_argument('--itens', type=int, default=2, help="itens por contrato")
+    parser.add_argument('--erro-429-a-cada', type=int, default=0, help="uma requisição a cada N volta 429")
+    args = parser.parse_args()
+
+    contratos = {int(m): args.contratos for m in args.modalidades.split(',') if m.strip()}
+    with ServidorPNCP(contratos, args.itens, args.erro_429_a_cada, args.porta) as servidor:
+        print(f"PNCP local em {servidor.url} (Ctrl+C para parar)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from planilhas_limpas import UFS
+from process_planilhas import ARQUIVOS
+
+# Catálogos sintéticos no formato das planilhas de Planilhas_Itens, para os
+# benchmarks rodarem em qualquer tamanho sem depender dos arquivos reais:
+#
+#   CATSER - 3 linhas antes do cabeçalho e ~20% das linhas com código e
+#            descrição na mesma célula ('15377      INFRA-ESTRUTURA...')
+#   SINAPI - 5 linhas de título antes do cabeçalho, código/descrição/unidade
+#            e o preço nas 27 UFs (números, ~1% em texto pt-BR)
+#   CMED   - 40 linhas de notas antes do cabeçalho, EAN com o placeholder
+#            '    -     ', com dígito errado e repetidos,
+#            preços pt-BR ('1.234,56', '27,29*')
+#
+# E os CSV limpos (catser_limpo.csv etc.) no formato que o pipeline grava,
+# para os benchmarks de importação e de busca. Tudo sai de uma seed, então
+# o mesmo tamanho gera sempre os mesmos arquivos.
+#
+# Uso: python benchmarks/sinteticos.py --linhas 100000 --pasta benchmarks/dados/100k
+
+# Uma aba do XLSX tem no máximo 1.048.576 linhas: acima disso só os CSV
+MAX_LINHAS_XLSX = 1_048_576 - 100
+
+_PALAVRAS = (
+    "servico manutencao preventiva corretiva instalacao limpeza predial conservacao vigilancia "
+    "armada desarmada locacao veiculo caminhao equipamento software desenvolvimento suporte "
+    "tecnico consultoria treinamento engenharia projeto reforma pintura alvenaria concreto "
+    "armado estrutura metalica cobertura telhado piso ceramico porcelanato revestimento "
+    "impermeabilizacao hidraulica eletrica iluminacao publica ar condicionado elevador "
+    "jardinagem poda dedetizacao transporte escolar coleta residuos hospitalar solidos "
+    "urbanos analise laboratorial exame clinico cirurgico odontologico fisioterapia "
+    "cimento areia brita tijolo bloco vidro porta janela esquadria aluminio madeira "
+    "tubo pvc conexao registro torneira cabo fio disjuntor lampada led poste "
+    "comprimido capsula solucao injetavel frasco ampola suspensao oral creme pomada "
+    "dipirona paracetamol amoxicilina losartana atenolol omeprazol insulina metformina "
+    "ibuprofeno dexametasona prednisona captopril enalapril sinvastatina azitromicina "
+    "cloridrato sodica potassica monoidratada acetato besilato maleato sulfato"
+).split()
+_UNIDADES = np.array(['UN', 'M2', 'M3', 'M', 'KG', 'H', 'MES', 'L', 'CJ', 'CX'], dtype=object)
+_GRUPOS = np.array(['NAO SE APLICA', 'SERVI¿S  DE DESENVOLVIMENTO E MANUTEN¿O DE SOFTWARE',
+                    'SERVICOS DE ENGENHARIA', 'SERVICOS DE LIMPEZA E CONSERVACAO'], dtype=object)
+_TIPOS_CMED = np.array(['Genérico', 'Similar', 'Novo', 'Específico', 'Biológico'], dtype=object)
+
+
+def _descricoes(rng, linhas, min_palavras=3, max_palavras=8):
+    # Descrições com palavras em frequência de Zipf (poucas muito comuns, a
+    # maioria rara) e um código de modelo em parte delas, como nos catálogos
+    pool = min(linhas, 100_000)
+    vocabulario = np.array(_PALAVRAS + [f"modelo{i}" for i in range(max(pool // 20, 10))], dtype=object)
+    pesos = 1.0 / np.arange(1, len(vocabulario) + 1)
+    indices = rng.choice(len(vocabulario), size=(pool, max_palavras), p=pesos / pesos.sum())
+    tamanhos = rng.integers(min_palavras, max_palavras + 1, size=pool)
+    palavras = pd.DataFrame(vocabulario[indices])
+    for j in range(max_palavras):
+        palavras.loc[tamanhos <= j, j] = ''
+    textos = palavras.apply(' '.join, axis=1).str.replace(r'\s+', ' ', regex=True).str.strip().str.upper()
+    medida = rng.random(pool) < 0.3
+    textos[medida] = textos[medida] + ' ' + pd.Series(rng.integers(1, 1000, pool)).astype(str)[medida] + 'MM'
+    return textos.to_numpy(dtype=object)[rng.integers(0, pool, size=linhas)]
+
+
+def _br(valores, asterisco=None):
+    # 1234.5 -> '1.234,50' (e '27,29*' onde asterisco)
+    texto = pd.Series(valores).map(lambda v: f"{v:,.2f}").str.replace(',', '_').str.replace('.', ',') \
+        .str.replace('_', '.')
+    if asterisco is not None:
+        texto[asterisco] = texto[asterisco] + '*'
+    return texto.to_numpy(dtype=object)
+
+
+def _gtin13(rng, n):
+    # EAN-13 com o dígito verificador certo (prefixo 789, Brasil)
+    corpo = np.concatenate([np.tile([7, 8, 9], (n, 1)), rng.integers(0, 10, size=(n, 9))], axis=1)
+    pesos = np.where(np.arange(12) % 2 == 0, 1, 3)
+    verificador = (10 - (corpo @ pesos) % 10) % 10
+    digitos = np.concatenate([corpo, verificador[:, None]], axis=1)
+    return (digitos @ (10 ** np.arange(12, -1, -1, dtype=np.int64))).astype(np.int64)
+
+
+def catser_bruto(linhas, seed=0):
+    # Linhas da planilha (header=None): 2 vazias, cabeçalho, dados
+    rng = np.random.default_rng(seed)
+    codigos = rng.integers(10, 999999, size=linhas).astype(object)
+    descricoes = _descricoes(rng, linhas)
+    juntos = rng.random(linhas) < 0.2
+    col_codigo = codigos.copy()
+    col_codigo[juntos] = [f"{c}                   {d}" for c, d in zip(codigos[juntos], descricoes[juntos])]
+    col_desc = descricoes.copy()
+    col_desc[juntos] = None
+    corpo = pd.DataFrame({0: _GRUPOS[rng.integers(0, len(_GRUPOS), linhas)],
+                          1: 'SERVIÇOS  DE DESENVOLVIMENTO DE SOFTWARE', 2: col_codigo, 3: col_desc})
+    topo = pd.DataFrame({0: [None, None, 'Grupo'], 1: [None, None, 'Classe'],
+                         2: [None, None, 'Codigo                Descrição'], 3: [None] * 3})
+    return pd.concat([topo, corpo], ignore_index=True).astype(object)
+
+
+def sinapi_bruto(linhas, seed=0):
+    rng = np.random.default_rng(seed + 1)
+    precos = np.round(rng.lognormal(-1.5, 0.6, size=(linhas, len(UFS))), 4).astype(object)
+    # ~1% das células em texto pt-BR, como quando a planilha é reexportada
+    texto = rng.random(precos.shape) < 0.01
+    precos[texto] = [f"{v:.4f}".replace('.', ',') for v in precos[texto]]
+    corpo = pd.DataFrame(precos, columns=range(4, 4 + len(UFS)))
+    corpo.insert(0, 0, _GRUPOS[rng.integers(0, len(_GRUPOS), linhas)])
+    corpo.insert(1, 1, np.arange(100000, 100000 + linhas))
+    corpo.insert(2, 2, _descricoes(rng, linhas))
+    corpo.insert(3, 3, _UNIDADES[rng.integers(0, len(_UNIDADES), linhas)])
+    largura = 4 + len(UFS)
+    topo = [['SINAPI - Sistema Nacional de Pesquisa de Custos e Índices da Construção Civil'],
+            ['RELATÓRIO DE PORCENTAGEM DE MÃO DE OBRA'], ['Mês de Referência:', '12/2025'],
+            ['Data de emissão:', '09/01/2026'], [],
+            ['Grupo', 'Código da\nComposição', 'Descrição', 'Unidade'] + UFS]
+    topo = pd.DataFrame([l + [None] * (largura - len(l)) for l in topo], dtype=object)
+    return pd.concat([topo, corpo.astype(object)], ignore_index=True)
+
+
+# Só a coluna EAN 1: com EAN 2/3 o mapear_colunas_cmed fica com a última
+# (quase toda placeholder) e a validação de GTIN não teria o que medir
+COLUNAS_CMED = ['SUBSTÂNCIA', 'CNPJ', 'LABORATÓRIO', 'CÓDIGO GGREM', 'REGISTRO', 'EAN 1',
+                'PRODUTO', 'APRESENTAÇÃO', 'CLASSE TERAPÊUTICA', 'TIPO DE PRODUTO (STATUS DO PRODUTO)',
+                'PREÇO FÁBRICA 18 %', 'PMVG 18 %']
+
+
+def cmed_bruto(linhas, seed=0):
+    rng = np.random.default_rng(seed + 2)
+    substancias = _descricoes(rng, linhas, 1, 3)
+    eans = _gtin13(rng, linhas).astype(str).astype(object)
+    sorteio = rng.random(linhas)
+    eans[sorteio < 0.35] = '    -     '
+    # ~3% com o dígito verificador errado e ~2% repetindo o EAN anterior
+    errado = (sorteio >= 0.35) & (sorteio < 0.38)
+    eans[errado] = [e[:-1] + str((int(e[-1]) + 1) % 10) for e in eans[errado]]
+    repetido = np.flatnonzero((sorteio >= 0.38) & (sorteio < 0.40))
+    eans[repetido[repetido > 0]] = eans[repetido[repetido > 0] - 1]
+    pf = np.round(rng.lognormal(3.5, 1.2, linhas), 2)
+    corpo = pd.DataFrame({
+        0: substancias, 1: '00.000.000/0001-00', 2: 'LABORATORIO TESTE', 3: np.arange(linhas).astype(str),
+        4: '1000000000000', 5: eans, 6: substancias, 7: '500 MG COM CT BL AL PLAS X 20',
+        8: 'N02B - ANALGESICOS', 9: _TIPOS_CMED[rng.integers(0, len(_TIPOS_CMED), linhas)],
+        10: _br(pf), 11: _br(np.round(pf * 0.78, 2), rng.random(linhas) < 0.05),
+    })
+    notas = [[f"Nota {i}: preços máximos de medicamentos por princípio ativo"] for i in range(40)]
+    topo = pd.DataFrame([n + [None] * (len(COLUNAS_CMED) - 1) for n in notas] + [COLUNAS_CMED], dtype=object)
+    return pd.concat([topo, corpo.astype(object)], ignore_index=True)
+
+
+BRUTOS = {'catser': catser_bruto, 'sinapi': sinapi_bruto, 'cmed': cmed_bruto}
+
+
+def gravar_xlsx(df, caminho):
+    # openpyxl em write_only: uma linha por vez, memória constante
+    if len(df) > MAX_LINHAS_XLSX:
+        raise ValueError(f"{len(df)} linhas não cabem numa aba do XLSX (máximo {MAX_LINHAS_XLSX})")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    for linha in df.itertuples(index=False, name=None):
+        ws.append([None if isinstance(v, float) and np.isnan(v) else v for v in linha])
+    wb.save(caminho)
+
+
+def catser_limpo(linhas, seed=0):
+    rng = np.random.default_rng(seed + 3)
+    return pd.DataFrame({'codigo': np.arange(10000, 10000 + linhas), 'descricao': _descricoes(rng, linhas),
+                         'Grupo': _GRUPOS[rng.integers(0, len(_GRUPOS), linhas)],
+                         'Classe': 'SERVIÇOS  DE DESENVOLVIMENTO DE SOFTWARE'})
+
+
+def sinapi_limpo(linhas, seed=0):
+    rng = np.random.default_rng(seed + 4)
+    df = pd.DataFrame({'classe': _GRUPOS[rng.integers(0, len(_GRUPOS), linhas)],
+                       'codigo': np.arange(100000, 100000 + linhas), 'descricao': _descricoes(rng, linhas),
+                       'unidade': _UNIDADES[rng.integers(0, len(_UNIDADES), linhas)]})
+    precos = np.round(rng.lognormal(-1.5, 0.6, size=(linhas, len(UFS))), 4)
+    return pd.concat([df, pd.DataFrame(precos, columns=UFS)], axis=1)
+
+
+def cmed_limpo(linhas, seed=0):
+    rng = np.random.default_rng(seed + 5)
+    eans = pd.array(_gtin13(rng, linhas), dtype='Int64')
+    eans[rng.random(linhas) < 0.6] = pd.NA
+    return pd.DataFrame({'substancia': _descricoes(rng, linhas, 1, 3), 'ean': eans,
+                         'produto': _descricoes(rng, linhas, 1, 3),
+                         'pmvg': _br(np.round(rng.lognormal(3.2, 1.2, linhas), 2))})
+
+
+LIMPOS = {'catser': catser_limpo, 'sinapi': sinapi_limpo, 'cmed': cmed_limpo}
+
+
+def gerar(linhas, pasta, seed=0, brutos=True, limpos=True):
+    # Grava pasta/Planilhas_Itens/<planilhas> e pasta/Planilhas_Limpas/<csv>
+    # com os nomes de process_planilhas.ARQUIVOS; arquivos já gerados com o
+    # mesmo tamanho e seed são reaproveitados. Devolve os caminhos gravados
+    itens = os.path.join(pasta, 'Planilhas_Itens')
+    limpas = os.path.join(pasta, 'Planilhas_Limpas')
+    os.makedirs(itens, exist_ok=True)
+    os.makedirs(limpas, exist_ok=True)
+    gravados = []
+    for fonte, (entrada, saida) in ARQUIVOS.items():
+        if brutos and linhas <= MAX_LINHAS_XLSX:
+            caminho = os.path.join(itens, entrada)
+            if not os.path.exists(caminho):
+                gravar_xlsx(BRUTOS[fonte](linhas, seed), caminho)
+            gravados.append(caminho)
+        if limpos:
+            caminho = os.path.join(limpas, saida)
+            if not os.path.exists(caminho):
+                LIMPOS[fonte](linhas, seed).to_csv(caminho, index=False, encoding='utf-8-sig')
+            gravados.append(caminho)
+    return gravados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera catálogos sintéticos (planilhas e CSV limpos)")
+    parser.add_argument('--linhas', type=int, default=10_000)
+    parser.add_argument('--pasta', help="destino (padrão: benchmarks/dados/<linhas>)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sem-planilhas', action='store_true', help="só os CSV limpos")
+    args = parser.parse_args()
+    pasta = args.pasta or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dados', str(args.linhas))
+    for caminho in gerar(args.linhas, pasta, args.seed, brutos=not args.sem_planilhas):
+        print(f"{caminho} ({os.path.getsize(caminho) / 2**20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
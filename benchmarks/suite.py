@@ -0,0 +1,411 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import sinteticos
+
+# Suíte de benchmarks dos caminhos quentes, em catálogos sintéticos
+# (benchmarks/sinteticos.py) de tamanhos escolhidos:
+#
+#   limpeza    - process_planilhas.clean_* de cada fonte, streaming e pandas
+#                (o fix_process só chama o mesmo pipeline para CATSER/CMED)
+#   importacao - montagem dos registros e envio em lotes do
+#                importar_para_supabase.import_csv, contra um cliente local
+#                que só conta as linhas (sem rede)
+#   busca      - carga dos índices e latência de testar_busca.buscar (p50,
+#                p95, p99), exata e aproximada, com o cache vazio e cheio
+#
+# Cada medição roda num processo novo, então o pico de memória (RSS) é só
+# dela. O resultado vai para um JSON com o commit, a máquina e os
+# parâmetros; 'comparar' mostra a diferença entre dois JSON e sai com
+# código 1 quando algo ficou mais lento que a tolerância.
+#
+#   python benchmarks/suite.py --tamanhos 10k,100k
+#   python benchmarks/suite.py comparar resultados/antes.json resultados/depois.json
+
+PASTA_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+PASTA_DADOS = os.path.join(PASTA_BENCHMARKS, 'dados')
+PASTA_RESULTADOS = os.path.join(PASTA_BENCHMARKS, 'resultados')
+
+ETAPAS = ('limpeza', 'importacao', 'busca')
+TOLERANCIA = 0.10
+
+
+def ler_tamanho(texto):
+    # '10k' -> 10000, '1M' -> 1000000
+    texto = texto.strip().lower()
+    multiplicador = {'k': 1_000, 'm': 1_000_000}.get(texto[-1:], 1)
+    return int(float(texto.rstrip('km')) * multiplicador)
+
+
+def _rss_mb():
+    # Pico de memória residente do processo até agora (ru_maxrss: KB no Linux, bytes no macOS)
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 2**20 if sys.platform == 'darwin' else pico / 2**10
+
+
+def _percentis(amostras):
+    ms = np.asarray(amostras) * 1000
+    return {'p50_ms': float(np.percentile(ms, 50)), 'p95_ms': float(np.percentile(ms, 95)),
+            'p99_ms': float(np.percentile(ms, 99)), 'consultas': len(ms)}
+
+
+# --- Medições (rodam no processo filho) ---
+
+def medir_limpeza(pasta, fonte, streaming):
+    import process_planilhas
+    saida = os.path.join(pasta, f'saida_{"streaming" if streaming else "pandas"}')
+    os.makedirs(saida, exist_ok=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        linhas = process_planilhas.FONTES[fonte](os.path.join(pasta, 'Planilhas_Itens'), saida,
+                                                 streaming=streaming)
+        segundos = time.perf_counter() - inicio
+    return {'segundos': segundos, 'linhas_saida': linhas}
+
+
+class _Resposta:
+    data = []
+
+
+class _ConsultaLocal:
+    # Imita a cadeia do cliente (table().upsert().execute() etc.) sem rede
+    def __init__(self, cliente, tabela):
+        self.cliente = cliente
+        self.tabela = tabela
+        self.registros = []
+
+    def insert(self, registros, **_):
+        self.registros = registros
+        return self
+
+    upsert = insert
+
+    def delete(self):
+        return self
+
+    def __getattr__(self, nome):
+        # Filtros (eq, neq, in_, is_...): não mudam nada aqui
+        return lambda *a, **k: self
+
+    def execute(self):
+        # Serializa como o cliente HTTP faria, para o custo do JSON entrar na conta
+        if self.registros:
+            json.dumps(self.registros)
+            with self.cliente.trava:
+                self.cliente.enviadas += len(self.registros)
+        return _Resposta()
+
+
+class ClienteLocal:
+    def __init__(self):
+        self.enviadas = 0
+        self.trava = threading.Lock()
+
+    def table(self, nome):
+        return _ConsultaLocal(self, nome)
+
+
+def _importar_sem_rede():
+    # importar_para_supabase cria o cliente ao ser importado: um módulo
+    # supabase local no lugar do pacote (instalado ou não) deixa a medida sem
+    # rede e sem a dependência; o cliente é trocado pelo ClienteLocal depois
+    local = types.ModuleType('supabase')
+    local.Client = ClienteLocal
+    local.create_client = lambda url, key: ClienteLocal()
+    anterior = sys.modules.get('supabase')
+    sys.modules['supabase'] = local
+    try:
+        import importar_para_supabase
+    finally:
+        if anterior is None:
+            sys.modules.pop('supabase', None)
+        else:
+            sys.modules['supabase'] = anterior
+    return importar_para_supabase
+
+
+def medir_importacao(pasta, fonte):
+    try:
+        imp = _importar_sem_rede()
+    except ImportError as e:
+        return {'pulado': f"importar_para_supabase não importa aqui ({e})"}
+    cliente = ClienteLocal()
+    imp.supabase = cliente
+    imp.csv_dir = os.path.join(pasta, 'Planilhas_Limpas')
+    _, arquivo = sinteticos.ARQUIVOS[fonte]
+    mapping = {'catser': imp.map_catser, 'sinapi': dict(imp.map_sinapi, AC='preco_base'),
+               'cmed': imp.map_cmed}[fonte]
+    chave = {'catser': imp.chave_catser, 'sinapi': imp.chave_sinapi, 'cmed': imp.chave_cmed}[fonte]
+    conflito = {'catser': imp.conflito_catser, 'sinapi': imp.conflito_sinapi, 'cmed': imp.conflito_cmed}[fonte]
+    numericas = {'catser': None, 'sinapi': ['preco_base'], 'cmed': ['pf', 'pmvg']}[fonte]
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        imp.import_csv(arquivo, f"referencia_{fonte}", mapping, chave, conflito, is_numeric=numericas,
+                       estado={'fontes': {}, 'tabelas': {}}, completo=True)
+        segundos = time.perf_counter() - inicio
+    return {'segundos': segundos, 'linhas_enviadas': cliente.enviadas}
+
+
+def consultas_busca(n, seed=0):
+    # Termos como os digitados: palavras do vocabulário sintético (comuns e
+    # raras), pares de palavras, prefixos e, na aproximada, com um erro
+    rng = np.random.default_rng(seed)
+    palavras = sinteticos._PALAVRAS
+    termos = []
+    for i in range(n):
+        palavra = palavras[int(rng.integers(len(palavras)))]
+        tipo = i % 4
+        if tipo == 1:
+            palavra = f"{palavra} {palavras[int(rng.integers(len(palavras)))]}"
+        elif tipo == 2:
+            palavra = palavra[:max(3, len(palavra) - 3)]
+        elif tipo == 3:
+            palavra = f"modelo{int(rng.integers(1000))}"
+        termos.append(palavra)
+    return termos
+
+
+def _com_erro(termo, rng):
+    # Troca uma letra (erro de digitação) em termos de 5+ letras
+    if len(termo) < 5:
+        return termo
+    i = int(rng.integers(1, len(termo) - 1))
+    return termo[:i] + 'x' + termo[i + 1:]
+
+
+def medir_busca(pasta, consultas):
+    import testar_busca
+    testar_busca.output_dir = os.path.join(pasta, 'Planilhas_Limpas')
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        dados = testar_busca.carregar_dados()
+        carga = time.perf_counter() - inicio
+        # Primeira busca monta as estruturas preguiçosas (trigramas, BK-tree)
+        testar_busca.buscar('servico', dados, aproximada=True)
+
+    termos = consultas_busca(consultas)
+    rng = np.random.default_rng(1)
+    resultado = {'segundos': carga, 'carga_indices_s': carga}
+    for modo, aproximada in (('exata', False), ('aproximada', True)):
+        frios, quentes = [], []
+        for termo in termos:
+            termo = _com_erro(termo, rng) if aproximada else termo
+            testar_busca.CACHE.limpar()
+            with contextlib.redirect_stdout(io.StringIO()):
+                inicio = time.perf_counter()
+                testar_busca.buscar(termo, dados, aproximada=aproximada)
+                frios.append(time.perf_counter() - inicio)
+                inicio = time.perf_counter()
+                testar_busca.buscar(termo, dados, aproximada=aproximada)
+                quentes.append(time.perf_counter() - inicio)
+        resultado[modo] = _percentis(frios)
+        resultado[f"{modo}_cache"] = _percentis(quentes)
+    return resultado
+
+
+def _filho(conexao, funcao, argumentos):
+    base = _rss_mb()
+    try:
+        resultado = funcao(*argumentos)
+        if 'pulado' not in resultado:
+            resultado['rss_pico_mb'] = _rss_mb()
+            resultado['rss_delta_mb'] = resultado['rss_pico_mb'] - base
+    except Exception as e:
+        resultado = {'erro': f"{type(e).__name__}: {e}"}
+    conexao.send(resultado)
+    conexao.close()
+
+
+def em_processo_novo(funcao, *argumentos):
+    contexto = multiprocessing.get_context('spawn')
+    receber, enviar = contexto.Pipe(duplex=False)
+    processo = contexto.Process(target=_filho, args=(enviar, funcao, argumentos))
+    processo.start()
+    enviar.close()
+    try:
+        resultado = receber.recv()
+    except EOFError:
+        resultado = {'erro': f"processo terminou com código {processo.exitcode} (memória?)"}
+    processo.join()
+    return resultado
+
+
+# --- Execução ---
+
+def medicoes(etapas, consultas):
+    # (etapa, alvo, função, argumentos extras)
+    for etapa in etapas:
+        if etapa == 'limpeza':
+            for fonte in sinteticos.ARQUIVOS:
+                for streaming in ((False,) if fonte == 'catser' else (True, False)):
+                    alvo = f"{fonte}_{'streaming' if streaming else 'pandas'}"
+                    yield etapa, alvo, medir_limpeza, (fonte, streaming)
+        elif etapa == 'importacao':
+            for fonte in sinteticos.ARQUIVOS:
+                yield etapa, fonte, medir_importacao, (fonte,)
+        elif etapa == 'busca':
+            yield etapa, 'buscar', medir_busca, (consultas,)
+
+
+def _resumir(rodadas):
+    # Mediana das repetições (tempo e memória); o resto vem da última rodada
+    validas = [r for r in rodadas if 'erro' not in r and 'pulado' not in r]
+    if not validas:
+        return rodadas[-1]
+    resumo = dict(validas[-1])
+    resumo['segundos'] = float(np.median([r['segundos'] for r in validas]))
+    resumo['segundos_rodadas'] = [r['segundos'] for r in validas]
+    resumo['rss_pico_mb'] = float(np.median([r['rss_pico_mb'] for r in validas]))
+    return resumo
+
+
+def ambiente():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True,
+                                text=True).stdout.strip() or None
+        sujo = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=RAIZ,
+                                   capture_output=True, text=True).stdout.strip())
+    except OSError:
+        commit, sujo = None, None
+    import pandas as pd
+    return {'commit': commit, 'alteracoes_locais': sujo, 'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'sistema': platform.platform(), 'cpus': os.cpu_count()}
+
+
+def executar(tamanhos, etapas, repeticoes=3, consultas=200, pasta_dados=PASTA_DADOS, seed=0):
+    resultados = []
+    for linhas in tamanhos:
+        pasta = os.path.join(pasta_dados, str(linhas))
+        print(f"\n== {linhas} linhas ({pasta})")
+        inicio = time.perf_counter()
+        brutos = 'limpeza' in etapas and linhas <= sinteticos.MAX_LINHAS_XLSX
+        sinteticos.gerar(linhas, pasta, seed, brutos=brutos)
+        print(f"dados prontos em {time.perf_counter() - inicio:.1f}s")
+        for etapa, alvo, funcao, argumentos in medicoes(etapas, consultas):
+            if etapa == 'limpeza' and linhas > sinteticos.MAX_LINHAS_XLSX:
+                resultados.append({'etapa': etapa, 'alvo': alvo, 'linhas': linhas,
+                                   'pulado': "planilha maior que o limite do XLSX"})
+                continue
+            rodadas = [em_processo_novo(funcao, pasta, *argumentos) for _ in range(repeticoes)]
+            resumo = dict(etapa=etapa, alvo=alvo, linhas=linhas, **_resumir(rodadas))
+            resultados.append(resumo)
+            print(formatar(resumo))
+    return resultados
+
+
+def formatar(r):
+    nome = f"{r['etapa']:<10} {r['alvo']:<17} {r['linhas']:>9}"
+    if 'erro' in r or 'pulado' in r:
+        return f"{nome}  {r.get('erro') or 'pulado: ' + r['pulado']}"
+    texto = f"{nome}  {r['segundos']:8.3f}s  {r['rss_pico_mb']:7.0f} MB"
+    for modo in ('exata', 'aproximada', 'exata_cache'):
+        if modo in r:
+            p = r[modo]
+            texto += f"  {modo} p50/p95/p99 {p['p50_ms']:.1f}/{p['p95_ms']:.1f}/{p['p99_ms']:.1f} ms"
+    return texto
+
+
+def _metricas(r):
+    # Métricas comparáveis de uma medição: {nome: valor}, menor é melhor
+    metricas = {}
+    if 'segundos' in r:
+        metricas['segundos'] = r['segundos']
+    if 'rss_pico_mb' in r:
+        metricas['rss_pico_mb'] = r['rss_pico_mb']
+    for modo in ('exata', 'aproximada', 'exata_cache', 'aproximada_cache'):
+        for p in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if modo in r:
+                metricas[f"{modo}_{p}"] = r[modo][p]
+    return metricas
+
+
+def comparar(antes, depois, tolerancia=TOLERANCIA):
+    # Linhas (etapa, alvo, linhas, métrica, antes, depois, razão) e se houve regressão
+    chave = lambda r: (r['etapa'], r['alvo'], r['linhas'])
+    anteriores = {chave(r): r for r in antes['resultados']}
+    linhas, regressao = [], False
+    for r in depois['resultados']:
+        anterior = anteriores.get(chave(r))
+        if anterior is None:
+            continue
+        base = _metricas(anterior)
+        for metrica, valor in _metricas(r).items():
+            if metrica not in base or not base[metrica]:
+                continue
+            razao = valor / base[metrica]
+            # Memória oscila menos que tempo, mas o critério é o mesmo
+            pior = razao > 1 + tolerancia
+            regressao |= pior
+            linhas.append((*chave(r), metrica, base[metrica], valor, razao, pior))
+    return linhas, regressao
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['comparar']:
+        parser = argparse.ArgumentParser(description="Compara dois resultados da suíte")
+        parser.add_argument('antes')
+        parser.add_argument('depois')
+        parser.add_argument('--tolerancia', type=float, default=TOLERANCIA,
+                            help="piora relativa aceita (padrão: 0.10 = 10%%)")
+        args = parser.parse_args(argv[1:])
+        with open(args.antes, encoding='utf-8') as f:
+            antes = json.load(f)
+        with open(args.depois, encoding='utf-8') as f:
+            depois = json.load(f)
+        print(f"{antes['ambiente']['commit']} -> {depois['ambiente']['commit']}")
+        linhas, regressao = comparar(antes, depois, args.tolerancia)
+        for etapa, alvo, n, metrica, a, d, razao, pior in linhas:
+            print(f"{'PIOROU ' if pior else '       '}{etapa:<10} {alvo:<17} {n:>9} {metrica:<22} "
+                  f"{a:10.3f} -> {d:10.3f}  ({razao:.2f}x)")
+        return 1 if regressao else 0
+
+    parser = argparse.ArgumentParser(description="Benchmarks de limpeza, importação e busca")
+    parser.add_argument('--tamanhos', default='10k', help="linhas por catálogo, ex.: 10k,100k,1M,10M")
+    parser.add_argument('--etapas', default=','.join(ETAPAS), help=f"padrão: {','.join(ETAPAS)}")
+    parser.add_argument('--repeticoes', type=int, default=3, help="rodadas por medição (vale a mediana)")
+    parser.add_argument('--consultas', type=int, default=200, help="termos por modo de busca")
+    parser.add_argument('--dados', default=PASTA_DADOS, help="onde os catálogos sintéticos ficam")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--saida', help="JSON de resultado (padrão: resultados/<data>_<commit>.json)")
+    args = parser.parse_args(argv)
+
+    etapas = [e.strip() for e in args.etapas.split(',') if e.strip()]
+    desconhecidas = [e for e in etapas if e not in ETAPAS]
+    if desconhecidas:
+        parser.error(f"etapa(s) desconhecida(s): {', '.join(desconhecidas)}")
+    tamanhos = [ler_tamanho(t) for t in args.tamanhos.split(',') if t.strip()]
+
+    info = ambiente()
+    resultados = executar(tamanhos, etapas, args.repeticoes, args.consultas, args.dados, args.seed)
+    saida = args.saida or os.path.join(
+        PASTA_RESULTADOS, f"{time.strftime('%Y%m%d-%H%M%S')}_{info['commit'] or 'sem-commit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, 'w', encoding='utf-8') as f:
+        json.dump({'ambiente': info, 'parametros': {'tamanhos': tamanhos, 'etapas': etapas,
+                                                    'repeticoes': args.repeticoes, 'consultas': args.consultas,
+                                                    'seed': args.seed},
+                   'resultados': resultados}, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados em {saida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
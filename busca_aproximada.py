@@ -0,0 +1,241 @@
+import numpy as np
+
+from indice_busca import IndiceNgramas, _chaves_termo, normalizar_texto
+from indice_palavras import tokenizar
+
+# Busca tolerante a erros de digitação sobre o índice de palavras do
+# catálogo (indice_palavras.IndicePalavras).
+#
+# Cada palavra do termo (já sem acentos) vira um conjunto de variantes do
+# vocabulário: primeiro as que dividem trigramas com ela (" cimeto " e
+# " cimento " dividem " ci", "cim", "ime" e "to "), confirmadas pela
+# distância de edição; se nenhuma passar, a BK-tree das palavras de tamanho
+# parecido procura as que estão a até 1 erro a cada 4 letras. Palavras com
+# menos de 3 letras só valem exatas.
+#
+# A nota de uma linha é a média, entre as palavras do termo, da semelhança
+# da melhor variante que aparece nela (1 - distância / tamanho; palavra
+# exata vale 1). Entram as linhas com nota >= NOTA_MINIMA; só as da página
+# pedida saem ordenadas, com empate desfeito pela linha com menos palavras.
+
+NOTA_MINIMA = 0.5
+TAMANHO_MINIMO = 3     # palavras mais curtas só casam exatas
+SEMELHANCA_TRIGRAMAS = 0.2  # Jaccard mínimo para conferir a distância
+MAX_CONFERIDAS = 32    # candidatas por trigramas conferidas por palavra
+MAX_VARIANTES = 20
+# Acima de 1 posting para cada DENSIDADE_VETOR linhas do catálogo, somar
+# num vetor do tamanho do catálogo sai mais barato que ordenar as postings
+DENSIDADE_VETOR = 16
+
+
+def distancia_edicao(a, b, limite=None):
+    # Levenshtein bit a bit (Myers/Hyyrö): cada coluna da tabela de
+    # programação dinâmica vira um inteiro com um bit por letra da palavra
+    # mais curta, e uma letra da mais longa custa uma dúzia de operações
+    if len(a) < len(b):
+        a, b = b, a
+    if limite is not None and len(a) - len(b) > limite:
+        return limite + 1
+    if not b:
+        return len(a)
+    mascaras = {}
+    for i, c in enumerate(b):
+        mascaras[c] = mascaras.get(c, 0) | (1 << i)
+    tudo = (1 << len(b)) - 1
+    ultimo = 1 << (len(b) - 1)
+    pv, mv, d = tudo, 0, len(b)
+    for c in a:
+        eq = mascaras.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & tudo)
+        mh = pv & xh
+        if ph & ultimo:
+            d += 1
+        elif mh & ultimo:
+            d -= 1
+        ph = ((ph << 1) | 1) & tudo
+        mh = (mh << 1) & tudo
+        pv = mh | (~(xv | ph) & tudo)
+        mv = ph & xv
+    return d if limite is None else min(d, limite + 1)
+
+
+def raio_edicao(palavra):
+    # Erros tolerados: 1 a cada 4 letras, pelo menos 1
+    return max(1, len(palavra) // 4)
+
+
+def semelhanca(palavra, variante, distancia):
+    return 1.0 - distancia / max(len(palavra), len(variante))
+
+
+class ArvoreBK:
+    # BK-tree: cada filho fica pendurado pela distância até o pai, e a
+    # desigualdade triangular corta os ramos fora de [d - raio, d + raio]
+    def __init__(self, palavras=()):
+        self.raiz = None
+        for palavra in palavras:
+            self.adicionar(palavra)
+
+    def adicionar(self, palavra):
+        if self.raiz is None:
+            self.raiz = (palavra, {})
+            return
+        no = self.raiz
+        while True:
+            d = distancia_edicao(palavra, no[0])
+            if d == 0:
+                return
+            if d not in no[1]:
+                no[1][d] = (palavra, {})
+                return
+            no = no[1][d]
+
+    def buscar(self, palavra, raio):
+        # [(distância, palavra)] dentro do raio, da mais próxima para a mais longe
+        achados = []
+        pendentes = [self.raiz] if self.raiz else []
+        while pendentes:
+            texto, filhos = pendentes.pop()
+            d = distancia_edicao(palavra, texto, raio)
+            if d <= raio:
+                achados.append((d, texto))
+            for dist, filho in filhos.items():
+                if d - raio <= dist <= d + raio:
+                    pendentes.append(filho)
+        return sorted(achados)
+
+
+class BuscaAproximada:
+    def __init__(self, indice):
+        self.indice = indice
+        self._trigramas = None
+        self._tamanhos = None
+        self._arvores = {}
+
+    def trigramas(self):
+        # Índice de n-gramas sobre o vocabulário (a "linha" é o id da
+        # palavra), com espaço nas pontas para o começo e o fim contarem
+        if self._trigramas is None:
+            palavras = self.indice.palavras()
+            self._trigramas = IndiceNgramas.construir([f" {p} " for p in palavras])
+            self._tamanhos = np.fromiter(map(len, palavras), dtype=np.int32, count=len(palavras))
+        return self._trigramas
+
+    def arvore(self, tamanho):
+        # Uma BK-tree por tamanho de palavra, construída só quando alguma
+        # busca precisa daquele tamanho
+        if tamanho not in self._arvores:
+            self.trigramas()
+            ids = np.flatnonzero(self._tamanhos == tamanho)
+            palavras = self.indice.palavras()
+            self._arvores[tamanho] = ArvoreBK(palavras[i] for i in ids)
+        return self._arvores[tamanho]
+
+    def variantes(self, palavra):
+        # [(id da palavra no vocabulário, semelhança)], da mais parecida
+        # para a menos
+        exata = self.indice.id_palavra(palavra)
+        if len(palavra) < TAMANHO_MINIMO:
+            return [(exata, 1.0)] if exata >= 0 else []
+
+        palavras = self.indice.palavras()
+        raio = raio_edicao(palavra)
+        achadas = {exata: 1.0} if exata >= 0 else {}
+
+        indice = self.trigramas()
+        chaves = _chaves_termo(f" {palavra} ")
+        listas = [indice.postings(chave) for chave in chaves]
+        listas = [lista for lista in listas if lista is not None]
+        if listas:
+            ids, comuns = np.unique(np.concatenate(listas), return_counts=True)
+            # " w " tem len(w) trigramas
+            jaccard = comuns / (len(chaves) + self._tamanhos[ids] - comuns)
+            fica = (jaccard >= SEMELHANCA_TRIGRAMAS) & (np.abs(self._tamanhos[ids] - len(palavra)) <= raio)
+            ids, jaccard = ids[fica], jaccard[fica]
+            for i in ids[np.argsort(-jaccard, kind='stable')[:MAX_CONFERIDAS]].tolist():
+                if i in achadas:
+                    continue
+                d = distancia_edicao(palavra, palavras[i], raio)
+                if d <= raio:
+                    achadas[i] = semelhanca(palavra, palavras[i], d)
+
+        if not achadas:
+            # Erro que quebra todos os trigramas ("dor" -> "dur"): BK-tree
+            for tamanho in range(len(palavra) - raio, len(palavra) + raio + 1):
+                for d, variante in self.arvore(tamanho).buscar(palavra, raio):
+                    achadas[self.indice.id_palavra(variante)] = semelhanca(palavra, variante, d)
+
+        return sorted(achadas.items(), key=lambda par: -par[1])[:MAX_VARIANTES]
+
+    def pontuar(self, variantes):
+        # (linhas, soma) por linha da semelhança da melhor variante de cada
+        # palavra. variantes: uma lista de variantes por palavra do termo
+        postings = sum(self.indice.documentos(i) for lista in variantes for i, _ in lista)
+        if postings * DENSIDADE_VETOR < len(self.indice):
+            return self._pontuar_esparso(variantes)
+        return self._pontuar_vetor(variantes)
+
+    def _pontuar_esparso(self, variantes):
+        # Poucas postings: junta tudo e soma por linha ordenando
+        linhas_palavras, notas_palavras = [], []
+        for lista in variantes:
+            if not lista:
+                continue
+            linhas = [self.indice.postings(i)[0] for i, _ in lista]
+            notas = np.repeat([sem for _, sem in lista], [len(l) for l in linhas])
+            # As variantes vêm da mais parecida para a menos: a primeira
+            # ocorrência de cada linha é a melhor variante nela
+            linhas, primeira = np.unique(np.concatenate(linhas), return_index=True)
+            linhas_palavras.append(linhas)
+            notas_palavras.append(notas[primeira])
+        if not linhas_palavras:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        linhas, posicao = np.unique(np.concatenate(linhas_palavras), return_inverse=True)
+        return linhas, np.bincount(posicao, weights=np.concatenate(notas_palavras))
+
+    def _pontuar_vetor(self, variantes):
+        # Listas grandes ("de", "com"): acumula num vetor do tamanho do catálogo
+        n = len(self.indice)
+        nota = np.zeros(n, dtype=np.float32)
+        melhor = np.zeros(n, dtype=np.float32)
+        for lista in variantes:
+            tocadas = []
+            for id_palavra, sem in lista:
+                linhas, _ = self.indice.postings(id_palavra)
+                # Uma linha com duas variantes da mesma palavra só conta a melhor
+                anterior = melhor[linhas]
+                ganho = np.maximum(np.float32(sem) - anterior, 0)
+                nota[linhas] += ganho
+                melhor[linhas] = anterior + ganho
+                tocadas.append(linhas)
+            for linhas in tocadas:
+                melhor[linhas] = 0
+        linhas = np.flatnonzero(nota)
+        return linhas, nota[linhas].astype(np.float64)
+
+    def buscar(self, termo, limite=10, offset=0, nota_minima=NOTA_MINIMA):
+        # Retorna (linhas, notas, total) da página pedida, da maior nota para
+        # a menor. total conta todas as linhas que passaram da nota mínima
+        palavras = list(dict.fromkeys(tokenizar(normalizar_texto(termo))))
+        if not palavras or not len(self.indice):
+            return np.empty(0, dtype=np.int64), np.empty(0), 0
+
+        linhas, notas = self.pontuar([self.variantes(p) for p in palavras])
+        notas = notas / len(palavras)
+        fica = notas >= nota_minima - 1e-6
+        linhas, notas = linhas[fica], notas[fica]
+        total = len(linhas)
+        fim = min(offset + limite, total)
+        if offset >= fim:
+            return np.empty(0, dtype=np.int64), np.empty(0), total
+        # Nota em milésimos primeiro, número de palavras da linha como desempate
+        comprimentos = np.minimum(np.asarray(self.indice.comprimentos)[linhas], 1023)
+        chave = np.round(notas * 1000).astype(np.int64) * 1024 - comprimentos
+        if fim < total:
+            # Só as offset + limite melhores são ordenadas
+            corte = np.argpartition(-chave, fim - 1)[:fim]
+            linhas, notas, chave = linhas[corte], notas[corte], chave[corte]
+        ordem = np.argsort(-chave, kind='stable')[offset:fim]
+        return linhas[ordem], notas[ordem], total
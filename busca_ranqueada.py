@@ -0,0 +1,106 @@
+import bisect
+
+import numpy as np
+
+from indice_busca import normalizar_texto
+from indice_palavras import tokenizar
+
+# Ordenação por relevância (BM25) das linhas que a busca exata encontra.
+#
+# O conjunto de resultados continua sendo o do índice de n-gramas (o termo
+# aparece como substring no texto da linha), e o total sai dele sem montar
+# nenhuma linha do DataFrame. A nota de cada linha é o BM25 das palavras do
+# termo no índice de palavras do catálogo; como a busca é por substring, uma
+# palavra do termo também pontua pelas palavras do vocabulário que começam
+# com ela ("limp" -> "limpeza"), valendo a melhor delas em cada linha.
+#
+# Só as offset + limite melhores são ordenadas (empate: ordem do CSV), então
+# paginar um resultado grande custa o mesmo que a primeira página.
+
+K1 = 1.2
+B = 0.75
+MAX_EXPANSOES = 64  # palavras do vocabulário por prefixo, as mais frequentes
+
+
+class BuscaRanqueada:
+    def __init__(self, indice, palavras):
+        # indice: IndiceNgramas; palavras: IndicePalavras do mesmo CSV
+        self.indice = indice
+        self.palavras = palavras
+        self._media = None
+
+    def media_comprimento(self):
+        if self._media is None:
+            self._media = max(float(np.mean(self.palavras.comprimentos)), 1.0) if len(self.palavras) else 1.0
+        return self._media
+
+    def expandir(self, palavra):
+        # Ids das palavras do vocabulário que começam com a palavra do termo
+        vocabulario = self.palavras.palavras()
+        inicio = bisect.bisect_left(vocabulario, palavra)
+        fim = bisect.bisect_left(vocabulario, palavra + '\U0010ffff', inicio)
+        ids = np.arange(inicio, fim)
+        if len(ids) > MAX_EXPANSOES:
+            documentos = np.diff(np.asarray(self.palavras.offsets))[ids]
+            ids = np.sort(ids[np.argsort(-documentos, kind='stable')[:MAX_EXPANSOES]])
+        return ids
+
+    def pontuar(self, termo, linhas):
+        # BM25 de cada linha (linhas: ordem crescente) para o termo
+        notas = np.zeros(len(linhas))
+        if not len(linhas):
+            return notas
+        n = len(self.palavras)
+        comprimentos = np.asarray(self.palavras.comprimentos)
+        media = self.media_comprimento()
+        for palavra in dict.fromkeys(tokenizar(termo)):
+            melhor = np.zeros(len(linhas))
+            for id_palavra in self.expandir(palavra):
+                postings, frequencias = self.palavras.postings(id_palavra)
+                pos = np.searchsorted(linhas, postings)
+                pos[pos == len(linhas)] = 0
+                achou = linhas[pos] == postings
+                if not achou.any():
+                    continue
+                pos = pos[achou]
+                tf = frequencias[achou].astype(np.float64)
+                df = len(postings)
+                idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+                norma = K1 * (1 - B + B * comprimentos[linhas[pos]] / media)
+                # pos não se repete dentro de uma mesma palavra do vocabulário
+                melhor[pos] = np.maximum(melhor[pos], idf * tf * (K1 + 1) / (tf + norma))
+            notas += melhor
+        return notas
+
+    def nota_maxima(self, termo):
+        # Limite do BM25 do termo neste catálogo: cada palavra vale no máximo
+        # idf * (K1 + 1), com a expansão mais rara. nota / nota_maxima fica
+        # em [0, 1) e pode ser comparada entre catálogos
+        n = len(self.palavras)
+        documentos = np.diff(np.asarray(self.palavras.offsets))
+        total = 0.0
+        for palavra in dict.fromkeys(tokenizar(normalizar_texto(termo))):
+            ids = self.expandir(palavra)
+            if len(ids):
+                df = documentos[ids].min()
+                total += np.log(1 + (n - df + 0.5) / (df + 0.5)) * (K1 + 1)
+        return total
+
+    def buscar(self, termo, limite=10, offset=0):
+        # Retorna (linhas, notas, total) da página pedida, da maior nota para
+        # a menor. total conta todas as linhas que contêm o termo
+        termo = normalizar_texto(termo).strip()
+        linhas = self.indice.buscar(termo)
+        total = len(linhas)
+        fim = min(offset + limite, total)
+        if offset >= fim:
+            return np.empty(0, dtype=np.int64), np.empty(0), total
+        notas = self.pontuar(termo, linhas)
+        if fim < total:
+            # Todas as linhas com nota acima da fim-ésima entram; o desempate
+            # pela ordem do CSV decide entre as que ficam na divisa
+            corte = np.partition(-notas, fim - 1)[fim - 1]
+            fica = -notas <= corte
+            linhas, notas = linhas[fica], notas[fica]
+        ordem = np.lexsort((linhas, -notas))[offset:fim]
+        return linhas[ordem], notas[ordem], total
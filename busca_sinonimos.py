@@ -0,0 +1,214 @@
+import json
+import os
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from indice_busca import normalizar_texto
+
+# Busca com sinônimos: o termo é expandido pelo dicionário (como o
+# dicionarioSinonimos do searchAggregator.ts, mas valendo todas as chaves
+# contidas no termo, não só a primeira) e todos os termos expandidos são
+# procurados numa passada só pelo texto normalizado do catálogo.
+#
+# Os termos viram um autômato de Aho-Corasick sobre os bytes UTF-8 (tabela
+# de transições densa estados x 256, com as falhas já resolvidas), e o texto
+# de todas as linhas avança junto, um byte por passo: as linhas ficam em
+# ordem decrescente de tamanho, então as que ainda têm byte no passo k são
+# um prefixo. O custo é o tamanho do texto do catálogo, quantos termos o
+# dicionário tiver; cada linha sai com uma máscara de bits dos termos que
+# contém.
+#
+# Linhas com o termo digitado vêm antes das que só têm sinônimos; dentro de
+# cada grupo vale o BM25 (do termo, ou do sinônimo de melhor nota vezes
+# PESO_SINONIMO). Sem sinônimo no dicionário, é a busca ranqueada normal.
+#
+# O dicionário padrão pode ser trocado por um JSON {"termo": ["sinônimo",
+# ...]} na variável de ambiente SINONIMOS (vale também para os workers do
+# servico_busca).
+
+SINONIMOS = {
+    'cadeira': ['poltrona', 'assento', 'longarina'],
+    'paracetamol': ['acetaminofeno', 'analgésico', 'antitérmico'],
+    'carro': ['veículo', 'automóvel', 'picape', 'van'],
+    'reforma': ['obra', 'manutenção', 'construção', 'pintura'],
+    'computador': ['notebook', 'laptop', 'desktop', 'estação de trabalho'],
+    'papel': ['sulfite', 'a4', 'resma'],
+    'limpeza': ['detergente', 'desinfetante', 'sabão', 'higiene'],
+}
+
+PESO_SINONIMO = 0.5
+MAX_AUTOMATOS = 64  # expansões recentes com o autômato já montado
+
+
+def carregar_dicionario(caminho=None):
+    # {termo: [sinônimos]} com chaves e sinônimos normalizados
+    if caminho:
+        with open(caminho, encoding='utf-8') as f:
+            dicionario = json.load(f)
+    else:
+        dicionario = SINONIMOS
+    normalizado = {}
+    for chave, sinonimos in dicionario.items():
+        chave = normalizar_texto(chave).strip()
+        if chave:
+            lista = normalizado.setdefault(chave, [])
+            lista += [s for s in (normalizar_texto(s).strip() for s in sinonimos) if s and s not in lista]
+    return normalizado
+
+
+DICIONARIO = carregar_dicionario(os.environ.get('SINONIMOS'))
+
+
+def expandir(termo, dicionario=None):
+    # [termo, sinônimos...] sem repetição, o termo digitado sempre primeiro
+    dicionario = DICIONARIO if dicionario is None else dicionario
+    termo = normalizar_texto(termo).strip()
+    termos = [termo]
+    for chave, sinonimos in dicionario.items():
+        if chave in termo:
+            termos += sinonimos
+    return list(dict.fromkeys(t for t in termos if t))
+
+
+class Automato:
+    def __init__(self, transicoes, saidas):
+        # transicoes: int32 (estados x 256); saidas: uint64 (estados x
+        # palavras), bit i = o termo i termina neste estado
+        self.transicoes = transicoes
+        self.saidas = saidas
+        # Na varredura o estado anda já multiplicado por 256: a transição é
+        # uma soma e uma leitura na tabela achatada
+        self._tabela = (transicoes.astype(np.int64) * 256).ravel()
+        self._finais = np.repeat(saidas.any(axis=1), 256)
+
+    @classmethod
+    def construir(cls, termos):
+        # Trie dos termos em bytes; depois, em largura, cada estado herda as
+        # transições e as saídas do seu estado de falha
+        filhos, saidas = [{}], [0]
+        for i, termo in enumerate(termos):
+            estado = 0
+            for byte in termo.encode('utf-8'):
+                if byte not in filhos[estado]:
+                    filhos[estado][byte] = len(filhos)
+                    filhos.append({})
+                    saidas.append(0)
+                estado = filhos[estado][byte]
+            saidas[estado] |= 1 << i
+
+        transicoes = np.zeros((len(filhos), 256), dtype=np.int32)
+        falha = [0] * len(filhos)
+        fila = deque(filhos[0].values())
+        for byte, filho in filhos[0].items():
+            transicoes[0, byte] = filho
+        while fila:
+            estado = fila.popleft()
+            transicoes[estado] = transicoes[falha[estado]]
+            saidas[estado] |= saidas[falha[estado]]
+            for byte, filho in filhos[estado].items():
+                falha[filho] = int(transicoes[falha[estado], byte])
+                transicoes[estado, byte] = filho
+                fila.append(filho)
+
+        palavras = max(1, -(-len(termos) // 64))
+        matriz = np.array([[(s >> (64 * p)) & (2**64 - 1) for p in range(palavras)] for s in saidas],
+                          dtype=np.uint64)
+        return cls(transicoes, matriz)
+
+    def varrer(self, texto, inicios, tamanhos):
+        # Máscara (linhas x palavras) dos termos contidos em cada linha;
+        # inicios/tamanhos em ordem decrescente de tamanho
+        n = len(inicios)
+        estado = np.zeros(n, dtype=np.int64)
+        achados = np.zeros((n, self.saidas.shape[1]), dtype=np.uint64)
+        if not n:
+            return achados
+        # Linhas que ainda têm o k-ésimo byte (tamanho > k)
+        ativas = np.searchsorted(-tamanhos, -np.arange(int(tamanhos[0])), side='left')
+        posicao = inicios.astype(np.int64)
+        for a in ativas:
+            atual = self._tabela[estado[:a] + texto[posicao[:a]]]
+            estado[:a] = atual
+            posicao[:a] += 1
+            final = self._finais[atual]
+            if final.any():
+                pos = np.flatnonzero(final)
+                achados[pos] |= self.saidas[atual[pos] // 256]
+        return achados
+
+
+def _tem_termo(achados, i):
+    return (achados[:, i // 64] >> np.uint64(i % 64)) & np.uint64(1) != 0
+
+
+class BuscaSinonimos:
+    def __init__(self, indice, ranqueada, dicionario=None):
+        # indice: IndiceNgramas (o texto normalizado); ranqueada: BuscaRanqueada
+        # do mesmo CSV, para as notas e para o termo sem sinônimos
+        self.indice = indice
+        self.ranqueada = ranqueada
+        self.dicionario = dicionario
+        self._automatos = OrderedDict()
+        self._ordem = None
+
+    def termos(self, termo):
+        return expandir(termo, self.dicionario)
+
+    def automato(self, termos):
+        chave = tuple(termos)
+        automato = self._automatos.pop(chave, None) or Automato.construir(termos)
+        self._automatos[chave] = automato
+        if len(self._automatos) > MAX_AUTOMATOS:
+            self._automatos.popitem(last=False)
+        return automato
+
+    def _linhas_por_tamanho(self):
+        # (ordem, inicios, tamanhos) das linhas do texto, da maior para a menor
+        if self._ordem is None:
+            offsets = np.asarray(self.indice.texto_offsets)
+            tamanhos = np.diff(offsets) - 1  # sem o '\x00' separador
+            ordem = np.argsort(-tamanhos, kind='stable')
+            self._ordem = (ordem, offsets[:-1][ordem], tamanhos[ordem])
+        return self._ordem
+
+    def achados(self, termos):
+        # (linhas em ordem crescente, máscara dos termos de cada uma) das
+        # linhas que contêm algum dos termos
+        ordem, inicios, tamanhos = self._linhas_por_tamanho()
+        mascara = self.automato(termos).varrer(np.asarray(self.indice.texto), inicios, tamanhos)
+        algum = mascara.any(axis=1)
+        linhas, mascara = ordem[algum], mascara[algum]
+        crescente = np.argsort(linhas, kind='stable')
+        return linhas[crescente].astype(np.int64), mascara[crescente]
+
+    def buscar(self, termo, limite=10, offset=0):
+        # Retorna (linhas, notas, termos, total) da página pedida: termos é o
+        # termo (digitado ou sinônimo) que levou cada linha ao resultado
+        termos = self.termos(termo)
+        if len(termos) == 1:
+            linhas, notas, total = self.ranqueada.buscar(termos[0], limite=limite, offset=offset)
+            return linhas, notas, np.full(len(linhas), termos[0], dtype=object), total
+
+        linhas, mascara = self.achados(termos)
+        total = len(linhas)
+        fim = min(offset + limite, total)
+        if offset >= fim:
+            return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0, dtype=object), total
+
+        exata = _tem_termo(mascara, 0)
+        notas = np.zeros(total)
+        termo_linha = np.zeros(total, dtype=np.int64)
+        notas[exata] = self.ranqueada.pontuar(termos[0], linhas[exata])
+        if exata.sum() < fim:
+            # A página chega às linhas que só têm sinônimos
+            for i, sinonimo in enumerate(termos[1:], 1):
+                pos = np.flatnonzero(~exata & _tem_termo(mascara, i))
+                if not len(pos):
+                    continue
+                nota = self.ranqueada.pontuar(sinonimo, linhas[pos]) * PESO_SINONIMO
+                melhor = (termo_linha[pos] == 0) | (nota > notas[pos])
+                notas[pos[melhor]] = nota[melhor]
+                termo_linha[pos[melhor]] = i
+        ordem = np.lexsort((linhas, -notas, ~exata))[offset:fim]
+        return linhas[ordem], notas[ordem], np.array(termos, dtype=object)[termo_linha[ordem]], total
@@ -0,0 +1,113 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Cache LRU com validade (TTL) e teto de memória para resultados de busca.
+#
+# Cada entrada guarda a geração dos dados de onde saiu (ex.: as assinaturas
+# dos CSV de Planilhas_Limpas); uma consulta com outra geração descarta a
+# entrada em vez de devolvê-la, então basta o cleaner regravar um CSV para
+# os resultados antigos deixarem de valer. Seguro para várias threads: o
+# cálculo de um resultado novo acontece fora da trava.
+
+
+def tamanho_aproximado(valor):
+    # Bytes ocupados por um resultado (DataFrame, array, tuplas/listas/dicts deles)
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(index=True, deep=True).sum())
+    if isinstance(valor, pd.Series):
+        return int(valor.memory_usage(index=True, deep=True))
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes + 112
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(tamanho_aproximado(k) + tamanho_aproximado(v) for k, v in valor.items())
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(tamanho_aproximado(v) for v in valor)
+    return sys.getsizeof(valor)
+
+
+class CacheLRU:
+    def __init__(self, max_itens=1024, max_bytes=64 * 2**20, ttl=600.0, relogio=time.monotonic):
+        self.max_itens = max_itens
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.relogio = relogio
+        self._itens = OrderedDict()  # chave -> (valor, tamanho, expira_em, geracao)
+        self._trava = threading.Lock()
+        self.bytes = 0
+        self.acertos = 0
+        self.falhas = 0
+        self.despejos = 0    # saíram por falta de espaço
+        self.expirados = 0   # passaram do TTL
+        self.invalidados = 0 # geração antiga
+
+    def __len__(self):
+        return len(self._itens)
+
+    def _remover(self, chave):
+        _, tamanho, _, _ = self._itens.pop(chave)
+        self.bytes -= tamanho
+
+    def obter(self, chave, geracao=None):
+        # (True, valor) ou (False, None)
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is not None:
+                valor, _, expira_em, geracao_item = item
+                if geracao_item != geracao:
+                    self._remover(chave)
+                    self.invalidados += 1
+                elif expira_em <= self.relogio():
+                    self._remover(chave)
+                    self.expirados += 1
+                else:
+                    self._itens.move_to_end(chave)
+                    self.acertos += 1
+                    return True, valor
+            self.falhas += 1
+            return False, None
+
+    def guardar(self, chave, valor, geracao=None, tamanho=None):
+        tamanho = tamanho_aproximado(valor) if tamanho is None else tamanho
+        if tamanho > self.max_bytes:
+            # Maior que o cache inteiro: não vale despejar tudo por ele
+            return
+        with self._trava:
+            if chave in self._itens:
+                self._remover(chave)
+            self._itens[chave] = (valor, tamanho, self.relogio() + self.ttl, geracao)
+            self.bytes += tamanho
+            while len(self._itens) > self.max_itens or self.bytes > self.max_bytes:
+                self._remover(next(iter(self._itens)))
+                self.despejos += 1
+
+    def obter_ou_calcular(self, chave, calcular, geracao=None):
+        achou, valor = self.obter(chave, geracao)
+        if not achou:
+            valor = calcular()
+            self.guardar(chave, valor, geracao)
+        return valor
+
+    def descartar_geracao(self, geracao):
+        # Remove já as entradas de outras gerações (em vez de esperar a
+        # próxima consulta a cada uma), devolvendo a memória na hora
+        with self._trava:
+            antigas = [chave for chave, item in self._itens.items() if item[3] != geracao]
+            for chave in antigas:
+                self._remover(chave)
+            self.invalidados += len(antigas)
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+            self.bytes = 0
+
+    def estatisticas(self):
+        consultas = self.acertos + self.falhas
+        return {'itens': len(self._itens), 'bytes': self.bytes, 'acertos': self.acertos,
+                'falhas': self.falhas, 'taxa_acerto': self.acertos / consultas if consultas else 0.0,
+                'despejos': self.despejos, 'expirados': self.expirados, 'invalidados': self.invalidados}
@@ -0,0 +1,167 @@
+import io
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from instrumentacao import contar, etapa
+
+# Carga em lote para as tabelas referencia_* do Supabase.
+#
+# CarregadorLotes envia os registros em lotes concorrentes (pool limitado de
+# threads), com upsert pela chave natural quando houver, tamanho de lote
+# adaptativo (cresce enquanto dá certo, cai pela metade quando um lote
+# falha) e novas tentativas com backoff exponencial em cada lote.
+#
+# carregar_via_copy faz o mesmo direto no Postgres com COPY, para quando há
+# uma connection string disponível (ex.: DATABASE_URL). As remoções da
+# importação (tabela inteira ou chaves alteradas) rodam na mesma conexão e
+# transação do COPY: se a carga falha, nada foi apagado.
+
+
+def para_registros(df):
+    # DataFrame -> lista de dicts prontos para JSON (NaN/NA viram None)
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+class CarregadorLotes:
+    def __init__(self, cliente, tabela, conflito=None, workers=4, lote=500, lote_min=25,
+                 lote_max=5000, tentativas=5, espera_base=0.5):
+        self.cliente = cliente
+        self.tabela = tabela
+        self.conflito = conflito
+        self.workers = workers
+        self.lote = lote
+        self.lote_min = lote_min
+        self.lote_max = lote_max
+        self.tentativas = tentativas
+        self.espera_base = espera_base
+
+        self._trava = threading.Lock()
+        self.enviados = 0
+        self.retentativas = 0
+        self.falhas = []
+
+    def _escrever(self, lote):
+        consulta = self.cliente.table(self.tabela)
+        if self.conflito:
+            consulta.upsert(lote, on_conflict=self.conflito).execute()
+        else:
+            consulta.insert(lote).execute()
+
+    def _ajustar(self, sucesso):
+        with self._trava:
+            if sucesso:
+                self.lote = min(self.lote_max, int(self.lote * 1.25) + 1)
+            else:
+                self.lote = max(self.lote_min, self.lote // 2)
+
+    def _enviar_lote(self, lote, total):
+        for tentativa in range(self.tentativas):
+            try:
+                with etapa('importacao.lote', tabela=self.tabela, linhas=len(lote), tentativa=tentativa):
+                    self._escrever(lote)
+                self._ajustar(True)
+                with self._trava:
+                    self.enviados += len(lote)
+                    print(f"Progresso: {self.enviados}/{total}", end='\r')
+                return
+            except Exception as e:
+                erro = e
+                self._ajustar(False)
+                with self._trava:
+                    self.retentativas += 1
+                contar('importacao.retentativas', tabela=self.tabela)
+                # Lote grande demais (timeout/payload): divide e tenta as metades
+                if len(lote) > self.lote_min and tentativa > 0:
+                    meio = len(lote) // 2
+                    self._enviar_lote(lote[:meio], total)
+                    self._enviar_lote(lote[meio:], total)
+                    return
+                time.sleep(self.espera_base * (2 ** tentativa) * random.uniform(0.5, 1.5))
+        print(f"\nErro no lote de {len(lote)} linhas de {self.tabela}: {erro}")
+        with self._trava:
+            self.falhas.append((len(lote), str(erro)))
+
+    def enviar(self, registros):
+        # Retorna True se todos os lotes foram gravados
+        total = len(registros)
+        if not total:
+            return True
+        # No máximo workers * 2 lotes em voo; o próximo lote já sai com o
+        # tamanho ajustado pelos anteriores
+        vagas = threading.BoundedSemaphore(self.workers * 2)
+
+        def tarefa(lote):
+            try:
+                self._enviar_lote(lote, total)
+            finally:
+                vagas.release()
+
+        with etapa('importacao.enviar', tabela=self.tabela, linhas=total), \
+                ThreadPoolExecutor(max_workers=self.workers) as pool:
+            i = 0
+            while i < total:
+                vagas.acquire()
+                with self._trava:
+                    tamanho = self.lote
+                pool.submit(tarefa, registros[i:i + tamanho])
+                i += tamanho
+        print()
+        return not self.falhas
+
+
+def _apagar_sql(cur, tabela, chave, valores, lote=10_000):
+    # valores: uma lista por linha, na ordem das colunas de chave (None = NULL)
+    if len(chave) == 1:
+        col = chave[0]
+        preenchidos = [v for (v,) in valores if v is not None]
+        for i in range(0, len(preenchidos), lote):
+            cur.execute(f'DELETE FROM public.{tabela} WHERE "{col}" = ANY(%s)', (preenchidos[i:i + lote],))
+        if len(preenchidos) < len(valores):
+            cur.execute(f'DELETE FROM public.{tabela} WHERE "{col}" IS NULL')
+        return
+    for partes in valores:
+        condicoes = [f'"{col}" IS NULL' if v is None else f'"{col}" = %s' for col, v in zip(chave, partes)]
+        cur.execute(f'DELETE FROM public.{tabela} WHERE {" AND ".join(condicoes)}',
+                    [v for v in partes if v is not None])
+
+
+def carregar_via_copy(dsn, tabela, df, conflito=None, bloco=100_000, apagar_tudo=False, chave=None, apagar=()):
+    # COPY para uma tabela temporária e INSERT ... ON CONFLICT na tabela final.
+    # Antes, na mesma transação, esvazia a tabela (apagar_tudo) ou apaga as
+    # linhas das chaves em apagar (valores na ordem das colunas de chave).
+    # Requer o psycopg 3 (pip install "psycopg[binary]"); sem ele levanta
+    # RuntimeError e quem chamou decide o que fazer
+    try:
+        import psycopg
+    except ImportError as e:
+        raise RuntimeError("o modo COPY precisa do pacote psycopg (pip install \"psycopg[binary]\")") from e
+
+    colunas = ", ".join(f'"{c}"' for c in df.columns)
+    if conflito:
+        atualiza = ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in df.columns if c != conflito)
+        conflito_sql = f' ON CONFLICT ("{conflito}") DO UPDATE SET {atualiza}'
+        # Linhas sem chave não entram no ON CONFLICT (NULL nunca conflita)
+        df = pd.concat([df[df[conflito].isna()],
+                        df[df[conflito].notna()].drop_duplicates(subset=[conflito], keep='last')])
+    else:
+        conflito_sql = ''
+
+    with etapa('importacao.copy', tabela=tabela, linhas=len(df)), \
+            psycopg.connect(dsn) as conn, conn.cursor() as cur:
+        with etapa('importacao.apagar', tabela=tabela, linhas=len(apagar)):
+            if apagar_tudo:
+                cur.execute(f'DELETE FROM public.{tabela}')
+            elif apagar:
+                _apagar_sql(cur, tabela, chave, apagar)
+        cur.execute(f'CREATE TEMP TABLE carga (LIKE public.{tabela} INCLUDING DEFAULTS) ON COMMIT DROP')
+        with cur.copy(f"COPY carga ({colunas}) FROM STDIN WITH (FORMAT csv)") as copy:
+            for i in range(0, len(df), bloco):
+                buffer = io.StringIO()
+                df.iloc[i:i + bloco].to_csv(buffer, index=False, header=False)
+                copy.write(buffer.getvalue())
+        cur.execute(f'INSERT INTO public.{tabela} ({colunas}) SELECT {colunas} FROM carga{conflito_sql}')
+        return cur.rowcount
@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from numeros_br import avisar_invalidos, converter_colunas
+
+# Estatísticas da cesta de preços por item, numa tabela longa de cotações
+# (item, fonte, preço, data, UF) que pode ter milhões de linhas (PNCP).
+#
+# Tudo sai de uma ordenação só: as cotações são ordenadas por (grupo, preço)
+# e cada grupo vira uma faixa contígua do vetor, então média, variância,
+# quartis, mediana e média saneada são somas por faixa e posições dentro
+# das faixas, sem groupby/apply por item.
+#
+# Cotações fora da faixa são excluídas antes das estatísticas finais:
+#   iqr    - fora de [Q1 - k*IQR, Q3 + k*IQR]
+#   zscore - |preço - média| / desvio padrão > limite_z
+# Itens com menos de MIN_COTACOES cotações válidas não têm exclusão. A
+# tabela de cotações volta com a coluna 'excluida' e o motivo, e o
+# relatório grava os parâmetros usados, para poder ser refeito igual.
+
+MIN_COTACOES = 4
+FATOR_IQR = 1.5
+LIMITE_Z = 3.0
+CORTE_MEDIA_SANEADA = 0.1  # fração descartada em cada ponta
+
+METODOS = ('iqr', 'zscore', 'ambos', 'nenhum')
+
+
+def _faixas(grupos, n_grupos):
+    # Início e tamanho da faixa de cada grupo (grupos já ordenado)
+    tamanhos = np.bincount(grupos, minlength=n_grupos)
+    inicios = np.concatenate([[0], np.cumsum(tamanhos)[:-1]])
+    return inicios, tamanhos
+
+
+def _quantil(valores, inicios, tamanhos, q):
+    # Quantil com interpolação linear (o padrão do numpy) dentro de cada
+    # faixa ordenada. valores leva um NaN no fim, que é o que os grupos
+    # vazios leem
+    h = (np.maximum(tamanhos, 1) - 1) * q
+    baixo = np.floor(h).astype(np.int64)
+    alto = np.minimum(baixo + 1, np.maximum(tamanhos - 1, 0))
+    vazio = len(valores) - 1
+    v_baixo = valores[np.where(tamanhos > 0, inicios + baixo, vazio)]
+    v_alto = valores[np.where(tamanhos > 0, inicios + alto, vazio)]
+    return v_baixo + (h - baixo) * (v_alto - v_baixo)
+
+
+def _soma_faixas(valores, inicios, fins):
+    # Soma de valores[inicio:fim] de cada faixa, cada uma somada à parte
+    # (reduceat). A diferença de uma soma acumulada global perde a precisão
+    # de um item barato ordenado depois de itens caros
+    if not len(inicios):
+        return np.zeros(0)
+    pontos = np.stack([inicios, fins], axis=1).ravel()
+    soma = np.add.reduceat(np.append(valores, 0.0), pontos)[::2]
+    return np.where(fins > inicios, soma, 0.0)
+
+
+def _estatisticas(valores, grupos, n_grupos, corte):
+    # valores ordenados por (grupo, valor). Devolve dict de vetores por grupo
+    inicios, tamanhos = _faixas(grupos, n_grupos)
+    fins = inicios + tamanhos
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = _soma_faixas(valores, inicios, fins) / tamanhos
+        # Variância amostral pelos desvios em relação à média do grupo (a
+        # fórmula soma dos quadrados - n*média² perde precisão com preços altos)
+        desvios = valores - media[grupos]
+        desvio = np.sqrt(_soma_faixas(desvios * desvios, inicios, fins) / (tamanhos - 1))
+        desvio[tamanhos < 2] = np.nan
+        # Média saneada: descarta floor(corte * n) cotações em cada ponta
+        cortadas = np.floor(corte * tamanhos).astype(np.int64)
+        saneada = _soma_faixas(valores, inicios + cortadas, fins - cortadas) / (tamanhos - 2 * cortadas)
+    com_nan = np.append(valores, np.nan)
+    return {
+        'tamanhos': tamanhos, 'media': media, 'desvio': desvio,
+        'q1': _quantil(com_nan, inicios, tamanhos, 0.25),
+        'mediana': _quantil(com_nan, inicios, tamanhos, 0.5),
+        'q3': _quantil(com_nan, inicios, tamanhos, 0.75),
+        'media_saneada': saneada,
+        'minimo': _quantil(com_nan, inicios, tamanhos, 0.0),
+        'maximo': _quantil(com_nan, inicios, tamanhos, 1.0),
+    }
+
+
+def estatisticas_cesta(cotacoes, por=('item',), preco='preco', metodo='iqr', fator_iqr=FATOR_IQR,
+                       limite_z=LIMITE_Z, corte=CORTE_MEDIA_SANEADA, min_cotacoes=MIN_COTACOES):
+    # Retorna (resumo, cotacoes). resumo: uma linha por grupo (colunas de
+    # 'por'); cotacoes: a tabela de entrada, na mesma ordem, com as colunas
+    # 'excluida' e 'motivo'. O preço deve ser numérico (NaN/<= 0 = inválido).
+    if metodo not in METODOS:
+        raise ValueError(f"Método de exclusão desconhecido: {metodo} (use {', '.join(METODOS)})")
+    por = list(por)
+    valores = pd.to_numeric(cotacoes[preco], errors='coerce').to_numpy(np.float64)
+    grupos = cotacoes.groupby(por, sort=True, dropna=False, observed=True)
+    grupo = grupos.ngroup().to_numpy(np.int64)
+    chaves = grupos.size().index.to_frame(index=False)
+    n_grupos = len(chaves)
+
+    validas = np.isfinite(valores) & (valores > 0)
+    motivo = np.where(validas, '', 'preco_invalido').astype(object)
+
+    # Ordena as válidas por (grupo, preço): cada grupo vira uma faixa
+    idx = np.flatnonzero(validas)
+    ordem = idx[np.lexsort((valores[idx], grupo[idx]))]
+    v, g = valores[ordem], grupo[ordem]
+    todas = _estatisticas(v, g, n_grupos, corte)
+
+    # Exclusão de outliers, sempre sobre a amostra válida completa
+    com_exclusao = todas['tamanhos'][g] >= min_cotacoes
+    fora_iqr = np.zeros(len(v), dtype=bool)
+    fora_z = np.zeros(len(v), dtype=bool)
+    iqr = todas['q3'] - todas['q1']
+    limite_inferior = todas['q1'] - fator_iqr * iqr
+    limite_superior = todas['q3'] + fator_iqr * iqr
+    if metodo in ('iqr', 'ambos'):
+        fora_iqr = com_exclusao & ((v < limite_inferior[g]) | (v > limite_superior[g]))
+    if metodo in ('zscore', 'ambos'):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            z = np.abs(v - todas['media'][g]) / todas['desvio'][g]
+        fora_z = com_exclusao & (z > limite_z)
+    fora = fora_iqr | fora_z
+    motivo[ordem[fora_iqr & fora_z]] = 'iqr+zscore'
+    motivo[ordem[fora_iqr & ~fora_z]] = 'iqr'
+    motivo[ordem[fora_z & ~fora_iqr]] = 'zscore'
+
+    # Estatísticas finais só com as mantidas (continuam ordenadas por grupo)
+    final = _estatisticas(v[~fora], g[~fora], n_grupos, corte)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cv = final['desvio'] / final['media']
+
+    resumo = chaves.copy()
+    resumo['cotacoes'] = np.bincount(grupo, minlength=n_grupos)
+    resumo['validas'] = todas['tamanhos']
+    resumo['excluidas'] = todas['tamanhos'] - final['tamanhos']
+    resumo['usadas'] = final['tamanhos']
+    for col in ('media', 'mediana', 'media_saneada', 'minimo', 'maximo', 'desvio', 'q1', 'q3'):
+        resumo[col] = final[col]
+    resumo['cv'] = cv
+    resumo['limite_inferior'] = np.where(todas['tamanhos'] >= min_cotacoes, limite_inferior, np.nan) \
+        if metodo in ('iqr', 'ambos') else np.nan
+    resumo['limite_superior'] = np.where(todas['tamanhos'] >= min_cotacoes, limite_superior, np.nan) \
+        if metodo in ('iqr', 'ambos') else np.nan
+
+    saida = cotacoes.copy()
+    saida['excluida'] = motivo != ''
+    saida['motivo'] = motivo
+    return resumo, saida
+
+
+def parametros(metodo, fator_iqr, limite_z, corte, min_cotacoes, por, desde=None):
+    return {'metodo': metodo, 'fator_iqr': fator_iqr, 'limite_z': limite_z,
+            'corte_media_saneada': corte, 'min_cotacoes': min_cotacoes, 'agrupado_por': list(por),
+            'desde': desde}
+
+
+def gravar_relatorio(resumo, cotacoes, params, destino):
+    # .xlsx: abas resumo/cotacoes/parametros; senão <destino>_resumo.csv,
+    # <destino>_cotacoes.csv e <destino>_parametros.json
+    if destino.lower().endswith('.xlsx'):
+        with pd.ExcelWriter(destino) as w:
+            resumo.to_excel(w, sheet_name='resumo', index=False)
+            cotacoes.to_excel(w, sheet_name='cotacoes', index=False)
+            pd.DataFrame(list(params.items()), columns=['parametro', 'valor']).astype(str) \
+                .to_excel(w, sheet_name='parametros', index=False)
+        return [destino]
+    base = os.path.splitext(destino)[0]
+    resumo.to_csv(f"{base}_resumo.csv", index=False, encoding='utf-8-sig')
+    cotacoes.to_csv(f"{base}_cotacoes.csv", index=False, encoding='utf-8-sig')
+    with open(f"{base}_parametros.json", 'w', encoding='utf-8') as f:
+        json.dump(params, f, ensure_ascii=False, indent=2)
+    return [f"{base}_resumo.csv", f"{base}_cotacoes.csv", f"{base}_parametros.json"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estatísticas da cesta de preços por item, com exclusão de outliers")
+    parser.add_argument('entrada', help="tabela de cotações (.csv, .xlsx ou .jsonl)")
+    parser.add_argument('-o', '--saida', help="relatório (.xlsx ou base dos .csv; padrão: <entrada>_cesta)")
+    parser.add_argument('--item', default='item', help="coluna do item (padrão: item)")
+    parser.add_argument('--preco', default='preco', help="coluna do preço (padrão: preco)")
+    parser.add_argument('--uf', default='uf', help="coluna da UF (padrão: uf)")
+    parser.add_argument('--data', default='data', help="coluna da data (padrão: data)")
+    parser.add_argument('--por-uf', action='store_true', help="estatísticas por item e UF")
+    parser.add_argument('--desde', help="só cotações com data >= AAAA-MM-DD")
+    parser.add_argument('--metodo', choices=METODOS, default='iqr', help="exclusão de outliers (padrão: iqr)")
+    parser.add_argument('--fator-iqr', type=float, default=FATOR_IQR)
+    parser.add_argument('--limite-z', type=float, default=LIMITE_Z)
+    parser.add_argument('--corte', type=float, default=CORTE_MEDIA_SANEADA,
+                        help="fração cortada em cada ponta na média saneada (padrão: 0.1)")
+    parser.add_argument('--min-cotacoes', type=int, default=MIN_COTACOES)
+    args = parser.parse_args()
+
+    if args.entrada.lower().endswith('.xlsx'):
+        df = pd.read_excel(args.entrada)
+    elif args.entrada.lower().endswith('.jsonl'):
+        df = pd.read_json(args.entrada, lines=True)
+    else:
+        df = pd.read_csv(args.entrada)
+    # Preço em pt-BR ('1.234,56') ou já numérico
+    avisar_invalidos(converter_colunas(df, [args.preco]), args.entrada)
+    if args.desde:
+        datas = pd.to_datetime(df[args.data], errors='coerce')
+        df = df[datas >= pd.Timestamp(args.desde)].reset_index(drop=True)
+    por = [args.item] + ([args.uf] if args.por_uf else [])
+
+    resumo, cotacoes = estatisticas_cesta(df, por, args.preco, args.metodo, args.fator_iqr,
+                                          args.limite_z, args.corte, args.min_cotacoes)
+    params = parametros(args.metodo, args.fator_iqr, args.limite_z, args.corte, args.min_cotacoes, por, args.desde)
+    arquivos = gravar_relatorio(resumo, cotacoes, params,
+                                args.saida or f"{os.path.splitext(args.entrada)[0]}_cesta")
+    print(f"{len(resumo)} itens, {len(cotacoes)} cotações, {int(cotacoes['excluida'].sum())} excluídas.")
+    print("Relatório: " + ", ".join(arquivos))
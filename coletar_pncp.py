@@ -0,0 +1,380 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import deque
+from datetime import date
+
+import httpx
+
+# Coleta de itens de contratações do PNCP para a tabela referencia_pncp
+# (substitui o scripts/sync_pncp_2026.cjs).
+#
+#   python coletar_pncp.py --data-inicial 20260101
+#   python coletar_pncp.py --base-url http://localhost:8080 --saida itens.jsonl
+#
+# As modalidades são percorridas em paralelo; dentro de cada uma, algumas
+# páginas são buscadas adiante e os /itens de todos os contratos da página
+# saem ao mesmo tempo. Todas as requisições passam por um token bucket que
+# reduz a taxa quando o PNCP responde 429 e volta a subir aos poucos.
+#
+# As linhas ficam num buffer e são gravadas em lote (CarregadorLotes, ou um
+# arquivo JSONL com --saida). O checkpoint (modalidade, página e último
+# contrato gravado, por CNPJ, ano e sequencialCompra: o sequencial só é
+# único dentro do órgão e do ano) só avança depois da gravação, então uma coleta
+# interrompida continua de onde parou sem perder contratos (só o último lote
+# pode se repetir, se a interrupção cair entre a gravação e o checkpoint).
+#
+# benchmarks/servidor_pncp.py sobe um PNCP local (paginação, 429) para
+# testar a coleta sem a API de verdade.
+
+BASE_URL = "https://pncp.gov.br/api"
+CAMINHO_CONSULTA = "/consulta/v1/contratacoes/publicacao"
+CAMINHO_ITENS = "/pncp/v1/orgaos/{cnpj}/compras/{ano}/{seq}/itens"
+LINK_EDITAL = "https://pncp.gov.br/app/editais/{cnpj}/{ano}/{seq}"
+
+MODALIDADES = [6, 13, 8, 10, 14, 15]  # Principais modalidades de contratação
+TAMANHO_PAGINA = 50
+TABELA = "referencia_pncp"
+ARQUIVO_CHECKPOINT = os.path.join("Planilhas_Limpas", "pncp_checkpoint.json")
+
+
+class LimitadorTaxa:
+    # Token bucket: 'taxa' requisições por segundo, com rajadas de até
+    # 'capacidade'. Um 429 corta a taxa pela metade (e respeita o
+    # Retry-After); cada sucesso devolve um pouco dela, até a taxa máxima.
+    def __init__(self, taxa=5.0, capacidade=10, taxa_min=0.5):
+        self.taxa_max = taxa
+        self.taxa = taxa
+        self.taxa_min = taxa_min
+        self.capacidade = capacidade
+        self.tokens = capacidade
+        self.ultimo = time.monotonic()
+        self.pausa_ate = 0.0
+        self._trava = asyncio.Lock()
+
+    async def aguardar(self):
+        async with self._trava:
+            while True:
+                agora = time.monotonic()
+                if agora < self.pausa_ate:
+                    await asyncio.sleep(self.pausa_ate - agora)
+                    continue
+                self.tokens = min(self.capacidade, self.tokens + (agora - self.ultimo) * self.taxa)
+                self.ultimo = agora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.taxa)
+
+    def penalizar(self, retry_after=None):
+        self.taxa = max(self.taxa_min, self.taxa / 2)
+        self.tokens = 0
+        espera = retry_after if retry_after is not None else 1 / self.taxa
+        self.pausa_ate = max(self.pausa_ate, time.monotonic() + espera)
+
+    def recompensar(self):
+        self.taxa = min(self.taxa_max, self.taxa + 0.05 * self.taxa_max)
+
+
+async def obter_json(cliente, limitador, url, params=None, tentativas=6):
+    # None para 204/404 (página ou contrato sem itens); exceção depois das tentativas
+    for tentativa in range(tentativas):
+        await limitador.aguardar()
+        try:
+            resposta = await cliente.get(url, params=params)
+        except httpx.TransportError as e:
+            erro = e
+        else:
+            if resposta.status_code == 429:
+                retry = resposta.headers.get('Retry-After')
+                limitador.penalizar(float(retry) if retry and retry.isdigit() else None)
+                erro = f"429 em {url}"
+                continue
+            if resposta.status_code in (204, 404):
+                limitador.recompensar()
+                return None
+            if resposta.status_code < 500:
+                resposta.raise_for_status()
+                limitador.recompensar()
+                return resposta.json()
+            erro = f"{resposta.status_code} em {url}"
+        await asyncio.sleep(0.5 * (2 ** tentativa) * random.uniform(0.5, 1.5))
+    raise RuntimeError(f"Falha após {tentativas} tentativas: {erro}")
+
+
+def chave_contrato(contrato):
+    # [cnpj, ano, sequencial] (lista, para comparar com a lida do JSON)
+    orgao = contrato.get('orgaoEntidade') or {}
+    return [orgao.get('cnpj'), contrato.get('anoCompra'), contrato.get('sequencialCompra')]
+
+
+def linhas_contrato(contrato, itens):
+    # Mesmo mapeamento do sync_pncp_2026.cjs
+    orgao = contrato.get('orgaoEntidade') or {}
+    unidade = contrato.get('unidadeOrgao') or {}
+    cnpj = orgao.get('cnpj')
+    ano = contrato.get('anoCompra')
+    seq = contrato.get('sequencialCompra')
+    linhas = []
+    for item in itens or []:
+        linha = {
+            'item_nome': (item.get('descricao') or item.get('materialOuServicoDescricao') or "Sem nome").strip(),
+            'item_descricao': item.get('materialOuServicoDescricao') or None,
+            'unidade': item.get('unidadeMedida') or "un",
+            'quantidade': item.get('quantidade') or 1,
+            'valor_unitario': item.get('valorUnitarioHomologado') or item.get('valorUnitarioEstimado') or 0,
+            'valor_total': item.get('valorTotal') or 0,
+            'data_publicacao': contrato.get('dataPublicacaoPncp'),
+            'orgao_nome': orgao.get('razaoSocial'),
+            'orgao_cnpj': cnpj,
+            'municipio': unidade.get('municipioNome') or "",
+            'uf': unidade.get('ufSigla') or orgao.get('ufSigla') or "",
+            'modalidade': contrato.get('modalidadeNome'),
+            'sequencial_compra': seq,
+            'ano_compra': ano,
+            'link_pncp': LINK_EDITAL.format(cnpj=cnpj, ano=ano, seq=seq),
+        }
+        if linha['valor_unitario'] > 0:
+            linhas.append(linha)
+    return linhas
+
+
+def carregar_checkpoint(caminho):
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def salvar_checkpoint(caminho, checkpoint):
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    temporario = f"{caminho}.tmp-{os.getpid()}"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=1)
+    os.replace(temporario, caminho)
+
+
+class Gravador:
+    # Buffer de linhas compartilhado pelas modalidades. Cada contrato entra
+    # com um marcador (modalidade, {pagina, ultimo_contrato}); depois que o
+    # lote é gravado os marcadores avançam o checkpoint, que é salvo em disco.
+    def __init__(self, gravar, checkpoint, caminho_checkpoint, tamanho=2000, max_itens=None):
+        self.gravar = gravar
+        self.checkpoint = checkpoint
+        self.caminho = caminho_checkpoint
+        self.tamanho = tamanho
+        self.max_itens = max_itens
+        self.linhas = []
+        self.marcadores = []
+        self._trava = asyncio.Lock()
+
+    @property
+    def total(self):
+        return self.checkpoint['total']
+
+    def limite_atingido(self):
+        return self.max_itens is not None and self.total + len(self.linhas) >= self.max_itens
+
+    async def adicionar(self, linhas, marcador):
+        async with self._trava:
+            self.linhas.extend(linhas)
+            self.marcadores.append(marcador)
+            if len(self.linhas) >= self.tamanho:
+                await self._descarregar()
+
+    async def descarregar(self):
+        async with self._trava:
+            await self._descarregar()
+
+    async def _descarregar(self):
+        linhas, self.linhas = self.linhas, []
+        marcadores, self.marcadores = self.marcadores, []
+        if linhas:
+            try:
+                # O cliente do Supabase é síncrono: a gravação roda numa thread
+                await asyncio.to_thread(self.gravar, linhas)
+            except Exception:
+                # Nada avança no checkpoint; o lote volta para o buffer
+                self.linhas = linhas + self.linhas
+                self.marcadores = marcadores + self.marcadores
+                raise
+        for mod, atualizacao in marcadores:
+            self.checkpoint['modalidades'][str(mod)].update(atualizacao)
+        self.checkpoint['total'] += len(linhas)
+        salvar_checkpoint(self.caminho, self.checkpoint)
+        if linhas:
+            print(f"  +{len(linhas)} itens gravados (total: {self.total})")
+
+
+async def coletar_modalidade(mod, cliente, limitador, gravador, base_url, datas, paginas_adiante=3):
+    estado = gravador.checkpoint['modalidades'][str(mod)]
+    if estado.get('concluida'):
+        print(f"Modalidade {mod}: já concluída no checkpoint.")
+        return
+    url = base_url + CAMINHO_CONSULTA
+
+    def buscar_pagina(pagina):
+        params = {'dataInicial': datas[0], 'dataFinal': datas[1], 'tamanhoPagina': TAMANHO_PAGINA,
+                  'pagina': pagina, 'codigoModalidadeContratacao': mod}
+        return asyncio.ensure_future(obter_json(cliente, limitador, url, params))
+
+    async def buscar_itens(contrato):
+        orgao = contrato.get('orgaoEntidade') or {}
+        caminho = CAMINHO_ITENS.format(cnpj=orgao.get('cnpj'), ano=contrato.get('anoCompra'),
+                                       seq=contrato.get('sequencialCompra'))
+        return await obter_json(cliente, limitador, base_url + caminho)
+
+    pagina = estado.get('pagina', 1)
+    ultimo_gravado = estado.get('ultimo_contrato')
+    total_paginas = None
+    pendentes = deque([(pagina, buscar_pagina(pagina))])
+    try:
+        while pendentes:
+            pagina, tarefa = pendentes.popleft()
+            resposta = await tarefa
+            contratos = (resposta or {}).get('data') or []
+            if not contratos:
+                break
+            if total_paginas is None:
+                total_paginas = resposta.get('totalPaginas') or pagina
+                print(f"Modalidade {mod}: {total_paginas} páginas (retomando da {pagina}).")
+            # Busca adiante as próximas páginas enquanto esta é processada
+            proxima = (pendentes[-1][0] if pendentes else pagina) + 1
+            while len(pendentes) < paginas_adiante and proxima <= total_paginas:
+                pendentes.append((proxima, buscar_pagina(proxima)))
+                proxima += 1
+
+            # Na página do checkpoint, pula os contratos já gravados
+            if ultimo_gravado is not None:
+                chaves = [chave_contrato(c) for c in contratos]
+                if ultimo_gravado in chaves:
+                    contratos = contratos[chaves.index(ultimo_gravado) + 1:]
+                ultimo_gravado = None
+
+            itens = await asyncio.gather(*(buscar_itens(c) for c in contratos))
+            for contrato, itens_contrato in zip(contratos, itens):
+                await gravador.adicionar(linhas_contrato(contrato, itens_contrato),
+                                         (mod, {'pagina': pagina, 'ultimo_contrato': chave_contrato(contrato)}))
+            # Página inteira processada
+            await gravador.adicionar([], (mod, {'pagina': pagina + 1, 'ultimo_contrato': None}))
+            if gravador.limite_atingido():
+                print(f"Limite de {gravador.max_itens} itens atingido na modalidade {mod}.")
+                return
+            if pagina >= total_paginas:
+                break
+        await gravador.adicionar([], (mod, {'concluida': True}))
+        print(f"Modalidade {mod} concluída.")
+    finally:
+        for _, tarefa in pendentes:
+            tarefa.cancel()
+
+
+async def coletar(gravar, modalidades, datas, caminho_checkpoint, base_url=BASE_URL, taxa=5.0,
+                  conexoes=10, paginas_adiante=3, tamanho_buffer=2000, max_itens=None, reiniciar=False):
+    checkpoint = None if reiniciar else carregar_checkpoint(caminho_checkpoint)
+    if checkpoint and datas[0] and checkpoint['datas'][0] != datas[0]:
+        print("Aviso: checkpoint de outro período, começando do zero.")
+        checkpoint = None
+    if checkpoint:
+        datas = checkpoint['datas']
+        print(f"Retomando coleta de {datas[0]} a {datas[1]} ({checkpoint['total']} itens já gravados).")
+    else:
+        datas = [datas[0] or "20260101", datas[1] or date.today().strftime('%Y%m%d')]
+        checkpoint = {'datas': datas, 'total': 0, 'modalidades': {}}
+    for mod in modalidades:
+        checkpoint['modalidades'].setdefault(str(mod), {'pagina': 1, 'ultimo_contrato': None})
+
+    gravador = Gravador(gravar, checkpoint, caminho_checkpoint, tamanho_buffer, max_itens)
+    limitador = LimitadorTaxa(taxa)
+    limites = httpx.Limits(max_connections=conexoes, max_keepalive_connections=conexoes)
+    async with httpx.AsyncClient(limits=limites, timeout=httpx.Timeout(30.0)) as cliente:
+        resultados = await asyncio.gather(
+            *(coletar_modalidade(mod, cliente, limitador, gravador, base_url, datas, paginas_adiante)
+              for mod in modalidades),
+            return_exceptions=True)
+    falhas = [(mod, r) for mod, r in zip(modalidades, resultados) if isinstance(r, BaseException)]
+    # Grava o que sobrou no buffer mesmo se alguma modalidade falhou
+    try:
+        await gravador.descarregar()
+    except Exception as e:
+        falhas.append(('gravação', e))
+    for mod, erro in falhas:
+        print(f"Falha na modalidade {mod}: {erro}")
+    return gravador.total, falhas
+
+
+def gravador_supabase(workers=4):
+    # Mesmas variáveis do importar_para_supabase para apontar outro projeto
+    from supabase import create_client
+    from carga_supabase import CarregadorLotes
+
+    cliente = create_client(os.environ.get("SUPABASE_URL", "https://qwlbclurkhfnsztopeoj.supabase.co"),
+                            os.environ.get("SUPABASE_KEY", "sb_publishable_5ATbbplIn-PbSyuB0gU87A_m2lawRWM"))
+
+    def gravar(linhas):
+        if not CarregadorLotes(cliente, TABELA, workers=workers).enviar(linhas):
+            raise RuntimeError(f"Falha ao gravar {len(linhas)} itens em {TABELA}")
+    return gravar
+
+
+def gravador_jsonl(caminho):
+    def gravar(linhas):
+        with open(caminho, 'a', encoding='utf-8') as f:
+            for linha in linhas:
+                f.write(json.dumps(linha, ensure_ascii=False) + "\n")
+    return gravar
+
+
+def gravador_historico(pasta):
+    # Acrescenta direto no histórico local particionado (historico_pncp)
+    from historico_pncp import adicionar
+
+    def gravar(linhas):
+        adicionar(linhas, pasta)
+    return gravar
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Coleta itens de contratações do PNCP")
+    parser.add_argument('--data-inicial', help="AAAAMMDD (padrão: 20260101)")
+    parser.add_argument('--data-final', help="AAAAMMDD (padrão: hoje)")
+    parser.add_argument('--modalidades', default=",".join(map(str, MODALIDADES)),
+                        help="códigos separados por vírgula (padrão: %(default)s)")
+    parser.add_argument('--base-url', default=os.environ.get("PNCP_URL", BASE_URL),
+                        help="raiz da API (padrão: $PNCP_URL ou %(default)s)")
+    parser.add_argument('--taxa', type=float, default=5.0, help="requisições por segundo (máximo)")
+    parser.add_argument('--conexoes', type=int, default=10, help="conexões HTTP simultâneas")
+    parser.add_argument('--max-itens', type=int, help="para depois de gravar este número de itens")
+    parser.add_argument('--buffer', type=int, default=2000, help="itens acumulados antes de cada gravação")
+    parser.add_argument('--checkpoint', default=ARQUIVO_CHECKPOINT)
+    parser.add_argument('--reiniciar', action='store_true', help="ignora o checkpoint e começa do zero")
+    parser.add_argument('--saida', help="grava num arquivo JSONL em vez do Supabase")
+    parser.add_argument('--historico', nargs='?', const=os.path.join("Planilhas_Limpas", "historico_pncp"),
+                        help="grava no histórico local particionado em vez do Supabase "
+                             "(padrão: Planilhas_Limpas/historico_pncp)")
+    args = parser.parse_args(argv)
+
+    modalidades = [int(m) for m in args.modalidades.split(',') if m.strip()]
+    if args.saida:
+        gravar = gravador_jsonl(args.saida)
+    elif args.historico:
+        gravar = gravador_historico(args.historico)
+    else:
+        gravar = gravador_supabase()
+
+    print("Iniciando coleta do PNCP...")
+    inicio = time.perf_counter()
+    total, falhas = asyncio.run(coletar(
+        gravar, modalidades, [args.data_inicial, args.data_final], args.checkpoint,
+        base_url=args.base_url.rstrip('/'), taxa=args.taxa, conexoes=args.conexoes,
+        tamanho_buffer=args.buffer, max_itens=args.max_itens, reiniciar=args.reiniciar))
+    print(f"\nColeta finalizada: {total} itens em {time.perf_counter() - inicio:.1f}s.")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
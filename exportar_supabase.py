@@ -0,0 +1,373 @@
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from instrumentacao import contar, etapa
+from planilhas_limpas import PASTA_PADRAO
+
+# Exportação das tabelas referencia_* do Supabase para arquivos locais, para
+# análise offline sem depender da API.
+#
+#   python exportar_supabase.py referencia_pncp --workers 8
+#   python exportar_supabase.py --dsn postgresql://...        (direto no Postgres, via psycopg)
+#   SUPABASE_URL=http://localhost:3000 python exportar_supabase.py referencia_catser   (PostgREST local)
+#
+# Paginação por chave (keyset): cada página pede as linhas com id maior que
+# o último visto, em ordem de id, então a página mil custa o mesmo que a
+# primeira (com offset o banco percorre e descarta todas as anteriores). A
+# tabela é dividida em faixas disjuntas de id; como o id é um uuid
+# aleatório, faixas iguais do espaço de uuid têm quase o mesmo número de
+# linhas. As faixas são baixadas em paralelo, por threads que dividem o pool
+# de conexões do cliente (ou com uma conexão por thread no modo --dsn).
+#
+# Cada faixa grava suas linhas em partes colunares comprimidas (.npz, uma a
+# cada LINHAS_PARTE linhas) e o estado.json guarda o último id gravado de
+# cada faixa: rodando de novo, cada faixa continua de onde parou
+# (--recomecar descarta o que já foi baixado). ler_exportacao() junta as
+# partes num DataFrame, em ordem de id.
+#
+# Não é um snapshot transacional: linhas gravadas no banco durante a
+# exportação podem ficar de fora, mas nenhuma linha sai duplicada.
+
+PASTA_EXPORTACAO = os.path.join(PASTA_PADRAO, "exportacao")
+ARQUIVO_ESTADO = "estado.json"
+
+# Colunas não textuais de cada tabela (as demais, inclusive id e created_at, são texto)
+TABELAS = {
+    'referencia_catser': {},
+    'referencia_sinapi': {'preco_base': 'float'},
+    'referencia_cmed': {'pf': 'float', 'pmvg': 'float'},
+    'referencia_pncp': {'quantidade': 'float', 'valor_unitario': 'float', 'valor_total': 'float',
+                        'ano_compra': 'int', 'data_publicacao': 'data'},
+}
+
+PAGINA = 1000            # linhas por requisição (o max-rows padrão do PostgREST no Supabase)
+LINHAS_PARTE = 50_000    # linhas por arquivo .npz
+TENTATIVAS = 5
+ESPERA_BASE = 0.5
+NOME_TABELA = re.compile(r'[a-z_][a-z0-9_]*')
+
+
+def _uuid(valor):
+    h = f"{valor:032x}"
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def faixas_uuid(n):
+    # n faixas [inicio, fim) que cobrem todo o espaço de uuid (None = sem limite)
+    limites = [None] + [_uuid(i * 2**128 // n) for i in range(1, n)] + [None]
+    return list(zip(limites[:-1], limites[1:]))
+
+
+class FontePostgrest:
+    # Páginas pela API REST (supabase-py). SUPABASE_URL/SUPABASE_KEY, como no
+    # importar_para_supabase, podem apontar para outro projeto ou um PostgREST local
+    def __init__(self, cliente=None):
+        if cliente is None:
+            from supabase import create_client
+            cliente = create_client(os.environ.get("SUPABASE_URL", "https://qwlbclurkhfnsztopeoj.supabase.co"),
+                                    os.environ.get("SUPABASE_KEY", "sb_publishable_5ATbbplIn-PbSyuB0gU87A_m2lawRWM"))
+        self.cliente = cliente
+
+    def pagina(self, tabela, depois, inclusivo, antes, limite):
+        # Até limite linhas com id em (depois, antes), ordenadas por id
+        consulta = self.cliente.table(tabela).select('*')
+        if depois is not None:
+            consulta = consulta.gte('id', depois) if inclusivo else consulta.gt('id', depois)
+        if antes is not None:
+            consulta = consulta.lt('id', antes)
+        return consulta.order('id').limit(limite).execute().data
+
+    def fechar(self):
+        pass
+
+
+class FontePostgres:
+    # Páginas direto do Postgres (psycopg 3), uma conexão por thread
+    def __init__(self, dsn):
+        try:
+            import psycopg
+            from psycopg.rows import dict_row
+        except ImportError:
+            print("Erro: o modo --dsn precisa do pacote psycopg (pip install \"psycopg[binary]\").")
+            sys.exit(1)
+        self._conectar = lambda: psycopg.connect(dsn, autocommit=True, row_factory=dict_row)
+        self._local = threading.local()
+        self._conexoes = []
+        self._trava = threading.Lock()
+
+    def _conexao(self):
+        if not hasattr(self._local, 'conexao'):
+            self._local.conexao = self._conectar()
+            with self._trava:
+                self._conexoes.append(self._local.conexao)
+        return self._local.conexao
+
+    def pagina(self, tabela, depois, inclusivo, antes, limite):
+        condicoes, parametros = [], []
+        if depois is not None:
+            condicoes.append(f"id {'>=' if inclusivo else '>'} %s::uuid")
+            parametros.append(depois)
+        if antes is not None:
+            condicoes.append("id < %s::uuid")
+            parametros.append(antes)
+        onde = f" WHERE {' AND '.join(condicoes)}" if condicoes else ''
+        with self._conexao().cursor() as cur:
+            cur.execute(f'SELECT * FROM public."{tabela}"{onde} ORDER BY id LIMIT %s', parametros + [limite])
+            return cur.fetchall()
+
+    def fechar(self):
+        for conexao in self._conexoes:
+            conexao.close()
+
+
+# --- Partes colunares ---
+
+def _gravar_parte(caminho, registros, colunas):
+    # registros: dicts de uma faixa; colunas: [{'nome', 'tipo'}]. Texto vai
+    # como nos snapshots (bytes UTF-8 separados por \x00) e cada coluna leva
+    # a máscara de nulos
+    df = pd.DataFrame.from_records(registros, columns=[c['nome'] for c in colunas])
+    arrays = {}
+    for col in colunas:
+        nome, tipo = col['nome'], col['tipo']
+        serie = df[nome]
+        if tipo in ('float', 'int'):
+            valores = pd.to_numeric(serie, errors='coerce')
+            nulos = valores.isna().to_numpy()
+            valores = valores.fillna(0).to_numpy(np.float64 if tipo == 'float' else np.int64)
+        elif tipo == 'data':
+            valores = pd.to_datetime(serie.astype(str).str[:10], format='%Y-%m-%d', errors='coerce')
+            nulos = valores.isna().to_numpy()
+            valores = valores.to_numpy('datetime64[D]')
+        else:
+            nulos = serie.isna().to_numpy()
+            textos = serie.where(~nulos, '').astype(str).str.replace('\x00', ' ', regex=False)
+            valores = np.frombuffer(('\x00'.join(textos.tolist()) + '\x00').encode('utf-8'), dtype=np.uint8)
+        arrays[nome] = valores
+        arrays[f"{nome}__nulos"] = nulos
+    temporario = f"{caminho}.tmp.npz"
+    np.savez_compressed(temporario, **arrays)
+    os.replace(temporario, caminho)
+
+
+def _ler_parte(caminho, colunas):
+    with np.load(caminho) as arquivo:
+        dados = {}
+        for col in colunas:
+            nome, tipo = col['nome'], col['tipo']
+            valores, nulos = arquivo[nome], arquivo[f"{nome}__nulos"]
+            if tipo == 'int':
+                dados[nome] = pd.arrays.IntegerArray(valores, nulos)
+            elif tipo == 'texto':
+                valores = np.array(valores.tobytes().decode('utf-8').split('\x00')[:-1], dtype=object)
+                valores[nulos] = None
+                dados[nome] = valores
+            else:
+                if tipo == 'float':
+                    valores[nulos] = np.nan
+                else:
+                    valores[nulos] = np.datetime64('NaT')
+                dados[nome] = valores
+    return pd.DataFrame(dados)
+
+
+# --- Exportação ---
+
+def _carregar_estado(destino):
+    caminho = os.path.join(destino, ARQUIVO_ESTADO)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class Exportacao:
+    def __init__(self, fonte, tabela, pasta=PASTA_EXPORTACAO, faixas=32, pagina=PAGINA,
+                 linhas_parte=LINHAS_PARTE, recomecar=False):
+        if not NOME_TABELA.fullmatch(tabela):
+            raise ValueError(f"Nome de tabela inválido: {tabela}")
+        self.fonte = fonte
+        self.tabela = tabela
+        self.destino = os.path.join(pasta, tabela)
+        self.pagina = pagina
+        self.linhas_parte = linhas_parte
+        self.tipos = TABELAS.get(tabela, {})
+        self._trava = threading.Lock()
+        self._cancelar = threading.Event()
+        self.baixadas = 0
+
+        if recomecar:
+            shutil.rmtree(self.destino, ignore_errors=True)
+        os.makedirs(self.destino, exist_ok=True)
+        self.estado = _carregar_estado(self.destino)
+        if self.estado is None:
+            self.estado = {'tabela': tabela, 'colunas': None,
+                           'faixas': [{'inicio': inicio, 'fim': fim, 'ultimo': None, 'linhas': 0,
+                                       'partes': [], 'concluida': False}
+                                      for inicio, fim in faixas_uuid(faixas)]}
+            self._salvar_estado()
+        elif len(self.estado['faixas']) != faixas:
+            print(f"{tabela}: continuando a exportação anterior com {len(self.estado['faixas'])} faixas.")
+
+    def _salvar_estado(self):
+        # Chamado com a trava (ou antes das threads): grava e troca de uma vez
+        caminho = os.path.join(self.destino, ARQUIVO_ESTADO)
+        with open(f"{caminho}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(self.estado, f, ensure_ascii=False)
+        os.replace(f"{caminho}.tmp", caminho)
+
+    def _colunas(self, registro):
+        # Esquema fixado pela primeira página baixada (ordem das colunas do banco)
+        with self._trava:
+            if self.estado['colunas'] is None:
+                self.estado['colunas'] = [{'nome': nome, 'tipo': self.tipos.get(nome, 'texto')}
+                                          for nome in registro]
+            return self.estado['colunas']
+
+    def _buscar(self, depois, inclusivo, antes):
+        # Uma página, com novas tentativas e backoff exponencial
+        for tentativa in range(TENTATIVAS):
+            try:
+                with etapa('exportacao.pagina', tabela=self.tabela) as e:
+                    registros = self.fonte.pagina(self.tabela, depois, inclusivo, antes, self.pagina)
+                    e.definir(linhas=len(registros))
+                return registros
+            except Exception as erro:
+                if tentativa == TENTATIVAS - 1:
+                    raise
+                contar('exportacao.retentativas', tabela=self.tabela)
+                print(f"\nErro ao baixar {self.tabela} ({erro}), tentando de novo...")
+                time.sleep(ESPERA_BASE * (2 ** tentativa) * random.uniform(0.5, 1.5))
+
+    def _gravar(self, i, faixa, registros, ultimo, concluida):
+        if registros:
+            nome = f"{i:04d}-{len(faixa['partes']):05d}.npz"
+            with etapa('exportacao.parte', tabela=self.tabela, linhas=len(registros)):
+                _gravar_parte(os.path.join(self.destino, nome), registros, self._colunas(registros[0]))
+        with self._trava:
+            if registros:
+                faixa['partes'].append(nome)
+                faixa['linhas'] += len(registros)
+                faixa['ultimo'] = ultimo
+            faixa['concluida'] = concluida
+            self._salvar_estado()
+
+    def exportar_faixa(self, i):
+        faixa = self.estado['faixas'][i]
+        if faixa['concluida']:
+            return
+        # Continua depois do último id gravado (ou do começo da faixa)
+        depois, inclusivo = (faixa['ultimo'], False) if faixa['ultimo'] else (faixa['inicio'], True)
+        acumulados = []
+        while not self._cancelar.is_set():
+            registros = self._buscar(depois, inclusivo, faixa['fim'])
+            # Fim da faixa só com a página vazia: o servidor pode devolver
+            # menos linhas que o pedido (max-rows) no meio da faixa
+            fim = not registros
+            if registros:
+                acumulados.extend(registros)
+                depois, inclusivo = str(registros[-1]['id']), False
+                with self._trava:
+                    self.baixadas += len(registros)
+            if fim or len(acumulados) >= self.linhas_parte:
+                self._gravar(i, faixa, acumulados, depois, fim)
+                acumulados = []
+            if fim:
+                return
+
+    def executar(self, workers=8):
+        # Devolve o total de linhas exportadas (com as de rodadas anteriores)
+        pendentes = [i for i, f in enumerate(self.estado['faixas']) if not f['concluida']]
+        inicio = time.perf_counter()
+        parar = threading.Event()
+
+        def progresso():
+            while not parar.wait(1.0):
+                with self._trava:
+                    prontas = sum(f['concluida'] for f in self.estado['faixas'])
+                segundos = time.perf_counter() - inicio
+                print(f"Progresso: {self.baixadas} linhas ({self.baixadas / segundos:.0f}/s), "
+                      f"{prontas}/{len(self.estado['faixas'])} faixas", end='\r')
+
+        relator = threading.Thread(target=progresso, daemon=True)
+        relator.start()
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            with etapa('exportacao.tabela', tabela=self.tabela) as e:
+                for futuro in [pool.submit(self.exportar_faixa, i) for i in pendentes]:
+                    futuro.result()
+                e.definir(linhas=self.baixadas)
+        except BaseException:
+            # Ctrl+C ou erro numa faixa: as outras param na próxima página e
+            # o que não chegou a ser gravado é baixado de novo na próxima rodada
+            self._cancelar.set()
+            raise
+        finally:
+            pool.shutdown(cancel_futures=True)
+            parar.set()
+            relator.join()
+        print()
+        return sum(f['linhas'] for f in self.estado['faixas'])
+
+
+def ler_exportacao(tabela, pasta=PASTA_EXPORTACAO):
+    # DataFrame com as linhas exportadas da tabela (em ordem de id)
+    destino = os.path.join(pasta, tabela)
+    estado = _carregar_estado(destino)
+    if estado is None:
+        raise FileNotFoundError(f"Nenhuma exportação de {tabela} em {pasta}")
+    if not all(f['concluida'] for f in estado['faixas']):
+        print(f"Aviso: a exportação de {tabela} está incompleta (rode o exportar_supabase de novo).")
+    colunas = estado['colunas'] or []
+    partes = [_ler_parte(os.path.join(destino, nome), colunas)
+              for faixa in estado['faixas'] for nome in faixa['partes']]
+    if not partes:
+        return pd.DataFrame(columns=[c['nome'] for c in colunas])
+    return pd.concat(partes, ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta as tabelas referencia_* do Supabase para arquivos locais")
+    parser.add_argument('tabelas', nargs='*', default=list(TABELAS),
+                        help=f"padrão: {', '.join(TABELAS)}")
+    parser.add_argument('--workers', type=int, default=8, help="faixas baixadas em paralelo (padrão: 8)")
+    parser.add_argument('--faixas', type=int, default=None,
+                        help="faixas de id por tabela (padrão: 4 por worker)")
+    parser.add_argument('--pagina', type=int, default=PAGINA, help=f"linhas por requisição (padrão: {PAGINA})")
+    parser.add_argument('--pasta', default=PASTA_EXPORTACAO, help="onde gravar (uma pasta por tabela)")
+    parser.add_argument('--dsn', default=os.environ.get("DATABASE_URL"),
+                        help="connection string do Postgres para ler direto do banco (padrão: $DATABASE_URL)")
+    parser.add_argument('--recomecar', action='store_true', help="descarta as exportações anteriores")
+    args = parser.parse_args(argv)
+
+    fonte = FontePostgres(args.dsn) if args.dsn else FontePostgrest()
+    try:
+        for tabela in args.tabelas:
+            print(f"\nExportando {tabela}...")
+            inicio = time.perf_counter()
+            exportacao = Exportacao(fonte, tabela, args.pasta, args.faixas or 4 * args.workers, args.pagina,
+                                    recomecar=args.recomecar)
+            total = exportacao.executar(args.workers)
+            segundos = time.perf_counter() - inicio
+            tamanho = sum(os.path.getsize(os.path.join(exportacao.destino, nome))
+                          for faixa in exportacao.estado['faixas'] for nome in faixa['partes'])
+            print(f"{tabela}: {total} linhas em {exportacao.destino} ({tamanho / 2**20:.1f} MB), "
+                  f"{exportacao.baixadas} baixadas agora em {segundos:.1f}s")
+    finally:
+        fonte.fechar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
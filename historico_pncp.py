@@ -0,0 +1,333 @@
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from indice_busca import normalizar_serie, normalizar_texto
+from planilhas_limpas import PASTA_PADRAO, gravar_snapshot, ler_snapshot
+
+# Histórico local de preços do PNCP (as mesmas colunas de referencia_pncp),
+# para as análises não dependerem de paginar a API REST do Supabase.
+#
+# Só recebe acréscimos. Cada lote gravado vira um segmento colunar (o mesmo
+# formato .npy dos snapshots de planilhas_limpas) dentro da partição do mês
+# de publicação e da UF:
+#
+#   Planilhas_Limpas/historico_pncp/2026-03/MG/<segmento>/
+#
+# orgao_nome, municipio, unidade e modalidade ficam codificados por
+# dicionário. O estatisticas.json de cada segmento guarda mínimo/máximo de
+# data e valor_unitario e as modalidades presentes, então uma consulta
+# descarta primeiro as partições pelo nome da pasta (mês/UF) e depois os
+# segmentos pelas estatísticas, sem abrir os .npy de quem não interessa.
+#
+# compactar() junta os segmentos pequenos de cada partição num só. O
+# segmento novo lista os que substitui, e quem ler no meio da troca ignora
+# os substituídos, então consultas concorrentes nunca contam linha duplicada.
+
+PASTA_HISTORICO = os.path.join(PASTA_PADRAO, "historico_pncp")
+
+COLUNAS = ['item_nome', 'item_descricao', 'unidade', 'quantidade', 'valor_unitario', 'valor_total',
+           'data_publicacao', 'orgao_nome', 'orgao_cnpj', 'municipio', 'uf', 'modalidade',
+           'sequencial_compra', 'ano_compra', 'link_pncp']
+NUMERICAS = ['quantidade', 'valor_unitario', 'valor_total']
+DICIONARIO = {'orgao_nome', 'municipio', 'unidade', 'modalidade', 'uf'}
+
+SEM_DATA = "sem-data"
+SEM_UF = "XX"
+
+_contador = itertools.count()
+
+
+def preparar(df):
+    # Tipos fixos para todos os segmentos terem o mesmo esquema
+    df = df.reindex(columns=COLUNAS).copy()
+    for col in NUMERICAS:
+        df[col] = pd.to_numeric(df[col], errors='coerce').astype(np.float64)
+    df['ano_compra'] = pd.to_numeric(df['ano_compra'], errors='coerce').fillna(0).astype(np.int64)
+    # "2026-03-05T10:00:00" e "2026-03-05" viram a data (sem hora)
+    df['data_publicacao'] = pd.to_datetime(df['data_publicacao'].astype(str).str[:10],
+                                           format='%Y-%m-%d', errors='coerce')
+    df['uf'] = df['uf'].fillna('').astype(str).str.strip().str.upper()
+    for col in ('item_nome', 'item_descricao', 'unidade', 'orgao_nome', 'orgao_cnpj', 'municipio',
+                'modalidade', 'sequencial_compra', 'link_pncp'):
+        df[col] = df[col].astype(object).where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def _particoes(df):
+    mes = df['data_publicacao'].dt.strftime('%Y-%m').fillna(SEM_DATA)
+    uf = df['uf'].where(df['uf'].str.fullmatch(r'[A-Z]{2}'), SEM_UF)
+    return mes, uf
+
+
+def _estatisticas_segmento(df):
+    datas = df['data_publicacao'].dropna()
+    valores = df['valor_unitario'].dropna()
+    return {
+        'linhas': len(df),
+        'data_min': datas.min().strftime('%Y-%m-%d') if len(datas) else None,
+        'data_max': datas.max().strftime('%Y-%m-%d') if len(datas) else None,
+        'valor_min': float(valores.min()) if len(valores) else None,
+        'valor_max': float(valores.max()) if len(valores) else None,
+        'modalidades': sorted(df['modalidade'].dropna().unique().tolist()),
+    }
+
+
+def _gravar_segmento(pasta_particao, df, substitui=()):
+    # Grava numa pasta temporária e renomeia (quem lê nunca vê um segmento pela metade)
+    nome = f"{time.time_ns():x}-{os.getpid()}-{next(_contador)}"
+    destino = os.path.join(pasta_particao, nome)
+    temporaria = os.path.join(pasta_particao, f".tmp-{nome}")
+    gravar_snapshot(df.reset_index(drop=True), temporaria, categoricas=DICIONARIO)
+    estatisticas = _estatisticas_segmento(df)
+    estatisticas['substitui'] = list(substitui)
+    with open(os.path.join(temporaria, 'estatisticas.json'), 'w', encoding='utf-8') as f:
+        json.dump(estatisticas, f, ensure_ascii=False)
+    os.rename(temporaria, destino)
+    return nome
+
+
+def adicionar(linhas, pasta=PASTA_HISTORICO):
+    # Acrescenta linhas (DataFrame ou lista de dicts no formato de
+    # coletar_pncp.linhas_contrato); devolve quantas foram gravadas
+    df = preparar(pd.DataFrame(linhas))
+    if df.empty:
+        return 0
+    mes, uf = _particoes(df)
+    for (m, u), grupo in df.groupby([mes, uf], sort=True):
+        particao = os.path.join(pasta, m, u)
+        os.makedirs(particao, exist_ok=True)
+        _gravar_segmento(particao, grupo)
+    return len(df)
+
+
+def _ler_estatisticas(pasta_segmento):
+    with open(os.path.join(pasta_segmento, 'estatisticas.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def segmentos_particao(particao):
+    # {nome: estatísticas} dos segmentos válidos (sem os temporários e os
+    # já substituídos por uma compactação)
+    segmentos = {}
+    for nome in os.listdir(particao):
+        if nome.startswith('.tmp-'):
+            continue
+        try:
+            segmentos[nome] = _ler_estatisticas(os.path.join(particao, nome))
+        except FileNotFoundError:
+            continue  # removido por uma compactação no meio da listagem
+    substituidos = {s for e in segmentos.values() for s in e.get('substitui', [])}
+    return {nome: e for nome, e in segmentos.items() if nome not in substituidos}
+
+
+def _mes_serve(mes, desde, ate):
+    # Poda pelo nome da pasta do mês ('AAAA-MM'); sem-data só sem filtro de período
+    if desde is None and ate is None:
+        return True
+    if mes == SEM_DATA:
+        return False
+    return (desde is None or mes >= desde.strftime('%Y-%m')) and (ate is None or mes <= ate.strftime('%Y-%m'))
+
+
+def _segmento_serve(est, desde, ate, modalidades, valor_min, valor_max):
+    # Poda pelas estatísticas do segmento (mínimo/máximo e modalidades)
+    if desde is not None and (est['data_max'] is None or est['data_max'] < desde.strftime('%Y-%m-%d')):
+        return False
+    if ate is not None and (est['data_min'] is None or est['data_min'] > ate.strftime('%Y-%m-%d')):
+        return False
+    if valor_min is not None and (est['valor_max'] is None or est['valor_max'] < valor_min):
+        return False
+    if valor_max is not None and (est['valor_min'] is None or est['valor_min'] > valor_max):
+        return False
+    if modalidades and not set(est['modalidades']) & set(modalidades):
+        return False
+    return True
+
+
+def _contem(nomes, termo):
+    # Substring sem acento/maiúscula; os nomes se repetem muito, então só os
+    # distintos passam pela normalização
+    codigos, unicos = pd.factorize(nomes)
+    casam = normalizar_serie(pd.Series(unicos, dtype=object)).str.contains(termo, regex=False).to_numpy()
+    return np.append(casam, False)[codigos]
+
+
+def _juntar(partes):
+    # Concatena os segmentos; as colunas de dicionário continuam categorias
+    # (cada segmento tem o seu dicionário, unidos aqui). Uma coluna toda nula
+    # no segmento volta com categorias vazias de tipo object, e o
+    # union_categoricals exige o mesmo tipo em todos: passam todas a str
+    dicionario = [c for c in partes[0].columns if isinstance(partes[0][c].dtype, pd.CategoricalDtype)]
+    df = pd.concat([p.drop(columns=dicionario) for p in partes], ignore_index=True)
+    for col in dicionario:
+        df[col] = union_categoricals([p[col].cat.rename_categories(p[col].cat.categories.astype(str))
+                                      for p in partes], ignore_order=True)
+    return df[partes[0].columns]
+
+
+def consultar(termo=None, desde=None, ate=None, ufs=None, modalidades=None, valor_min=None,
+              valor_max=None, colunas=None, pasta=PASTA_HISTORICO, estatisticas=None):
+    # Linhas do histórico que atendem aos filtros. termo: substring do
+    # item_nome sem acento/maiúscula; desde/ate: datas (inclusive); colunas:
+    # as que voltam (padrão: todas). estatisticas, se for um dict, recebe
+    # quantas partições/segmentos/linhas foram lidos
+    desde = pd.Timestamp(desde) if desde is not None else None
+    ate = pd.Timestamp(ate) if ate is not None else None
+    ufs = {u.upper() for u in ufs} if ufs else None
+    termo = normalizar_texto(termo).strip() if termo else None
+    saida = list(colunas) if colunas else COLUNAS
+    # Colunas que o filtro precisa além das pedidas
+    necessarias = set(saida)
+    if desde is not None or ate is not None:
+        necessarias.add('data_publicacao')
+    if termo:
+        necessarias.add('item_nome')
+    if modalidades:
+        necessarias.add('modalidade')
+    if valor_min is not None or valor_max is not None:
+        necessarias.add('valor_unitario')
+
+    contagem = {'particoes': 0, 'segmentos': 0, 'segmentos_podados': 0, 'linhas_lidas': 0}
+    partes = []
+    meses = sorted(os.listdir(pasta)) if os.path.isdir(pasta) else []
+    for mes in meses:
+        if not _mes_serve(mes, desde, ate):
+            continue
+        for uf in sorted(os.listdir(os.path.join(pasta, mes))):
+            if ufs and uf not in ufs:
+                continue
+            particao = os.path.join(pasta, mes, uf)
+            contagem['particoes'] += 1
+            for nome, est in sorted(segmentos_particao(particao).items()):
+                if not _segmento_serve(est, desde, ate, modalidades, valor_min, valor_max):
+                    contagem['segmentos_podados'] += 1
+                    continue
+                try:
+                    df = ler_snapshot(os.path.join(particao, nome), necessarias)
+                except FileNotFoundError:
+                    continue  # substituído por uma compactação depois da listagem
+                contagem['segmentos'] += 1
+                contagem['linhas_lidas'] += len(df)
+                filtro = np.ones(len(df), dtype=bool)
+                if desde is not None:
+                    filtro &= (df['data_publicacao'] >= desde).to_numpy()
+                if ate is not None:
+                    filtro &= (df['data_publicacao'] <= ate).to_numpy()
+                if modalidades:
+                    filtro &= df['modalidade'].isin(modalidades).to_numpy()
+                if valor_min is not None:
+                    filtro &= (df['valor_unitario'] >= valor_min).to_numpy()
+                if valor_max is not None:
+                    filtro &= (df['valor_unitario'] <= valor_max).to_numpy()
+                if termo:
+                    filtro[filtro] = _contem(df['item_nome'][filtro], termo)
+                if filtro.any():
+                    partes.append(df.loc[filtro, saida])
+
+    if isinstance(estatisticas, dict):
+        estatisticas.update(contagem)
+    if not partes:
+        return pd.DataFrame(columns=saida)
+    return _juntar(partes)
+
+
+def compactar(pasta=PASTA_HISTORICO, min_segmentos=2):
+    # Junta os segmentos de cada partição num só; devolve quantas partições mudaram
+    mudaram = 0
+    for mes in sorted(os.listdir(pasta)) if os.path.isdir(pasta) else []:
+        for uf in sorted(os.listdir(os.path.join(pasta, mes))):
+            particao = os.path.join(pasta, mes, uf)
+            segmentos = sorted(segmentos_particao(particao))
+            if len(segmentos) < min_segmentos:
+                continue
+            df = _juntar([ler_snapshot(os.path.join(particao, s)) for s in segmentos])
+            _gravar_segmento(particao, preparar(df), substitui=segmentos)
+            for s in segmentos:
+                shutil.rmtree(os.path.join(particao, s), ignore_errors=True)
+            mudaram += 1
+    return mudaram
+
+
+def resumo(pasta=PASTA_HISTORICO):
+    # Linhas e segmentos por partição
+    linhas = []
+    for mes in sorted(os.listdir(pasta)) if os.path.isdir(pasta) else []:
+        for uf in sorted(os.listdir(os.path.join(pasta, mes))):
+            segmentos = segmentos_particao(os.path.join(pasta, mes, uf))
+            linhas.append({'mes': mes, 'uf': uf, 'segmentos': len(segmentos),
+                           'linhas': sum(e['linhas'] for e in segmentos.values())})
+    return pd.DataFrame(linhas, columns=['mes', 'uf', 'segmentos', 'linhas'])
+
+
+def ler_arquivo(caminho):
+    # JSONL do coletar_pncp --saida, CSV ou XLSX exportado do Supabase
+    if caminho.lower().endswith('.jsonl'):
+        return pd.read_json(caminho, lines=True, dtype=False)
+    if caminho.lower().endswith('.xlsx'):
+        return pd.read_excel(caminho)
+    return pd.read_csv(caminho)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Histórico local de preços do PNCP, particionado por mês e UF")
+    parser.add_argument('--pasta', default=PASTA_HISTORICO)
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p = sub.add_parser('adicionar', help="acrescenta arquivos (.jsonl do coletar_pncp, .csv ou .xlsx)")
+    p.add_argument('arquivos', nargs='+')
+
+    p = sub.add_parser('consultar', help="preços de um item com filtros de período/UF/modalidade")
+    p.add_argument('termo', nargs='?', help="trecho do nome do item (sem acento/maiúscula)")
+    p.add_argument('--uf', action='append', type=str.upper, help="pode repetir (--uf MG --uf SP)")
+    p.add_argument('--meses', type=int, help="últimos N meses")
+    p.add_argument('--desde', help="AAAA-MM-DD")
+    p.add_argument('--ate', help="AAAA-MM-DD")
+    p.add_argument('--modalidade', action='append', help="nome da modalidade, pode repetir")
+    p.add_argument('-o', '--saida', help="grava as linhas em .csv")
+
+    sub.add_parser('compactar', help="junta os segmentos de cada partição")
+    sub.add_parser('resumo', help="linhas e segmentos por partição")
+    args = parser.parse_args(argv)
+
+    if args.comando == 'adicionar':
+        for caminho in args.arquivos:
+            n = adicionar(ler_arquivo(caminho), args.pasta)
+            print(f"{caminho}: {n} linhas adicionadas.")
+    elif args.comando == 'consultar':
+        desde = args.desde
+        if args.meses:
+            desde = (pd.Timestamp.today().normalize() - pd.DateOffset(months=args.meses)).strftime('%Y-%m-%d')
+        contagem = {}
+        inicio = time.perf_counter()
+        df = consultar(args.termo, desde, args.ate, args.uf, args.modalidade, pasta=args.pasta,
+                       estatisticas=contagem)
+        print(f"{len(df)} linhas em {time.perf_counter() - inicio:.3f}s "
+              f"({contagem['particoes']} partições, {contagem['segmentos']} segmentos lidos, "
+              f"{contagem['segmentos_podados']} descartados pelas estatísticas).")
+        if len(df):
+            v = df['valor_unitario']
+            print(f"valor_unitario: mínimo {v.min():.2f}, mediana {v.median():.2f}, "
+                  f"média {v.mean():.2f}, máximo {v.max():.2f}")
+            print(df[['data_publicacao', 'uf', 'item_nome', 'unidade', 'valor_unitario']].head(20)
+                  .to_string(index=False))
+        if args.saida:
+            df.to_csv(args.saida, index=False, encoding='utf-8-sig')
+            print(f"Linhas gravadas em {args.saida}")
+    elif args.comando == 'compactar':
+        print(f"{compactar(args.pasta)} partições compactadas.")
+    else:
+        print(resumo(args.pasta).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,130 +1,228 @@
 import pandas as pd
+import argparse
+import json
 import os
-import re
+import sys
 from supabase import create_client, Client
-import math
 
-# Configurações do Supabase
-url = "https://qwlbclurkhfnsztopeoj.supabase.co"
-key = "sb_publishable_5ATbbplIn-PbSyuB0gU87A_m2lawRWM"
+import manifesto
+import qualidade
+from carga_supabase import CarregadorLotes, carregar_via_copy, para_registros
+from instrumentacao import etapa
+from limpeza import gtin_texto
+from numeros_br import avisar_invalidos, converter_colunas
+from planilhas_limpas import UFS, ler_planilha
+
+# Configurações do Supabase (SUPABASE_URL/SUPABASE_KEY apontam para outro
+# projeto ou para um PostgREST local de teste)
+url = os.environ.get("SUPABASE_URL", "https://qwlbclurkhfnsztopeoj.supabase.co")
+key = os.environ.get("SUPABASE_KEY", "sb_publishable_5ATbbplIn-PbSyuB0gU87A_m2lawRWM")
 supabase: Client = create_client(url, key)
 
 csv_dir = r"Planilhas_Limpas"
 
-def clean_num(val):
-    if pd.isna(val) or str(val).strip() == '': return None
-    try:
-        # Trata formato brasileiro: 1.234,56 -> 1234.56
-        s = str(val).replace('.', '').replace(',', '.').replace('R$', '').strip()
-        return float(s)
-    except:
-        return None
-
-def clean_value(val):
-    if pd.isna(val) or (isinstance(val, float) and math.isnan(val)):
-        return None
-    return val
-
-def import_csv(file_name, table_name, mapping, is_numeric=None):
+# Importação incremental: o manifesto.json de csv_dir guarda o hash de cada
+# linha já importada (pela chave natural da tabela). Uma rodada nova só apaga
+# e reinsere as chaves alteradas/removidas e insere as novas; tabelas sem
+# manifesto (ou com --completo) são recarregadas inteiras.
+#
+# A gravação usa upsert pela chave única de cada tabela (migração
+# 20261018_chaves_naturais_referencias.sql), em lotes concorrentes com
+# novas tentativas; com --dsn/DATABASE_URL vai direto ao Postgres via COPY,
+# e as remoções rodam na mesma conexão e transação da carga.
+#
+# Antes de montar os registros cada CSV passa pela verificação de qualidade
+# (qualidade.py): os reparos entram, as linhas em quarentena ficam de fora e a
+# tabela não é importada se a quarentena passar do limite (--limite-quarentena).
+ID_NULO = "00000000-0000-0000-0000-000000000000"
+TUDO = object()  # gravar(apagar=TUDO): esvazia a tabela antes da carga
+
+def montar_registros(df, mapping, is_numeric=None, origem='registros'):
+    # Monta o DataFrame com as colunas do banco, coluna a coluna
+    # Validação de descrição/produto
+    desc = df['descricao'] if 'descricao' in df.columns else df.get('produto')
+    if desc is None:
+        return pd.DataFrame()
+    df = df[desc.notna() & desc.astype(str).str.strip().ne('')]
+
+    registros = pd.DataFrame({db_col: df[csv_col] for csv_col, db_col in mapping.items()
+                              if csv_col in df.columns}).reset_index(drop=True)
+    # Preços em pt-BR ('27,29*') ou já numéricos, formato decidido por coluna
+    avisar_invalidos(converter_colunas(registros, is_numeric or []), origem)
+    if 'ean' in registros.columns:
+        # A coluna do banco é texto: o EAN (Int64 no snapshot) volta com os zeros à esquerda
+        registros['ean'] = gtin_texto(registros['ean'])
+    return registros
+
+def apagar_chaves(table_name, chave, valores, lote=100):
+    # valores: uma lista por linha, na ordem das colunas de chave
+    if len(chave) == 1:
+        col = chave[0]
+        nulos = [v for (v,) in valores if v is None]
+        preenchidos = [v for (v,) in valores if v is not None]
+        for i in range(0, len(preenchidos), lote):
+            supabase.table(table_name).delete().in_(col, preenchidos[i:i + lote]).execute()
+        if nulos:
+            supabase.table(table_name).delete().is_(col, 'null').execute()
+        return
+    for partes in valores:
+        consulta = supabase.table(table_name).delete()
+        for col, v in zip(chave, partes):
+            consulta = consulta.is_(col, 'null') if v is None else consulta.eq(col, v)
+        consulta.execute()
+
+def gravar(table_name, df, conflito, workers=4, lote=500, dsn=None, chave=None, apagar=None):
+    # Upsert pela coluna de conflito; linhas sem valor nela são inseridas.
+    # apagar: TUDO (recarga) ou as chaves (textos JSON de
+    # manifesto.chaves_linhas) a apagar antes da gravação
+    apagar_tudo = apagar is TUDO
+    valores = [] if apagar_tudo else [json.loads(k) for k in apagar or []]
+    if dsn:
+        # Remoções e carga numa transação só, na mesma conexão do COPY
+        n = carregar_via_copy(dsn, table_name, df, conflito, apagar_tudo=apagar_tudo, chave=chave, apagar=valores)
+        print(f"{n} linhas gravadas via COPY.")
+        return True
+    with etapa('importacao.apagar', tabela=table_name, linhas=len(valores)):
+        if apagar_tudo:
+            supabase.table(table_name).delete().neq("id", ID_NULO).execute()
+        elif valores:
+            apagar_chaves(table_name, chave, valores)
+    ok = True
+    if conflito:
+        com_chave = df[conflito].notna()
+        # Uma mesma chave duas vezes no upsert é erro no Postgres: fica a última
+        unicos = df[com_chave].drop_duplicates(subset=[conflito], keep='last')
+        carregador = CarregadorLotes(supabase, table_name, conflito, workers=workers, lote=lote)
+        ok = carregador.enviar(para_registros(unicos))
+        df = df[~com_chave]
+    if len(df):
+        carregador = CarregadorLotes(supabase, table_name, workers=workers, lote=lote)
+        ok = carregador.enviar(para_registros(df)) and ok
+    return ok
+
+def import_csv(file_name, table_name, mapping, chave, conflito=None, is_numeric=None, estado=None,
+               completo=False, workers=4, lote=500, dsn=None, limite_quarentena=qualidade.LIMITE_QUARENTENA,
+               ignorar_qualidade=False):
     path = os.path.join(csv_dir, file_name)
     if not os.path.exists(path):
         print(f"Erro: {file_name} não encontrado.")
         return
 
+    estado = estado if estado is not None else manifesto.carregar(csv_dir)
+    registro = None if completo else estado['tabelas'].get(table_name)
+    if registro and registro.get('chave') != chave:
+        registro = None  # manifesto gravado com outra chave: recarrega a tabela
+    assinatura = manifesto.hash_arquivo(path) + json.dumps(mapping, sort_keys=True)
+    if registro and registro.get('csv') == assinatura:
+        print(f"\n{file_name} sem alterações desde a última importação, pulando {table_name}.")
+        return
+
     print(f"\nImportando {file_name} para {table_name}...")
-    df = pd.read_csv(path)
-    
-    records = []
-    for _, row in df.iterrows():
-        record = {}
-        # Validação de descrição/produto
-        desc = row.get('descricao') or row.get('produto')
-        if pd.isna(desc) or str(desc).strip() == '':
-            continue
-
-        for csv_col, db_col in mapping.items():
-            if csv_col in df.columns:
-                val = row[csv_col]
-                if is_numeric and db_col in is_numeric:
-                    val = clean_num(val)
-                else:
-                    val = clean_value(val)
-                record[db_col] = val
-        
-        if record:
-            records.append(record)
-
-    if not records:
+    with etapa('importacao.ler_csv', tabela=table_name) as e:
+        df = ler_planilha(path)
+        e.definir(linhas=len(df))
+    df, relatorio = qualidade.aplicar(df, file_name.replace('_limpo.csv', ''), csv_dir, limite_quarentena)
+    if relatorio['bloqueado']:
+        if not ignorar_qualidade:
+            print(f"{table_name} não importado: quarentena acima do limite (relatório em "
+                  f"{os.path.join(csv_dir, qualidade.PASTA_QUALIDADE)}; --ignorar-qualidade importa as demais linhas).")
+            return
+        print("Aviso: importando mesmo acima do limite de quarentena (--ignorar-qualidade).")
+    with etapa('importacao.montar_registros', tabela=table_name, linhas=len(df)):
+        df_records = montar_registros(df, mapping, is_numeric, file_name)
+
+    if df_records.empty:
         print(f"Nenhum registro válido em {file_name}")
         return
-
-    batch_size = 100 # Menor para evitar erros de rede/timeout
-    total = len(records)
-    for i in range(0, total, batch_size):
-        batch = records[i:i + batch_size]
-        try:
-            supabase.table(table_name).insert(batch).execute()
-            print(f"Progresso: {min(i + batch_size, total)}/{total}", end='\r')
-        except Exception as e:
-            print(f"\nErro no lote {i} de {table_name}: {e}")
-            break
-    print(f"\n{table_name} concluído!")
+    if conflito:
+        # O upsert guarda uma linha por chave de conflito: o manifesto também
+        repetidas = df_records[conflito].notna() & df_records.duplicated(subset=[conflito], keep='last')
+        if repetidas.any():
+            print(f"Aviso: {int(repetidas.sum())} linhas com {conflito} repetido descartadas (fica a última).")
+            df_records = df_records[~repetidas]
+
+    with etapa('importacao.hashes', tabela=table_name, linhas=len(df_records)):
+        hashes = manifesto.hashes_linhas(df_records, chave)
+
+    if registro is None:
+        print("Recarregando a tabela inteira...")
+        enviar, apagar = df_records, TUDO
+    else:
+        inseridas, alteradas, removidas = manifesto.diferencas(registro['linhas'], hashes)
+        print(f"{len(inseridas)} novos, {len(alteradas)} alterados, {len(removidas)} removidos.")
+        chaves = manifesto.chaves_linhas(df_records, chave)
+        alvo = chaves.isin(set(inseridas) | set(alteradas))
+        enviar = df_records[alvo]
+        # Alteradas com chave única são sobrescritas pelo upsert; as demais
+        # (ex.: CMED sem EAN) são apagadas e reinseridas
+        sem_conflito = set(alteradas)
+        if conflito:
+            sem_conflito &= set(chaves[alvo & df_records[conflito].isna()])
+        apagar = removidas + sorted(sem_conflito)
+
+    with etapa('importacao.gravar', tabela=table_name, linhas=len(enviar)):
+        ok = gravar(table_name, enviar, conflito, workers=workers, lote=lote, dsn=dsn, chave=chave, apagar=apagar)
+    if ok:
+        estado['tabelas'][table_name] = {'csv': assinatura, 'chave': chave, 'linhas': hashes}
+        print(f"\n{table_name} concluído!")
+    else:
+        # Estado da tabela incerto: a próxima rodada recarrega tudo
+        estado['tabelas'].pop(table_name, None)
+    manifesto.salvar(csv_dir, estado)
 
 # Mapeamentos
 map_catser = {'codigo': 'codigo', 'descricao': 'descricao', 'Grupo': 'grupo', 'Classe': 'classe'}
 map_sinapi = {'codigo': 'codigo', 'descricao': 'descricao', 'unidade': 'unidade'}
 map_cmed = {'ean': 'ean', 'produto': 'produto', 'substancia': 'substancia', 'pf': 'pf', 'pmvg': 'pmvg'}
 
-# SINAPI: Achar coluna de preço
-try:
-    df_sinapi = pd.read_csv(os.path.join(csv_dir, "sinapi_limpo.csv"))
-    price_cols = [c for c in df_sinapi.columns if c not in ['codigo', 'descricao', 'unidade', 'classe']]
-    if price_cols: map_sinapi[price_cols[0]] = 'preco_base'
-except: pass
-
-# Limpar tabelas antes de re-importar (Opcional, mas seguro para teste)
-print("Limpando tabelas para nova importação...")
-supabase.table("referencia_catser").delete().neq("codigo", "0").execute()
-supabase.table("referencia_sinapi").delete().neq("codigo", "0").execute()
-supabase.table("referencia_cmed").delete().neq("produto", "").execute()
-
-import_csv("catser_limpo.csv", "referencia_catser", map_catser)
-import_csv("sinapi_limpo.csv", "referencia_sinapi", map_sinapi, is_numeric=['preco_base'])
-import_csv("cmed_limpo.csv", "referencia_cmed", map_cmed, is_numeric=['pf', 'pmvg'])
-
-# Mapeamentos (Coluna CSV -> Coluna Banco)
-map_catser = {
-    'codigo': 'codigo',
-    'descricao': 'descricao',
-    'Grupo': 'grupo',
-    'Classe': 'classe'
-}
-
-map_sinapi = {
-    'codigo': 'codigo',
-    'descricao': 'descricao',
-    'unidade': 'unidade'
-    # 'precos...' - Vamos pegar o primeiro preço numérico se houver
-}
-
-map_cmed = {
-    'ean': 'ean',
-    'produto': 'produto',
-    'substancia': 'substancia',
-    'pf': 'pf',
-    'pmvg': 'pmvg'
-}
-
-# Pegar preço base para SINAPI (ajuste manual de coluna se necessário)
-df_sinapi = pd.read_csv(os.path.join(csv_dir, "sinapi_limpo.csv"))
-num_cols = df_sinapi.select_dtypes(include=['float64', 'int64']).columns
-if len(num_cols) > 1: # código é numérico no SINAPI, então o preço é a segunda ou além
-    price_col = [c for c in num_cols if c != 'codigo'][0]
-    map_sinapi[price_col] = 'preco_base'
-
-# Executar importações
-import_csv("catser_limpo.csv", "referencia_catser", map_catser)
-import_csv("sinapi_limpo.csv", "referencia_sinapi", map_sinapi)
-import_csv("cmed_limpo.csv", "referencia_cmed", map_cmed)
-
-print("\nImportação finalizada!")
+# Colunas com índice único, usadas no upsert (on_conflict)
+conflito_catser = 'codigo'
+conflito_sinapi = 'codigo'
+conflito_cmed = 'ean'
+
+# Chaves naturais do manifesto: as mesmas do upsert, para o manifesto
+# acompanhar exatamente as linhas que ficam no banco. No CMED as linhas sem
+# EAN formam um grupo só (apagado e reinserido quando alguma muda).
+chave_catser = [conflito_catser]
+chave_sinapi = [conflito_sinapi]
+chave_cmed = [conflito_cmed]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa os CSV limpos para as tabelas referencia_* do Supabase")
+    parser.add_argument('--completo', action='store_true',
+                        help="apaga e reimporta as tabelas inteiras, ignorando o manifesto")
+    parser.add_argument('--workers', type=int, default=4, help="lotes enviados em paralelo (padrão: 4)")
+    parser.add_argument('--lote', type=int, default=500, help="tamanho inicial do lote (padrão: 500)")
+    parser.add_argument('--dsn', default=os.environ.get("DATABASE_URL"),
+                        help="connection string do Postgres para gravar via COPY (padrão: $DATABASE_URL)")
+    parser.add_argument('--limite-quarentena', type=float, default=qualidade.LIMITE_QUARENTENA,
+                        help=f"fração máxima de linhas em quarentena por tabela (padrão: {qualidade.LIMITE_QUARENTENA})")
+    parser.add_argument('--ignorar-qualidade', action='store_true',
+                        help="importa mesmo as tabelas acima do limite (sem as linhas em quarentena)")
+    parser.add_argument('--uf', type=str.upper, choices=UFS,
+                        help="UF cujo preço do SINAPI vai para preco_base (padrão: a primeira coluna, AC)")
+    args = parser.parse_args()
+    opcoes = dict(estado=None, completo=args.completo, workers=args.workers, lote=args.lote, dsn=args.dsn,
+                  limite_quarentena=args.limite_quarentena, ignorar_qualidade=args.ignorar_qualidade)
+
+    # SINAPI: Achar coluna de preço (a leitura fica no snapshot e é reaproveitada no import)
+    try:
+        df_sinapi = ler_planilha(os.path.join(csv_dir, "sinapi_limpo.csv"))
+        price_cols = [c for c in df_sinapi.columns if c not in ['codigo', 'descricao', 'unidade', 'classe']]
+        if args.uf and args.uf not in price_cols:
+            print(f"Aviso: o SINAPI não tem a coluna {args.uf}, usando {price_cols[0]}.")
+        if price_cols: map_sinapi[args.uf if args.uf in price_cols else price_cols[0]] = 'preco_base'
+    except: pass
+
+    opcoes['estado'] = manifesto.carregar(csv_dir)
+    try:
+        import_csv("catser_limpo.csv", "referencia_catser", map_catser, chave_catser, conflito_catser, **opcoes)
+        import_csv("sinapi_limpo.csv", "referencia_sinapi", map_sinapi, chave_sinapi, conflito_sinapi,
+                   is_numeric=['preco_base'], **opcoes)
+        import_csv("cmed_limpo.csv", "referencia_cmed", map_cmed, chave_cmed, conflito_cmed,
+                   is_numeric=['pf', 'pmvg'], **opcoes)
+    except RuntimeError as e:
+        print(f"Erro: {e}")
+        sys.exit(1)
+
+    print("\nImportação finalizada!")
@@ -0,0 +1,205 @@
+import json
+import os
+import re
+import unicodedata
+
+import numpy as np
+
+from planilhas_limpas import pasta_geracao, publicar_geracao
+
+# Índice invertido de n-gramas (1 a 3 caracteres) sobre o texto normalizado
+# (minúsculo e sem acentos) de cada catálogo. Cada chave aponta para a lista
+# ordenada das linhas do CSV que contêm aquele n-grama, e o texto normalizado
+# fica gravado junto para confirmar as buscas por substring.
+#
+# Os arquivos ficam em Planilhas_Limpas/indices/<catalogo>/<geracao>/ e são
+# abertos com mmap, então carregar um índice já construído é imediato.
+
+PASTA_INDICES = "indices"
+TAMANHO_NGRAMA = 3
+BITS_CARACTERE = 21  # qualquer code point unicode cabe em 21 bits
+
+# Abaixo deste número de candidatos é mais barato conferir o texto do que
+# continuar cruzando listas de postings
+LIMITE_CONFERENCIA = 64
+
+_ACENTOS = re.compile('[\u0300-\u036f]')
+
+
+def normalizar_texto(texto):
+    # "Dipirona SÓDICA" -> "dipirona sodica"
+    if texto is None or (isinstance(texto, float) and np.isnan(texto)):
+        return ''
+    return _ACENTOS.sub('', unicodedata.normalize('NFKD', str(texto))).lower()
+
+
+def normalizar_serie(serie):
+    # Versão vetorizada de normalizar_texto para uma coluna inteira
+    return (serie.fillna('').astype(str)
+            .str.normalize('NFKD')
+            .str.replace(_ACENTOS.pattern, '', regex=True)
+            .str.lower())
+
+
+def _codepoints(texto):
+    return np.frombuffer(texto.encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+
+
+def _chave(cod, pos, n):
+    # Uni, bi e trigramas dividem o mesmo espaço de chaves: as posições que
+    # sobram ficam zeradas e o zero nunca aparece dentro de um texto
+    chave = cod[pos] << (2 * BITS_CARACTERE)
+    if n >= 2:
+        chave = chave | (cod[pos + 1] << BITS_CARACTERE)
+    if n >= 3:
+        chave = chave | cod[pos + 2]
+    return chave
+
+
+def _chaves_termo(termo):
+    cod = _codepoints(termo)
+    n = min(TAMANHO_NGRAMA, len(cod))
+    pos = np.arange(len(cod) - n + 1)
+    return np.unique(_chave(cod, pos, n))
+
+
+class IndiceNgramas:
+    def __init__(self, chaves, offsets, linhas, texto, texto_offsets):
+        self.chaves = chaves
+        self.offsets = offsets
+        self.linhas = linhas
+        self.texto = texto
+        self.texto_offsets = texto_offsets
+        self._textos = None
+
+    def __len__(self):
+        return len(self.texto_offsets) - 1
+
+    @classmethod
+    def construir(cls, textos):
+        # textos: sequência de strings já normalizadas, uma por linha do CSV
+        textos = [t.replace('\x00', ' ') for t in textos]
+        juntos = '\x00'.join(textos) + '\x00'
+
+        cod = _codepoints(juntos)
+        separador = cod == 0
+        linha_pos = (np.cumsum(separador) - separador).astype(np.int32)
+
+        chaves, linhas = [], []
+        for n in range(1, TAMANHO_NGRAMA + 1):
+            validos = ~separador[:len(cod) - n + 1]
+            for k in range(1, n):
+                validos &= ~separador[k:len(cod) - n + 1 + k]
+            pos = np.flatnonzero(validos)
+            chaves.append(_chave(cod, pos, n))
+            linhas.append(linha_pos[pos])
+        chaves = np.concatenate(chaves)
+        linhas = np.concatenate(linhas)
+
+        # Ordena por (chave, linha) e remove pares repetidos
+        ordem = np.lexsort((linhas, chaves))
+        chaves, linhas = chaves[ordem], linhas[ordem]
+        novo = np.ones(len(chaves), dtype=bool)
+        novo[1:] = (chaves[1:] != chaves[:-1]) | (linhas[1:] != linhas[:-1])
+        chaves, linhas = chaves[novo], linhas[novo]
+
+        chaves_unicas, inicio = np.unique(chaves, return_index=True)
+        offsets = np.append(inicio, len(chaves)).astype(np.int64)
+
+        texto = np.frombuffer(juntos.encode('utf-8'), dtype=np.uint8)
+        fim = np.flatnonzero(texto == 0)
+        texto_offsets = np.concatenate([[0], fim + 1]).astype(np.int64)
+
+        return cls(chaves_unicas, offsets, linhas, texto, texto_offsets)
+
+    def salvar(self, pasta):
+        os.makedirs(pasta, exist_ok=True)
+        for nome in ('chaves', 'offsets', 'linhas', 'texto', 'texto_offsets'):
+            np.save(os.path.join(pasta, f"{nome}.npy"), getattr(self, nome))
+
+    @classmethod
+    def carregar(cls, pasta):
+        arrays = [np.load(os.path.join(pasta, f"{nome}.npy"), mmap_mode='r')
+                  for nome in ('chaves', 'offsets', 'linhas', 'texto', 'texto_offsets')]
+        return cls(*arrays)
+
+    def textos(self):
+        # Decodifica o texto normalizado de todas as linhas de uma vez só na
+        # primeira conferência (bem mais barato que decodificar linha a linha)
+        if self._textos is None:
+            self._textos = self.texto.tobytes().decode('utf-8').split('\x00')[:-1]
+        return self._textos
+
+    def texto_linha(self, linha):
+        return self.textos()[linha]
+
+    def postings(self, chave):
+        i = np.searchsorted(self.chaves, chave)
+        if i == len(self.chaves) or self.chaves[i] != chave:
+            return None
+        return self.linhas[self.offsets[i]:self.offsets[i + 1]]
+
+    def buscar(self, termo):
+        # Retorna as linhas (em ordem crescente) cujo texto contém o termo,
+        # com a mesma semântica de substring do str.contains(case=False)
+        termo = normalizar_texto(termo).strip()
+        if not termo:
+            return np.empty(0, dtype=np.int64)
+
+        listas = []
+        for chave in _chaves_termo(termo):
+            lista = self.postings(chave)
+            if lista is None:
+                return np.empty(0, dtype=np.int64)
+            listas.append(lista)
+        listas.sort(key=len)
+
+        # Cruza a partir da lista mais curta, buscando cada candidato nas
+        # demais com busca binária (custo proporcional aos candidatos)
+        candidatos = np.asarray(listas[0], dtype=np.int64)
+        for lista in listas[1:]:
+            if len(candidatos) <= LIMITE_CONFERENCIA:
+                break
+            pos = np.searchsorted(lista, candidatos)
+            pos[pos == len(lista)] = 0
+            candidatos = candidatos[lista[pos] == candidatos]
+
+        if len(termo) <= TAMANHO_NGRAMA:
+            return candidatos
+        textos = self.textos()
+        confere = [linha for linha in candidatos.tolist() if termo in textos[linha]]
+        return np.asarray(confere, dtype=np.int64)
+
+
+def obter_ou_construir(classe, nome, pasta_nome, caminho_csv, textos):
+    # Abre o índice (classe com construir/salvar/carregar) da geração atual
+    # do CSV ou constrói um novo. textos: função que devolve os textos
+    # normalizados (só chamada se for preciso construir)
+    pasta = pasta_geracao(caminho_csv, PASTA_INDICES, pasta_nome)
+    if os.path.exists(os.path.join(pasta, 'meta.json')):
+        return classe.carregar(pasta)
+
+    indice = classe.construir(textos())
+
+    def gravar(destino):
+        indice.salvar(destino)
+        with open(os.path.join(destino, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'catalogo': nome, 'csv': os.path.basename(caminho_csv),
+                       'linhas': len(indice)}, f)
+
+    os.makedirs(os.path.dirname(pasta), exist_ok=True)
+    publicar_geracao(pasta, gravar)
+    return classe.carregar(pasta)
+
+
+def obter_indice(nome, caminho_csv, textos):
+    # Índice de n-gramas do catálogo (ver obter_ou_construir)
+    return obter_ou_construir(IndiceNgramas, nome, nome.lower(), caminho_csv, textos)
+
+
+def textos_catalogo(df, colunas):
+    # Junta as colunas pesquisáveis de cada linha (ex.: produto + substância no CMED)
+    textos = normalizar_serie(df[colunas[0]])
+    for col in colunas[1:]:
+        textos = textos + '\n' + normalizar_serie(df[col])
+    return textos.tolist()
@@ -0,0 +1,113 @@
+import os
+
+import numpy as np
+
+from indice_busca import obter_ou_construir
+
+# Índice hash EAN -> linha do CMED, para consultas por código de barras em
+# O(1) (um leitor no balcão, uma planilha com a coluna de EAN).
+#
+# Tabela de endereçamento aberto em dois arrays numpy (chaves int64 e
+# linhas int32), com capacidade potência de 2 e no máximo metade ocupada.
+# O slot inicial vem do hash multiplicativo do EAN e as colisões vão para o
+# slot seguinte (sondagem linear). Construção e consulta são vetorizadas:
+# a cada rodada todas as chaves pendentes testam o próximo slot de uma vez.
+# Gravado como os outros índices (Planilhas_Limpas/indices/cmed_ean/<geracao>/,
+# aberto com mmap). Com EAN repetido fica a última linha.
+
+VAZIO = -1
+_MULTIPLICADOR = np.uint64(0x9E3779B97F4A7C15)  # 2^64 / razão áurea
+
+
+def _slots(eans, bits):
+    return ((eans.astype(np.uint64) * _MULTIPLICADOR) >> np.uint64(64 - bits)).astype(np.int64)
+
+
+class IndiceEan:
+    def __init__(self, chaves, linhas):
+        self.chaves = chaves
+        self.linhas = linhas
+        self.bits = int(len(chaves)).bit_length() - 1
+        self._n = None
+
+    def __len__(self):
+        if self._n is None:
+            self._n = int(np.count_nonzero(np.asarray(self.chaves) != VAZIO))
+        return self._n
+
+    @classmethod
+    def construir(cls, eans):
+        # eans: int64, um por linha do CSV (<= 0 = sem EAN)
+        eans = np.asarray(eans, dtype=np.int64)
+        linhas = np.flatnonzero(eans > 0)
+        chaves = eans[linhas]
+        # EAN repetido: a última linha vence
+        _, ultima = np.unique(chaves[::-1], return_index=True)
+        fica = np.sort(len(chaves) - 1 - ultima)
+        chaves, linhas = chaves[fica], linhas[fica]
+
+        bits = max(int(2 * len(chaves)).bit_length(), 4)
+        tabela_chaves = np.full(1 << bits, VAZIO, dtype=np.int64)
+        tabela_linhas = np.full(1 << bits, VAZIO, dtype=np.int32)
+        mascara = (1 << bits) - 1
+        pendentes = np.arange(len(chaves))
+        slot = _slots(chaves, bits)
+        while len(pendentes):
+            alvo = slot[pendentes]
+            livre = tabela_chaves[alvo] == VAZIO
+            # Várias chaves no mesmo slot livre: entra a primeira, as outras seguem
+            candidatas = pendentes[livre]
+            _, primeira = np.unique(alvo[livre], return_index=True)
+            entram = candidatas[primeira]
+            tabela_chaves[slot[entram]] = chaves[entram]
+            tabela_linhas[slot[entram]] = linhas[entram]
+            pendentes = np.setdiff1d(pendentes, entram, assume_unique=True)
+            slot[pendentes] = (slot[pendentes] + 1) & mascara
+        return cls(tabela_chaves, tabela_linhas)
+
+    def salvar(self, pasta):
+        os.makedirs(pasta, exist_ok=True)
+        np.save(os.path.join(pasta, "chaves.npy"), self.chaves)
+        np.save(os.path.join(pasta, "linhas.npy"), self.linhas)
+
+    @classmethod
+    def carregar(cls, pasta):
+        return cls(np.load(os.path.join(pasta, "chaves.npy"), mmap_mode='r'),
+                   np.load(os.path.join(pasta, "linhas.npy"), mmap_mode='r'))
+
+    def posicoes(self, eans):
+        # Linha de cada EAN no CSV, -1 quando não existe
+        eans = np.asarray(eans, dtype=np.int64)
+        saida = np.full(len(eans), -1, dtype=np.int64)
+        pendentes = np.flatnonzero(eans > 0)
+        slot = _slots(eans[pendentes], self.bits)
+        mascara = len(self.chaves) - 1
+        while len(pendentes):
+            chave = self.chaves[slot]
+            achou = chave == eans[pendentes]
+            saida[pendentes[achou]] = self.linhas[slot[achou]]
+            # Slot vazio: o EAN não está na tabela
+            segue = ~achou & (chave != VAZIO)
+            pendentes, slot = pendentes[segue], (slot[segue] + 1) & mascara
+        return saida
+
+    def linha(self, ean):
+        # Um EAN só (leitor de código de barras): a mesma sondagem em int do Python
+        ean = int(ean)
+        if ean <= 0:
+            return -1
+        mascara = len(self.chaves) - 1
+        slot = ((ean * int(_MULTIPLICADOR)) & 0xFFFFFFFFFFFFFFFF) >> (64 - self.bits)
+        while True:
+            chave = int(self.chaves[slot])
+            if chave == ean:
+                return int(self.linhas[slot])
+            if chave == VAZIO:
+                return -1
+            slot = (slot + 1) & mascara
+
+
+def obter_indice_ean(nome, caminho_csv, eans):
+    # Índice de EAN do catálogo (ver obter_ou_construir); eans: função que
+    # devolve a coluna de EAN, só chamada se for preciso construir
+    return obter_ou_construir(IndiceEan, nome, f"{nome.lower()}_ean", caminho_csv, eans)
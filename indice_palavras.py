@@ -0,0 +1,96 @@
+import bisect
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from indice_busca import obter_ou_construir
+
+# Índice invertido por palavra (texto já normalizado, sem acentos).
+#
+# O vocabulário fica ordenado num blob UTF-8 separado por '\x00' e, para
+# cada palavra, a lista ordenada das linhas que a contêm e quantas vezes ela
+# aparece em cada uma (frequência, usada no ranking). O número de palavras
+# de cada linha vai junto. Mesmo esquema de gravação do índice de n-gramas:
+# Planilhas_Limpas/indices/<catalogo>_palavras/<geracao>/, aberto com mmap.
+
+PALAVRA = re.compile(r'\w+')
+
+
+def tokenizar(texto):
+    return PALAVRA.findall(texto)
+
+
+class IndicePalavras:
+    def __init__(self, vocabulario, vocabulario_offsets, offsets, linhas, frequencias, comprimentos):
+        self.vocabulario = vocabulario
+        self.vocabulario_offsets = vocabulario_offsets
+        self.offsets = offsets
+        self.linhas = linhas
+        self.frequencias = frequencias
+        self.comprimentos = comprimentos
+        self._palavras = None
+
+    def __len__(self):
+        return len(self.comprimentos)
+
+    @classmethod
+    def construir(cls, textos):
+        # textos: sequência de strings já normalizadas, uma por linha do CSV
+        tokens = pd.Series(list(textos), dtype=object).str.findall(PALAVRA.pattern)
+        comprimentos = tokens.str.len().fillna(0).to_numpy(np.int32)
+        tokens = tokens.explode().dropna()
+        linha_token = tokens.index.to_numpy(np.int64)
+        ids, palavras = pd.factorize(tokens.to_numpy(), sort=True)
+
+        # (palavra, linha) únicos com a contagem de ocorrências
+        pares = ids.astype(np.int64) * len(comprimentos) + linha_token
+        pares, frequencias = np.unique(pares, return_counts=True)
+        ids, linhas = np.divmod(pares, len(comprimentos))
+        offsets = np.searchsorted(ids, np.arange(len(palavras) + 1)).astype(np.int64)
+
+        blob = ('\x00'.join(palavras) + '\x00').encode('utf-8') if len(palavras) else b''
+        vocabulario = np.frombuffer(blob, dtype=np.uint8)
+        fim = np.flatnonzero(vocabulario == 0)
+        vocabulario_offsets = np.concatenate([[0], fim + 1]).astype(np.int64)
+        return cls(vocabulario, vocabulario_offsets, offsets, linhas.astype(np.int32),
+                   np.minimum(frequencias, np.iinfo(np.uint16).max).astype(np.uint16), comprimentos)
+
+    def salvar(self, pasta):
+        os.makedirs(pasta, exist_ok=True)
+        for nome in ('vocabulario', 'vocabulario_offsets', 'offsets', 'linhas', 'frequencias', 'comprimentos'):
+            np.save(os.path.join(pasta, f"{nome}.npy"), getattr(self, nome))
+
+    @classmethod
+    def carregar(cls, pasta):
+        arrays = [np.load(os.path.join(pasta, f"{nome}.npy"), mmap_mode='r')
+                  for nome in ('vocabulario', 'vocabulario_offsets', 'offsets', 'linhas',
+                               'frequencias', 'comprimentos')]
+        return cls(*arrays)
+
+    def palavras(self):
+        # Vocabulário decodificado (lista ordenada), só na primeira consulta
+        if self._palavras is None:
+            self._palavras = self.vocabulario.tobytes().decode('utf-8').split('\x00')[:-1]
+        return self._palavras
+
+    def id_palavra(self, palavra):
+        # Posição da palavra no vocabulário, ou -1
+        palavras = self.palavras()
+        i = bisect.bisect_left(palavras, palavra)
+        return int(i) if i < len(palavras) and palavras[i] == palavra else -1
+
+    def documentos(self, id_palavra):
+        # Em quantas linhas a palavra aparece
+        return int(self.offsets[id_palavra + 1] - self.offsets[id_palavra])
+
+    def postings(self, id_palavra):
+        # (linhas, frequências) da palavra
+        inicio, fim = self.offsets[id_palavra], self.offsets[id_palavra + 1]
+        return self.linhas[inicio:fim], self.frequencias[inicio:fim]
+
+
+def obter_indice_palavras(nome, caminho_csv, textos):
+    # Índice de palavras do catálogo, gravado ao lado do índice de n-gramas
+    return obter_ou_construir(IndicePalavras, nome, f"{nome.lower()}_palavras", caminho_csv, textos)
@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+# Instrumentação dos caminhos quentes (limpeza, importação, busca): etapas
+# com nome e duração, linhas por segundo, contadores (retentativas...) e
+# pico de memória, sem precisar de profiler.
+#
+#   INSTRUMENTACAO=eventos.jsonl python process_planilhas.py   (uma linha JSON por evento)
+#   INSTRUMENTACAO=trace.json python importar_para_supabase.py (Chrome trace: Perfetto/chrome://tracing)
+#   INSTRUMENTACAO_MEMORIA=1 ...  pico do tracemalloc em cada etapa (bem mais lento: até ~10x
+#                                 na leitura das planilhas, que aloca muito objeto pequeno)
+#   python instrumentacao.py eventos.jsonl                     (resumo por etapa)
+#
+# No código:
+#
+#   with etapa('limpeza.gravar_csv', fonte='cmed') as e:
+#       ...
+#       e.definir(linhas=len(df))
+#   contar('importacao.retentativas')
+#
+# Sem a variável de ambiente etapa() devolve um objeto nulo compartilhado e
+# contar() retorna na hora, então podem ficar nos laços quentes. Os eventos
+# são acrescentados ao arquivo assim que terminam (os processos do pool de
+# limpeza escrevem no mesmo arquivo). O Chrome trace usa o formato de array
+# sem o ']' final, que o visualizador aceita.
+
+DESTINO = os.environ.get("INSTRUMENTACAO") or None
+MEMORIA = bool(os.environ.get("INSTRUMENTACAO_MEMORIA")) and DESTINO is not None
+if MEMORIA and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+_trava = threading.Lock()
+_local = threading.local()
+_contadores = defaultdict(int)
+_arquivo = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def ativa():
+    return DESTINO is not None
+
+
+def _chrome():
+    return DESTINO.endswith('.json')
+
+
+def _escrever(evento):
+    global _arquivo
+    with _trava:
+        if _arquivo is None:
+            _arquivo = open(DESTINO, 'a', encoding='utf-8')
+            if _chrome() and _arquivo.tell() == 0:
+                _arquivo.write('[\n')
+        _arquivo.write(json.dumps(evento, ensure_ascii=False, default=str) + (',\n' if _chrome() else '\n'))
+        _arquivo.flush()
+
+
+def _rss_max_mb():
+    # Pico de memória residente do processo (ru_maxrss: KB no Linux, bytes no macOS)
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / 2**20 if sys.platform == 'darwin' else pico / 2**10, 1)
+
+
+def _pilha():
+    if not hasattr(_local, 'pilha'):
+        _local.pilha = []
+    return _local.pilha
+
+
+class Etapa:
+    def __init__(self, nome, atributos):
+        self.nome = nome
+        self.atributos = atributos
+
+    def definir(self, **atributos):
+        # Atributos conhecidos só no fim (linhas gravadas, total de resultados...)
+        self.atributos.update(atributos)
+
+    def __enter__(self):
+        pilha = _pilha()
+        self.pai = pilha[-1].nome if pilha else None
+        self.pico_filhas = 0
+        if MEMORIA and tracemalloc.is_tracing():
+            # O pico do tracemalloc é um só por processo: zera para medir esta
+            # etapa e repassa o pico anterior para a etapa de fora
+            anterior = tracemalloc.get_traced_memory()[1]
+            if pilha:
+                pilha[-1].pico_filhas = max(pilha[-1].pico_filhas, anterior)
+            tracemalloc.reset_peak()
+        pilha.append(self)
+        self.inicio_us = time.time_ns() // 1000
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, erro, _):
+        segundos = time.perf_counter() - self.inicio
+        pilha = _pilha()
+        pilha.pop()
+        evento = dict(self.atributos)
+        linhas = evento.get('linhas')
+        if linhas and segundos > 0:
+            evento['linhas_por_s'] = round(linhas / segundos, 1)
+        if MEMORIA and tracemalloc.is_tracing():
+            pico = max(tracemalloc.get_traced_memory()[1], self.pico_filhas)
+            evento['pico_tracemalloc_mb'] = round(pico / 2**20, 2)
+            if pilha:
+                pilha[-1].pico_filhas = max(pilha[-1].pico_filhas, pico)
+        evento['rss_max_mb'] = _rss_max_mb()
+        if tipo is not None:
+            evento['erro'] = f"{tipo.__name__}: {erro}"
+        if _chrome():
+            _escrever({'name': self.nome, 'ph': 'X', 'ts': self.inicio_us, 'dur': round(segundos * 1e6),
+                       'pid': os.getpid(), 'tid': threading.get_ident(), 'args': evento})
+        else:
+            _escrever({'tipo': 'etapa', 'nome': self.nome, 'pai': self.pai, 'inicio': self.inicio_us / 1e6,
+                       'segundos': round(segundos, 6), 'pid': os.getpid(), 'tid': threading.get_ident(),
+                       **evento})
+        return False
+
+
+class _EtapaNula:
+    # Devolvida quando a instrumentação está desligada
+    __slots__ = ()
+
+    def definir(self, **atributos):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+
+_NULA = _EtapaNula()
+
+
+def etapa(nome, **atributos):
+    if DESTINO is None:
+        return _NULA
+    return Etapa(nome, atributos)
+
+
+def contar(nome, n=1, **atributos):
+    # Soma n ao contador do processo e registra o total acumulado
+    if DESTINO is None:
+        return
+    with _trava:
+        _contadores[nome] += n
+        total = _contadores[nome]
+    if _chrome():
+        _escrever({'name': nome, 'ph': 'C', 'ts': time.time_ns() // 1000, 'pid': os.getpid(),
+                   'args': {'total': total}})
+    else:
+        _escrever({'tipo': 'contador', 'nome': nome, 'n': n, 'total': total, 'inicio': time.time(),
+                   'pid': os.getpid(), 'tid': threading.get_ident(), **atributos})
+
+
+# --- Resumo de um arquivo de eventos ---
+
+def ler_eventos(caminho):
+    # Eventos de um arquivo JSON lines ou Chrome trace, no formato JSON lines
+    eventos = []
+    with open(caminho, encoding='utf-8') as f:
+        for linha in f:
+            linha = linha.strip().rstrip(',')
+            if not linha or linha in ('[', ']'):
+                continue
+            evento = json.loads(linha)
+            if 'ph' in evento:
+                if evento['ph'] == 'X':
+                    evento = {'tipo': 'etapa', 'nome': evento['name'], 'segundos': evento['dur'] / 1e6,
+                              **evento['args']}
+                elif evento['ph'] == 'C':
+                    evento = {'tipo': 'contador', 'nome': evento['name'], 'total': evento['args']['total'],
+                              'pid': evento['pid']}
+                else:
+                    continue
+            eventos.append(evento)
+    return eventos
+
+
+def resumir(eventos):
+    # {nome: {'vezes', 'segundos', 'max_s', 'linhas', 'pico_mb'}} das etapas e
+    # {nome: total} dos contadores (somando os processos)
+    etapas = defaultdict(lambda: {'vezes': 0, 'segundos': 0.0, 'max_s': 0.0, 'linhas': 0, 'pico_mb': None})
+    contadores = {}
+    for e in eventos:
+        if e['tipo'] == 'contador':
+            contadores.setdefault(e['nome'], {})[e.get('pid')] = e['total']
+            continue
+        r = etapas[e['nome']]
+        r['vezes'] += 1
+        r['segundos'] += e['segundos']
+        r['max_s'] = max(r['max_s'], e['segundos'])
+        r['linhas'] += e.get('linhas') or 0
+        pico = e.get('pico_tracemalloc_mb')
+        if pico is not None:
+            r['pico_mb'] = max(r['pico_mb'] or 0, pico)
+    return dict(etapas), {nome: sum(totais.values()) for nome, totais in contadores.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resumo por etapa de um arquivo da instrumentação")
+    parser.add_argument('arquivo', help="eventos gravados com INSTRUMENTACAO=<arquivo>")
+    parser.add_argument('--top', type=int, default=30, help="etapas mostradas (as mais demoradas)")
+    args = parser.parse_args(argv)
+
+    etapas, contadores = resumir(ler_eventos(args.arquivo))
+    print(f"{'etapa':<40} {'vezes':>7} {'total s':>10} {'máx s':>9} {'linhas/s':>11} {'pico MB':>8}")
+    for nome, r in sorted(etapas.items(), key=lambda item: -item[1]['segundos'])[:args.top]:
+        por_s = f"{r['linhas'] / r['segundos']:11.0f}" if r['linhas'] and r['segundos'] else f"{'':>11}"
+        pico = f"{r['pico_mb']:8.1f}" if r['pico_mb'] is not None else f"{'':>8}"
+        print(f"{nome:<40} {r['vezes']:>7} {r['segundos']:10.3f} {r['max_s']:9.3f} {por_s} {pico}")
+    for nome, total in sorted(contadores.items()):
+        print(f"{nome}: {total}")
+
+
+if __name__ == "__main__":
+    main()
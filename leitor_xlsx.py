@@ -0,0 +1,87 @@
+import itertools
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from planilhas_limpas import gravacao_atomica
+
+# Leitura em streaming das planilhas de origem (CMED/SINAPI).
+#
+# O openpyxl em modo read_only entrega uma linha por vez, então a planilha
+# nunca é carregada inteira: o cabeçalho é procurado só nas primeiras linhas
+# e os dados saem em blocos de tamanho fixo, com memória constante.
+
+LINHAS_CABECALHO = 100
+TAMANHO_BLOCO = 5000
+
+
+def iterar_linhas(caminho, aba=None):
+    wb = load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        ws = wb[aba] if aba else wb.worksheets[0]
+        for linha in ws.iter_rows(values_only=True):
+            yield linha
+    finally:
+        wb.close()
+
+
+def nomes_colunas(cabecalho):
+    # Mesmos nomes que o pandas daria (células vazias viram "Unnamed: i"),
+    # já sem quebras de linha
+    return [f"Unnamed: {i}" if c is None else str(c).replace('\n', ' ').strip()
+            for i, c in enumerate(cabecalho)]
+
+
+def localizar_cabecalho(linhas, reconhece, max_linhas=LINHAS_CABECALHO):
+    # Procura o cabeçalho nas primeiras max_linhas. reconhece recebe o texto
+    # da linha em maiúsculas. Se nada for reconhecido, a primeira linha vira o
+    # cabeçalho (mesmo comportamento do read_excel sem skiprows).
+    # Retorna (índice, colunas, iterador com as linhas seguintes).
+    lidas = []
+    for linha in linhas:
+        lidas.append(linha)
+        texto = " ".join(str(x) for x in linha if x is not None).upper()
+        if reconhece(texto):
+            indice = len(lidas) - 1
+            return indice, nomes_colunas(linha), linhas
+        if len(lidas) >= max_linhas:
+            break
+
+    if not lidas:
+        return None, [], iter(())
+    return None, nomes_colunas(lidas[0]), itertools.chain(lidas[1:], linhas)
+
+
+def em_blocos(linhas, colunas, tamanho_bloco=TAMANHO_BLOCO):
+    # colunas: {nome_saida: posição na linha}. Só essas células são copiadas,
+    # então planilhas largas não pesam na memória. Os blocos saem com dtype
+    # object; quem limpa chama infer_objects() depois de descartar as linhas
+    # vazias, para que códigos inteiros não virem float por causa de um None.
+    posicoes = list(colunas.values())
+    bloco = []
+    for linha in linhas:
+        bloco.append([linha[p] if p < len(linha) else None for p in posicoes])
+        if len(bloco) >= tamanho_bloco:
+            yield pd.DataFrame(bloco, columns=list(colunas), dtype=object)
+            bloco = []
+    if bloco:
+        yield pd.DataFrame(bloco, columns=list(colunas), dtype=object)
+
+
+def gravar_blocos(blocos, caminho_saida, colunas):
+    # Grava os blocos já limpos num único CSV (com BOM, como os demais
+    # arquivos de Planilhas_Limpas). Retorna o total de linhas gravadas.
+    # Os blocos vão para um temporário, que só substitui o CSV no fim
+    total = 0
+    primeiro = True
+    with gravacao_atomica(caminho_saida) as temporario:
+        for bloco in blocos:
+            bloco.to_csv(temporario, index=False, header=primeiro,
+                         mode='w' if primeiro else 'a',
+                         encoding='utf-8-sig' if primeiro else 'utf-8')
+            total += len(bloco)
+            primeiro = False
+        if primeiro:
+            # Nenhum bloco: ainda assim deixa o CSV só com o cabeçalho
+            pd.DataFrame(columns=colunas).to_csv(temporario, index=False, encoding='utf-8-sig')
+    return total
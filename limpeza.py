@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+# Transformações de limpeza compartilhadas pelos scripts de processamento.
+# Todas recebem e devolvem DataFrames e trabalham coluna a coluna.
+
+# Código e descrição às vezes vêm juntos na mesma célula:
+# '15377                   INFRA-ESTRUTURA AEROPORTUARIA'
+PADRAO_CODIGO_DESCRICAO = r'^(\d+)\s*(.*)'
+
+
+def _como_texto(serie):
+    # Equivale a str(valor) célula a célula (NaN vira 'nan'), sem depender
+    # de como a versão do pandas trata NaN no astype(str); object antes para
+    # aceitar colunas Int64/string (EAN já convertido pelo snapshot)
+    return serie.astype(object).where(serie.notna(), 'nan').astype(str)
+
+
+def limpar_catser(df_raw):
+    # df_raw: planilha CATSER lida com header=None (dados a partir da linha 3)
+    df = df_raw.iloc[3:]
+    grupo = _como_texto(df[0]).str.strip()
+    classe = _como_texto(df[1]).str.strip()
+
+    # Coluna 2 costuma ser o código, e coluna 3 a descrição completa
+    codigo = _como_texto(df[2]).str.strip()
+    if df.shape[1] > 3:
+        descricao = _como_texto(df[3]).str.strip()
+    else:
+        descricao = pd.Series('', index=df.index)
+
+    # Fallback: se a descrição estiver vazia, código e descrição podem estar
+    # juntos na coluna 2
+    juntos = ((descricao == '') | (descricao == 'nan')) & (codigo != '')
+    partes = codigo[juntos].str.extract(PADRAO_CODIGO_DESCRICAO)
+    casou = partes.index[partes[0].notna()]
+    codigo.loc[casou] = partes.loc[casou, 0]
+    descricao.loc[casou] = partes.loc[casou, 1].str.strip()
+
+    valido = (codigo != 'nan') & (codigo.str.len() > 1) & (descricao != 'nan')
+    df_final = pd.DataFrame({
+        'codigo': codigo,
+        'descricao': descricao,
+        'Grupo': grupo,
+        'Classe': classe,
+    })[valido]
+    return df_final.reset_index(drop=True)
+
+
+# GTIN (EAN-8, UPC-12, EAN-13, GTIN-14): só dígitos, um desses tamanhos e o
+# dígito verificador certo. Guardado como int64 (zeros à esquerda não mudam
+# o GTIN, então o número é a chave canônica)
+TAMANHOS_GTIN = (8, 12, 13, 14)
+# Vazio, "-" e "    -     " (placeholder do CMED): produto sem EAN
+_SEM_EAN = r'^[\s\-]*$'
+
+
+def validar_gtin(serie):
+    # (ean Int64, motivo): motivo '' para EAN válido ou ausente (ean vazio),
+    # 'ean_formato' ou 'ean_digito_verificador' para os rejeitados
+    if pd.api.types.is_integer_dtype(serie):
+        return _validar_gtin_numerico(serie)
+    texto = _como_texto(serie).str.strip().str.replace(r'\.0$', '', regex=True)
+    ausente = texto.str.fullmatch(_SEM_EAN) | texto.eq('nan')
+    digitos = texto.str.replace(r'[\s\-]', '', regex=True)
+    formato = digitos.str.fullmatch(r'\d+') & digitos.str.len().isin(TAMANHOS_GTIN) & ~ausente
+
+    valido = formato.copy()
+    if formato.any():
+        completos = digitos[formato].str.zfill(14)
+        matriz = (np.frombuffer(''.join(completos).encode('ascii'), dtype=np.uint8)
+                  .reshape(-1, 14).astype(np.int64) - ord('0'))
+        valido[formato] = _digito_confere(matriz)
+
+    ean = pd.to_numeric(digitos.where(valido), errors='coerce').astype('Int64')
+    motivo = pd.Series('', index=serie.index, dtype=object)
+    motivo[~ausente & ~formato] = 'ean_formato'
+    motivo[formato & ~valido] = 'ean_digito_verificador'
+    return ean, motivo
+
+
+def _digito_confere(matriz):
+    # matriz: uma linha de 14 dígitos por GTIN (com zeros à esquerda).
+    # Pesos 3,1,3,1... da esquerda para a direita nos 13 primeiros dígitos
+    pesos = np.where(np.arange(13) % 2 == 0, 3, 1)
+    verificador = (10 - (matriz[:, :13] @ pesos) % 10) % 10
+    return verificador == matriz[:, 13]
+
+
+def _validar_gtin_numerico(serie):
+    # EAN já em inteiro (snapshot): os zeros à esquerda se perderam, então o
+    # formato só exige caber em 14 dígitos; os dígitos saem por divisão
+    presentes = serie.notna().to_numpy()
+    numeros = serie.to_numpy(dtype=np.int64, na_value=0)
+    formato = presentes & (numeros > 0) & (numeros < 10**14)
+    valido = formato.copy()
+    if formato.any():
+        matriz = numeros[formato, None] // 10 ** np.arange(13, -1, -1, dtype=np.int64) % 10
+        valido[formato] = _digito_confere(matriz)
+    ean = serie.astype('Int64').where(valido)
+    motivo = pd.Series('', index=serie.index, dtype=object)
+    motivo[presentes & ~formato] = 'ean_formato'
+    motivo[formato & ~valido] = 'ean_digito_verificador'
+    return ean, motivo
+
+
+def gtin_texto(serie):
+    # GTIN guardado como número -> texto com 13 dígitos (14 no GTIN-14), a
+    # forma lida pelos leitores: UPC-12 012345678905 vira '0012345678905'
+    numero = pd.to_numeric(serie, errors='coerce').astype('Int64')
+    presentes = numero.notna()
+    texto = pd.Series(None, index=serie.index, dtype=object)
+    texto[presentes] = numero[presentes].astype(np.int64).astype(str).str.zfill(13)
+    return texto
+
+
+def normalizar_cmed(df):
+    # Etapa final do CMED sobre a tabela inteira: EAN validado e em int64,
+    # linhas idênticas juntadas e uma linha por EAN (a última da planilha,
+    # com o preço mais recente). Devolve (limpo, rejeitadas), rejeitadas com
+    # a coluna 'motivo'
+    df = df.reset_index(drop=True)
+    ean, motivo = validar_gtin(df['ean'])
+    limpo = df.assign(ean=ean)
+    # Linhas iguais em tudo (inclusive sem EAN) são a mesma apresentação repetida
+    repetida = limpo.duplicated(keep='last') & motivo.eq('')
+    motivo[repetida] = 'linha_repetida'
+    duplicada = ean.notna() & ean.duplicated(keep='last') & motivo.eq('')
+    motivo[duplicada] = 'ean_duplicado'
+
+    rejeitadas = df[motivo.ne('')].assign(motivo=motivo[motivo.ne('')])
+    return limpo[motivo.eq('')].reset_index(drop=True), rejeitadas.reset_index(drop=True)
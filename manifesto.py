@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+# Manifesto das rodadas de atualização (Planilhas_Limpas/manifesto.json).
+#
+# Guarda o hash de conteúdo de cada planilha de entrada e de cada CSV limpo
+# (para o pipeline pular fontes que não mudaram) e, por tabela do Supabase,
+# o hash de cada linha importada indexado pela chave natural (para o
+# importador enviar só o que foi incluído, alterado ou removido).
+
+ARQUIVO_MANIFESTO = "manifesto.json"
+
+
+def hash_arquivo(caminho, tamanho_bloco=1 << 20):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def carregar(pasta):
+    caminho = os.path.join(pasta, ARQUIVO_MANIFESTO)
+    if not os.path.exists(caminho):
+        return {'fontes': {}, 'tabelas': {}}
+    with open(caminho, encoding='utf-8') as f:
+        manifesto = json.load(f)
+    manifesto.setdefault('fontes', {})
+    manifesto.setdefault('tabelas', {})
+    return manifesto
+
+
+def salvar(pasta, manifesto):
+    # Grava num temporário e troca, para não deixar um manifesto pela metade
+    caminho = os.path.join(pasta, ARQUIVO_MANIFESTO)
+    temporario = f"{caminho}.tmp-{os.getpid()}"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+
+def chaves_linhas(df, chave):
+    # Chave natural de cada linha como texto JSON (ex.: '["104658"]'), com
+    # None para valores ausentes; dá para reconstruir os valores no delete
+    partes = [df[c].astype(object).where(df[c].notna(), None) for c in chave]
+    return pd.Series([json.dumps([None if v is None else str(v) for v in valores])
+                      for valores in zip(*partes)], index=df.index)
+
+
+def hashes_linhas(df, chave, colunas=None):
+    # {chave: hash} com o conteúdo das colunas. Linhas com a mesma chave
+    # formam um grupo e o hash do grupo não depende da ordem delas.
+    colunas = list(colunas or df.columns)
+    por_linha = pd.util.hash_pandas_object(df[colunas].astype(str), index=False)
+    grupos = pd.Series(por_linha.to_numpy(), index=chaves_linhas(df, chave).to_numpy())
+    somas = grupos.groupby(level=0, sort=False).sum()
+    return {k: f"{int(v):016x}" for k, v in somas.items()}
+
+
+def diferencas(anteriores, atuais):
+    # Retorna (inseridas, alteradas, removidas) como listas de chaves
+    inseridas = [k for k in atuais if k not in anteriores]
+    alteradas = [k for k, h in atuais.items() if k in anteriores and anteriores[k] != h]
+    removidas = [k for k in anteriores if k not in atuais]
+    return inseridas, alteradas, removidas
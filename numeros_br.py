@@ -0,0 +1,210 @@
+import numpy as np
+import pandas as pd
+
+# Conversão de colunas de preço para número, coluna inteira de uma vez.
+#
+# As planilhas misturam dois formatos: pt-BR ('1.234,56', '27,29*' no CMED)
+# e simples ('0.2034' no SINAPI, ou células já numéricas). O formato é
+# decidido por coluna, olhando uma amostra dos próprios valores, e a
+# conversão devolve quantas células não deram número em vez de engolir o erro.
+#
+# O parse não passa por float() célula a célula: os textos viram uma matriz
+# de códigos Unicode (uma linha por célula) e os dígitos são somados com
+# numpy. A mantissa é inteira e exata, e a divisão final por 10^casas dá o
+# mesmo float que float('0.2034'). O que foge do padrão (notação científica,
+# mais de 15 dígitos) vai pelo float() célula a célula.
+
+BR = 'br'
+SIMPLES = 'simples'
+
+AMOSTRA_DETECCAO = 2000
+# Mantissas de até 15 dígitos são exatas em float64 (10^15 < 2^53)
+MAX_DIGITOS = 15
+
+_ESPACO, _DIGITO, _DECIMAL, _SEPARADOR, _MENOS, _REAL, _CIFRAO, _ASTERISCO, _INVALIDO = range(9)
+
+# Forma aceita: espaços, 'R$' e o sinal só antes do número, o '*' que o CMED
+# põe em alguns preços só depois dele ('R$ -1.234,56*'). Fora dessas
+# posições ('1-2', '5-', '12R', '1$2') a célula é inválida
+_ESPACOS = [0] + [ord(c) for c in ' \xa0']
+_PREFIXO = r'^\s*(-?)\s*(?:R\$)?\s*'
+_SUFIXO = r'\s*\*?\s*$'
+_BR = r'-?\d{1,3}(\.\d{3})+(,\d+)?|-?\d+,\d+'
+_SIMPLES = r'-?\d+\.(\d{1,2}|\d{4,})'
+_MILHAR = r'-?\d{1,3}(\.\d{3})+'
+# Números válidos no caminho lento (depois de tirar prefixo e sufixo): o
+# separador de milhar só em grupos de 3 dígitos antes da vírgula decimal
+_NUMERO_BR = r'-?(\d{1,3}(\.\d{3})+|\d+)(,\d+)?'
+_NUMERO_SIMPLES_MILHAR = r'-?\d{1,3}(,\d{3})+(\.\d+)?'
+
+
+def _limpar_texto(serie):
+    # Tira o prefixo ('R$', espaços; o sinal fica) e o sufixo ('*', espaços)
+    texto = (serie.astype(str).str.replace(_PREFIXO, r'\1', regex=True)
+             .str.replace(_SUFIXO, '', regex=True))
+    return texto.where(serie.notna() & texto.ne(''))
+
+
+def detectar_formato(serie):
+    # Conta os valores que só fazem sentido num dos formatos; '1.234' sozinho
+    # é ambíguo e conta como milhar (pt-BR), como nas planilhas do governo
+    if pd.api.types.is_numeric_dtype(serie):
+        return SIMPLES
+    amostra = serie.dropna().head(AMOSTRA_DETECCAO)
+    texto = _limpar_texto(amostra[[isinstance(v, str) for v in amostra]]).dropna()
+    votos_br = texto.str.fullmatch(_BR).sum()
+    votos_simples = texto.str.fullmatch(_SIMPLES).sum()
+    if votos_br > votos_simples:
+        return BR
+    if votos_simples == 0 and texto.str.fullmatch(_MILHAR).any():
+        return BR
+    return SIMPLES
+
+
+def _tabela_classes(formato):
+    # Classe de cada código Unicode < 256; o resto é inválido
+    decimal, milhar = (',', '.') if formato == BR else ('.', ',')
+    tabela = np.full(256, _INVALIDO, dtype=np.uint8)
+    tabela[_ESPACOS] = _ESPACO
+    tabela[ord('0'):ord('9') + 1] = _DIGITO
+    tabela[ord(decimal)] = _DECIMAL
+    tabela[ord(milhar)] = _SEPARADOR
+    tabela[ord('-')] = _MENOS
+    tabela[ord('R')] = _REAL
+    tabela[ord('$')] = _CIFRAO
+    tabela[ord('*')] = _ASTERISCO
+    return tabela
+
+
+def _parse_matriz(textos, formato):
+    # textos: array de str. Retorna (valores float64, ok bool)
+    n = len(textos)
+    unicode = np.asarray(textos, dtype=str)
+    if n == 0 or unicode.itemsize == 0:
+        return np.full(n, np.nan), np.zeros(n, dtype=bool)
+    # Uma linha por posição de caractere, para percorrer coluna a coluna
+    codigos = np.ascontiguousarray(unicode.view(np.uint32).reshape(n, -1).T)
+    classes = _tabela_classes(formato)[np.minimum(codigos, 255)]
+    classes[codigos > 255] = _INVALIDO
+
+    # Horner: mantissa = mantissa * 10 + dígito; casas = dígitos após a vírgula.
+    # fase: 0 antes do número (espaços, 'R$', sinal), 1 no número, 2 depois
+    # dele (espaços, '*'); o '$' só vale logo depois do 'R'. O separador de
+    # milhar só vale antes da vírgula decimal, o primeiro depois de 1 a 3
+    # dígitos e os seguintes depois de exatamente 3 ('12.34' é inválido)
+    mantissa = np.zeros(n, dtype=np.int64)
+    casas = np.zeros(n, dtype=np.int8)
+    digitos = np.zeros(n, dtype=np.int16)
+    decimais = np.zeros(n, dtype=np.int16)
+    sinais = np.zeros(n, dtype=np.int16)
+    invalido = np.zeros(n, dtype=bool)
+    fase = np.zeros(n, dtype=np.int8)
+    real = np.zeros(n, dtype=bool)
+    grupo = np.zeros(n, dtype=np.int16)   # dígitos desde o último separador de milhar
+    milhares = np.zeros(n, dtype=bool)
+    for codigo, classe in zip(codigos, classes):
+        digito = classe == _DIGITO
+        mantissa *= np.where(digito, 10, 1)
+        mantissa += np.where(digito, codigo - ord('0'), 0)
+        casas += digito & (decimais > 0)
+        digitos += digito
+
+        separador = classe == _SEPARADOR
+        decimal = classe == _DECIMAL
+        invalido |= separador & ((decimais > 0) | np.where(milhares, grupo != 3, (grupo == 0) | (grupo > 3)))
+        invalido |= decimal & milhares & (grupo != 3)
+        grupo = np.where(separador, 0, grupo + digito)
+        milhares |= separador
+        decimais += decimal
+        menos = classe == _MENOS
+        sinais += menos
+
+        numero = digito | (classe == _DECIMAL) | (classe == _SEPARADOR)
+        cifrao = classe == _CIFRAO
+        asterisco = classe == _ASTERISCO
+        invalido |= ((classe == _INVALIDO) | (real != cifrao) | (numero & (fase == 2))
+                     | ((menos | (classe == _REAL)) & (fase != 0)) | (asterisco & (fase == 0)))
+        real = classe == _REAL
+        fase[numero & (fase == 0)] = 1
+        fase[asterisco | ((classe == _ESPACO) & (fase == 1))] = 2
+
+    invalido |= milhares & (decimais == 0) & (grupo != 3)
+    ok = ~invalido & ~real & (decimais <= 1) & (sinais <= 1) & (digitos > 0) & (digitos <= MAX_DIGITOS)
+    valores = mantissa / 10.0 ** np.minimum(casas, MAX_DIGITOS)
+    valores[sinais > 0] *= -1
+    valores[~ok] = np.nan
+    return valores, ok
+
+
+def _float_ou_nan(texto):
+    try:
+        return float(texto)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def converter_serie(serie, formato=None, centavos=False):
+    # Retorna (valores float64 — ou Int64 em centavos —, células inválidas)
+    if formato is None:
+        formato = detectar_formato(serie)
+    if pd.api.types.is_numeric_dtype(serie):
+        valores = serie.astype(np.float64)
+        invalidos = 0
+    else:
+        valores = pd.Series(np.nan, index=serie.index)
+        presentes = serie.notna().to_numpy()
+        brutos = serie.to_numpy(dtype=object)[presentes]
+        # Células que já são número (planilha com tipos misturados) não passam pelo texto
+        if pd.api.types.infer_dtype(brutos, skipna=True) != 'string':
+            numero = np.array([isinstance(v, (int, float)) and not isinstance(v, bool) for v in brutos],
+                              dtype=bool)
+        else:
+            numero = np.zeros(len(brutos), dtype=bool)
+        resultado = np.full(len(brutos), np.nan)
+        resultado[numero] = brutos[numero].astype(np.float64)
+
+        textos = brutos[~numero].astype(str)
+        parse, ok = _parse_matriz(textos, formato)
+        # O que o parse rápido não reconheceu vai pelo caminho lento
+        resto = pd.Series(textos[~ok])
+        resto = _limpar_texto(resto)
+        preenchidos = resto.notna().to_numpy()
+        # Separadores de milhar só saem quando estão nas posições certas;
+        # fora delas a célula fica inválida em vez de virar outro número
+        if formato == BR:
+            resto = (resto.where(resto.str.fullmatch(_NUMERO_BR).fillna(False).astype(bool))
+                     .str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+        else:
+            milhar = resto.str.fullmatch(_NUMERO_SIMPLES_MILHAR).fillna(False).astype(bool)
+            resto = resto.mask(milhar, resto.str.replace(',', '', regex=False))
+        # float() e não pd.to_numeric, que erra o último bit com 17 dígitos
+        lento = np.array([_float_ou_nan(v) for v in resto], dtype=np.float64)
+        parse[~ok] = lento
+        resultado[~numero] = parse
+
+        valores[presentes] = resultado
+        invalidos = int((preenchidos & np.isnan(lento)).sum())
+    if centavos:
+        valores = (valores * 100).round().astype('Int64')
+    return valores, invalidos
+
+
+def converter_colunas(df, colunas, formatos=None, centavos=False):
+    # Converte as colunas no próprio df e devolve {coluna: inválidas}.
+    # formatos (dict) guarda o formato de cada coluna entre chamadas, para
+    # blocos de uma mesma planilha serem lidos do mesmo jeito
+    formatos = {} if formatos is None else formatos
+    invalidos = {}
+    for col in colunas:
+        if col not in df.columns:
+            continue
+        if col not in formatos:
+            formatos[col] = detectar_formato(df[col])
+        df[col], invalidos[col] = converter_serie(df[col], formatos[col], centavos)
+    return invalidos
+
+
+def avisar_invalidos(invalidos, origem):
+    for col, n in invalidos.items():
+        if n:
+            print(f"Aviso: {n} valores não numéricos em {origem}.{col} (gravados como vazio)")
@@ -0,0 +1,311 @@
+import json
+import os
+import shutil
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+# Leitura compartilhada dos CSV de Planilhas_Limpas.
+#
+# Na primeira leitura o CSV é convertido num snapshot colunar tipado
+# (arquivos .npy em Planilhas_Limpas/colunar/<arquivo>/<geracao>/); as
+# leituras seguintes abrem esse snapshot com mmap em vez de reinterpretar o
+# texto. A geração é a assinatura (tamanho + mtime) do CSV, então basta o
+# cleaner regravar o CSV para o snapshot antigo deixar de valer.
+#
+# abrir_planilha abre o mesmo snapshot sem decodificar nada (TabelaMapeada):
+# vários processos lendo o mesmo catálogo dividem as páginas do mmap.
+
+PASTA_PADRAO = r"Planilhas_Limpas"
+PASTA_COLUNAR = "colunar"
+
+# Colunas de baixa cardinalidade guardadas como categoria
+CATEGORICAS = {'classe', 'Classe', 'Grupo', 'unidade'}
+
+UFS = ['AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA',
+       'PB', 'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO']
+
+
+def assinatura_arquivo(caminho):
+    # Tamanho + mtime identificam a geração do CSV sem precisar lê-lo
+    st = os.stat(caminho)
+    return f"{st.st_size:x}-{st.st_mtime_ns:x}"
+
+
+def pasta_geracao(caminho_csv, tipo, nome):
+    # Ex.: Planilhas_Limpas/indices/catser/<geracao>
+    base = os.path.join(os.path.dirname(caminho_csv), tipo, nome)
+    return os.path.join(base, assinatura_arquivo(caminho_csv))
+
+
+def publicar_geracao(pasta, gravar):
+    # Grava numa pasta temporária e renomeia: quem lê nunca vê uma geração
+    # pela metade. gravar(pasta_temporaria) escreve os arquivos.
+    temporaria = f"{pasta}.tmp-{os.getpid()}"
+    shutil.rmtree(temporaria, ignore_errors=True)
+    gravar(temporaria)
+    try:
+        os.rename(temporaria, pasta)
+    except OSError:
+        # Outro processo publicou a mesma geração primeiro
+        shutil.rmtree(temporaria, ignore_errors=True)
+
+    # Gerações antigas não servem mais (processos que ainda as usam mantêm
+    # os arquivos abertos via mmap)
+    base, atual = os.path.split(pasta)
+    for antiga in os.listdir(base):
+        if antiga != atual and '.tmp-' not in antiga:
+            shutil.rmtree(os.path.join(base, antiga), ignore_errors=True)
+
+
+@contextmanager
+def gravacao_atomica(caminho):
+    # Entrega um caminho temporário na mesma pasta do arquivo e, se o bloco
+    # terminar sem erro, troca com os.replace: quem lê (testar_busca,
+    # servico_busca) vê o CSV antigo ou o novo inteiro, nunca um pela metade
+    temporario = f"{caminho}.tmp-{os.getpid()}"
+    try:
+        yield temporario
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+def normalizar_ean(serie):
+    # "7891234567890", 7891234567890.0, "    -     " -> Int64 (NA quando não é número)
+    texto = serie.astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
+    return pd.to_numeric(texto.where(texto.str.fullmatch(r'\d{1,18}'), None),
+                         errors='coerce').astype('Int64')
+
+
+def colunas_uf(df):
+    return [c for c in df.columns if c in UFS and pd.api.types.is_float_dtype(df[c])]
+
+
+def _gravar_texto(pasta, i, serie):
+    nulos = serie.isna().to_numpy()
+    textos = serie.fillna('').astype(str).str.replace('\x00', ' ', regex=False)
+    blob = ('\x00'.join(textos.tolist()) + '\x00').encode('utf-8')
+    np.save(os.path.join(pasta, f"{i}.bytes.npy"), np.frombuffer(blob, dtype=np.uint8))
+    np.save(os.path.join(pasta, f"{i}.nulos.npy"), nulos)
+    # Posição do separador de cada texto, para ler linhas avulsas (TabelaMapeada)
+    np.save(os.path.join(pasta, f"{i}.fins.npy"), np.flatnonzero(np.frombuffer(blob, dtype=np.uint8) == 0))
+
+
+def _ler_texto(pasta, i):
+    blob = np.load(os.path.join(pasta, f"{i}.bytes.npy"), mmap_mode='r')
+    nulos = np.load(os.path.join(pasta, f"{i}.nulos.npy"), mmap_mode='r')
+    valores = np.array(blob.tobytes().decode('utf-8').split('\x00')[:-1], dtype=object)
+    valores[nulos] = np.nan
+    return valores
+
+
+def gravar_snapshot(df, pasta, categoricas=CATEGORICAS):
+    os.makedirs(pasta, exist_ok=True)
+    ufs = colunas_uf(df)
+    colunas = []
+    for i, col in enumerate(df.columns):
+        serie = df[col]
+        if col == 'ean':
+            np.save(os.path.join(pasta, f"{i}.npy"), normalizar_ean(serie).fillna(-1).to_numpy(np.int64))
+            colunas.append({'nome': col, 'tipo': 'ean'})
+        elif isinstance(serie.dtype, pd.api.extensions.ExtensionDtype) and pd.api.types.is_integer_dtype(serie):
+            # Int64 com vazios: valores + máscara dos vazios
+            np.save(os.path.join(pasta, f"{i}.npy"), serie.fillna(0).to_numpy(np.int64))
+            np.save(os.path.join(pasta, f"{i}_vazios.npy"), serie.isna().to_numpy())
+            colunas.append({'nome': col, 'tipo': 'int_vazio'})
+        elif pd.api.types.is_integer_dtype(serie):
+            np.save(os.path.join(pasta, f"{i}.npy"), serie.to_numpy(np.int64))
+            colunas.append({'nome': col, 'tipo': 'int'})
+        elif pd.api.types.is_float_dtype(serie):
+            np.save(os.path.join(pasta, f"{i}.npy"), serie.to_numpy(np.float64))
+            colunas.append({'nome': col, 'tipo': 'float'})
+        elif pd.api.types.is_datetime64_any_dtype(serie):
+            np.save(os.path.join(pasta, f"{i}.npy"), serie.to_numpy('datetime64[D]'))
+            colunas.append({'nome': col, 'tipo': 'data'})
+        elif col in categoricas:
+            cat = pd.Categorical(serie)
+            np.save(os.path.join(pasta, f"{i}.npy"), cat.codes.astype(np.int32))
+            colunas.append({'nome': col, 'tipo': 'categoria', 'categorias': cat.categories.astype(str).tolist()})
+        else:
+            _gravar_texto(pasta, i, serie)
+            colunas.append({'nome': col, 'tipo': 'texto'})
+
+    if ufs:
+        # Matriz contígua (itens x UFs) em float32, usada direto pelas consultas de
+        # preço; as colunas do DataFrame continuam em float64 (0.2034 e não 0.20340000093)
+        np.save(os.path.join(pasta, "precos_uf.npy"), df[ufs].to_numpy(np.float32))
+    with open(os.path.join(pasta, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'linhas': len(df), 'colunas': colunas, 'ufs': ufs}, f, ensure_ascii=False)
+
+
+def ler_snapshot(pasta, colunas=None):
+    # colunas: só essas são lidas do disco (padrão: todas). O mmap é
+    # copy-on-write ('c'): o DataFrame aceita alteração como um lido do CSV
+    # (a página alterada vira cópia do processo, o arquivo não muda)
+    with open(os.path.join(pasta, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    matriz = None
+    if meta['ufs']:
+        matriz = np.load(os.path.join(pasta, "precos_uf.npy"), mmap_mode='c')
+
+    dados = {}
+    for i, col in enumerate(meta['colunas']):
+        nome, tipo = col['nome'], col['tipo']
+        if colunas is not None and nome not in colunas:
+            continue
+        if tipo == 'uf':
+            # Snapshots antigos, sem as colunas de UF em float64
+            dados[nome] = np.asarray(matriz[:, meta['ufs'].index(nome)])
+        elif tipo == 'texto':
+            dados[nome] = _ler_texto(pasta, i)
+        else:
+            valores = np.load(os.path.join(pasta, f"{i}.npy"), mmap_mode='c')
+            if tipo == 'ean':
+                valores = np.asarray(valores)
+                dados[nome] = pd.arrays.IntegerArray(valores, valores < 0)
+            elif tipo == 'int_vazio':
+                vazios = np.load(os.path.join(pasta, f"{i}_vazios.npy"))
+                dados[nome] = pd.arrays.IntegerArray(np.asarray(valores), vazios)
+            elif tipo == 'categoria':
+                dados[nome] = pd.Categorical.from_codes(np.asarray(valores), col['categorias'])
+            else:
+                dados[nome] = valores
+    return pd.DataFrame(dados, copy=False)
+
+
+class TabelaMapeada:
+    # Snapshot aberto só com mmap. Expõe o pedaço da interface do DataFrame
+    # que a busca usa: len(), columns, tabela.iloc[linhas] e
+    # tabela.loc[linhas, colunas] (DataFrame só com essas linhas/colunas; o
+    # índice é a posição no CSV, como no DataFrame do snapshot) e
+    # tabela[coluna] (a coluna inteira, para construir índices)
+    def __init__(self, pasta):
+        with open(os.path.join(pasta, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.columns = [col['nome'] for col in self.meta['colunas']]
+        matriz = None
+        if self.meta['ufs']:
+            matriz = np.load(os.path.join(pasta, "precos_uf.npy"), mmap_mode='r')
+        self._colunas = {}
+        for i, col in enumerate(self.meta['colunas']):
+            tipo = col['tipo']
+            if tipo == 'uf':
+                arrays = (matriz, self.meta['ufs'].index(col['nome']))
+            elif tipo == 'texto':
+                blob = np.load(os.path.join(pasta, f"{i}.bytes.npy"), mmap_mode='r')
+                caminho_fins = os.path.join(pasta, f"{i}.fins.npy")
+                # Snapshots antigos, sem os fins gravados: calcula (uma cópia por processo)
+                fins = (np.load(caminho_fins, mmap_mode='r') if os.path.exists(caminho_fins)
+                        else np.flatnonzero(np.asarray(blob) == 0))
+                arrays = (blob, fins, np.load(os.path.join(pasta, f"{i}.nulos.npy"), mmap_mode='r'))
+            elif tipo == 'int_vazio':
+                arrays = (np.load(os.path.join(pasta, f"{i}.npy"), mmap_mode='r'),
+                          np.load(os.path.join(pasta, f"{i}_vazios.npy"), mmap_mode='r'))
+            else:
+                arrays = (np.load(os.path.join(pasta, f"{i}.npy"), mmap_mode='r'),)
+            self._colunas[col['nome']] = (col, arrays)
+        self.iloc = self.loc = _Linhas(self)
+
+    def __len__(self):
+        return self.meta['linhas']
+
+    def coluna(self, nome, linhas=None):
+        # Valores da coluna nas linhas (padrão: todas), como no ler_snapshot
+        col, arrays = self._colunas[nome]
+        tipo = col['tipo']
+        todas = linhas is None
+        linhas = slice(None) if todas else np.asarray(linhas, dtype=np.int64)
+        if tipo == 'uf':
+            matriz, j = arrays
+            return np.asarray(matriz[linhas, j])
+        if tipo == 'texto':
+            blob, fins, nulos = arrays
+            if todas:
+                valores = np.array(blob.tobytes().decode('utf-8').split('\x00')[:-1], dtype=object)
+            else:
+                inicios = np.where(linhas > 0, np.asarray(fins)[np.maximum(linhas - 1, 0)] + 1, 0)
+                valores = np.array([bytes(blob[a:b]).decode('utf-8')
+                                    for a, b in zip(inicios.tolist(), np.asarray(fins)[linhas].tolist())],
+                                   dtype=object)
+            valores[np.asarray(nulos[linhas], dtype=bool)] = np.nan
+            return valores
+        valores = np.asarray(arrays[0][linhas])
+        if tipo == 'ean':
+            return pd.arrays.IntegerArray(valores, valores < 0)
+        if tipo == 'int_vazio':
+            return pd.arrays.IntegerArray(valores, np.asarray(arrays[1][linhas], dtype=bool))
+        if tipo == 'categoria':
+            return pd.Categorical.from_codes(valores, col['categorias'])
+        return valores
+
+    def linhas(self, linhas, colunas=None):
+        linhas = np.asarray(linhas, dtype=np.int64)
+        return pd.DataFrame({nome: self.coluna(nome, linhas) for nome in (colunas or self.columns)},
+                            index=pd.Index(linhas), copy=False)
+
+    def __getitem__(self, nome):
+        return pd.Series(self.coluna(nome), name=nome)
+
+
+class _Linhas:
+    # tabela.iloc[linhas] / tabela.loc[linhas, colunas], como no DataFrame
+    def __init__(self, tabela):
+        self.tabela = tabela
+
+    def __getitem__(self, chave):
+        linhas, colunas = chave if isinstance(chave, tuple) else (chave, None)
+        return self.tabela.linhas(linhas, colunas)
+
+
+def _snapshot_atual(arquivo, pasta):
+    # Pasta do snapshot da geração atual do CSV, gravando-o se preciso
+    # (None quando não dá para gravar)
+    caminho = arquivo if os.path.dirname(arquivo) else os.path.join(pasta, arquivo)
+    nome = os.path.splitext(os.path.basename(caminho))[0]
+    destino = pasta_geracao(caminho, PASTA_COLUNAR, nome)
+
+    if os.path.exists(os.path.join(destino, 'meta.json')):
+        return destino, None
+
+    df = pd.read_csv(caminho)
+    try:
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        publicar_geracao(destino, lambda tmp: gravar_snapshot(df, tmp))
+    except OSError as e:
+        # Sem permissão de escrita o CSV continua servindo
+        print(f"Aviso: não foi possível gravar o snapshot de {nome}: {e}")
+        return None, df
+    return destino, None
+
+
+def ler_planilha(arquivo, pasta=PASTA_PADRAO):
+    # Lê um CSV limpo (ex.: "sinapi_limpo.csv") pelo snapshot colunar quando
+    # ele é da mesma geração do CSV; senão lê o CSV e grava o snapshot.
+    destino, df = _snapshot_atual(arquivo, pasta)
+    return df if destino is None else ler_snapshot(destino)
+
+
+def abrir_planilha(arquivo, pasta=PASTA_PADRAO):
+    # Como ler_planilha, mas devolve a TabelaMapeada do snapshot (ou o
+    # DataFrame do CSV, se o snapshot não pôde ser gravado)
+    destino, df = _snapshot_atual(arquivo, pasta)
+    return df if destino is None else TabelaMapeada(destino)
+
+
+def ler_matriz_uf(arquivo, pasta=PASTA_PADRAO):
+    # Códigos, UFs e a matriz float32 (itens x UFs) mapeada em memória
+    caminho = arquivo if os.path.dirname(arquivo) else os.path.join(pasta, arquivo)
+    nome = os.path.splitext(os.path.basename(caminho))[0]
+    destino = pasta_geracao(caminho, PASTA_COLUNAR, nome)
+    if not os.path.exists(os.path.join(destino, 'meta.json')):
+        ler_planilha(caminho)
+
+    with open(os.path.join(destino, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    i = [c['nome'] for c in meta['colunas']].index('codigo')
+    codigos = np.load(os.path.join(destino, f"{i}.npy"), mmap_mode='r')
+    matriz = np.load(os.path.join(destino, "precos_uf.npy"), mmap_mode='r')
+    return codigos, meta['ufs'], matriz
@@ -0,0 +1,226 @@
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from indice_busca import normalizar_serie
+from indice_palavras import tokenizar
+from numeros_br import converter_serie
+from planilhas_limpas import UFS
+from testar_busca import CATALOGOS, carregar_dados, pesquisar
+
+# Precificação em lote: lê uma planilha de cotação (CSV/XLSX, uma linha por
+# item) e grava uma cópia com o melhor item de cada catálogo e os preços de
+# referência ao lado de cada linha.
+#
+# Os termos são normalizados (sem acentos, minúsculos, espaços simples) e
+# deduplicados antes da busca, e cada termo distinto é pesquisado uma vez
+# nos índices dos três catálogos por um pool de threads. Por padrão a busca
+# é a aproximada (palavra a palavra, tolerante a erros), que é a que
+# funciona com descrições de cotação ("Caneta Esferográfica Azul"); com
+# --exata o termo inteiro precisa aparecer no texto e a ordem é por BM25.
+#
+# As notas de catálogos diferentes são comparadas para escolher o melhor:
+# a aproximada já vai de 0 a 1, e o BM25 da exata é dividido pelo máximo
+# que o termo alcança em cada catálogo. Empates vão para os catálogos com
+# preço (SINAPI, CMED) antes do CATSER.
+#
+# Na aproximada, artigos e preposições ("de", "com") e palavras de menos de
+# 3 letras sem dígito ficam fora do termo: a nota é a média entre as
+# palavras, e "Grampeador de Mesa" casava com "MESA VIBROACABADORA" só pelo
+# "de" e pela "mesa". O preço de referência só é preenchido quando a nota do
+# melhor catálogo chega a NOTA_ACEITE; abaixo disso o item casado aparece,
+# mas a linha fica como 'baixa confiança' e sem preço.
+#
+# Uso: python precificar_planilha.py Planilha_Teste_MediaFacil.xlsx --uf SP
+
+# Nomes de coluna reconhecidos (já normalizados), na ordem de preferência
+COLUNAS_TERMO = ['item', 'descricao', 'produto', 'especificacao', 'objeto']
+COLUNAS_QUANTIDADE = ['quantidade', 'qtd', 'qtde', 'quant']
+COLUNAS_UF = ['uf', 'estado']
+
+_ESPACOS = re.compile(r'\s+')
+
+# Palavras (já normalizadas) que não contam na nota da busca aproximada
+PALAVRAS_VAZIAS = {'a', 'o', 'as', 'os', 'um', 'uma', 'uns', 'umas', 'de', 'da', 'do', 'das', 'dos', 'e', 'ou',
+                   'em', 'na', 'no', 'nas', 'nos', 'com', 'sem', 'para', 'pra', 'por', 'pelo', 'pela', 'pelos',
+                   'pelas', 'ao', 'aos', 'tipo', 'cada'}
+TAMANHO_MINIMO = 3
+NOTA_ACEITE = 0.75  # aproximada: ao menos 3/4 das palavras do termo no item
+
+CONFIANCA_ALTA = 'alta'
+CONFIANCA_BAIXA = 'baixa confiança'
+SEM_CORRESPONDENCIA = 'sem correspondência'
+
+
+def ler_entrada(caminho):
+    if caminho.lower().endswith(('.xlsx', '.xlsm', '.xls')):
+        return pd.read_excel(caminho)
+    try:
+        return pd.read_csv(caminho, sep=None, engine='python', encoding='utf-8-sig')
+    except UnicodeDecodeError:
+        return pd.read_csv(caminho, sep=None, engine='python', encoding='latin-1')
+
+
+def achar_coluna(df, candidatas, pedida=None):
+    # Coluna pedida pelo usuário ou a primeira cujo nome normalizado é uma das candidatas
+    if pedida:
+        if pedida not in df.columns:
+            raise SystemExit(f"Erro: a planilha não tem a coluna '{pedida}'. Colunas: {list(df.columns)}")
+        return pedida
+    nomes = dict(zip(normalizar_serie(pd.Series(df.columns.astype(str))).str.strip(), df.columns))
+    return next((nomes[c] for c in candidatas if c in nomes), None)
+
+
+def normalizar_termos(serie):
+    return normalizar_serie(serie).str.replace(_ESPACOS.pattern, ' ', regex=True).str.strip()
+
+
+def termo_busca(termo):
+    # O termo sem as palavras que não distinguem um item. Palavras curtas só
+    # ficam se não sobrar outra; só palavras vazias ("de") dão termo vazio
+    palavras = [p for p in tokenizar(termo) if p not in PALAVRAS_VAZIAS]
+    longas = [p for p in palavras if len(p) >= TAMANHO_MINIMO or any(c.isdigit() for c in p)]
+    return ' '.join(longas or palavras)
+
+
+def casar_termos(termos, dados, aproximada=True, workers=8):
+    # {catálogo: (linha, nota)} por termo distinto; linha -1 quando nada casou
+    def casar(termo):
+        melhores = {}
+        if aproximada:
+            termo = termo_busca(termo)
+        for nome in CATALOGOS:
+            linhas, _, notas = pesquisar(nome, termo, dados, aproximada, 0, 1) if termo else ([], 0, [])
+            if not len(linhas):
+                melhores[nome] = (-1, np.nan)
+                continue
+            nota = float(notas[0])
+            if not aproximada:
+                maxima = dados['RANQUEADA'][nome].nota_maxima(termo)
+                nota = nota / maxima if maxima > 0 else 0.0
+            melhores[nome] = (int(linhas[0]), nota)
+        return melhores
+
+    if aproximada:
+        # Estruturas preguiçosas montadas antes de o pool começar
+        for busca in dados['APROXIMADA'].values():
+            busca.trigramas()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(termos, pool.map(casar, termos)))
+
+
+def colunas_catalogo(nome, df, linhas):
+    # Colunas de saída do catálogo para as linhas casadas (-1 = vazio)
+    achou = linhas >= 0
+    tabela = df.iloc[np.where(achou, linhas, 0)].reset_index(drop=True)
+    if nome == 'CMED':
+        saida = {'cmed_produto': tabela['produto'], 'cmed_substancia': tabela['substancia'],
+                 'cmed_ean': tabela['ean'], 'cmed_pmvg': converter_serie(tabela['pmvg'])[0]}
+    elif nome == 'SINAPI':
+        saida = {'sinapi_codigo': tabela['codigo'], 'sinapi_descricao': tabela['descricao'],
+                 'sinapi_unidade': tabela['unidade']}
+    else:
+        saida = {'catser_codigo': tabela['codigo'], 'catser_descricao': tabela['descricao']}
+    saida = pd.DataFrame(saida)
+    for col in saida.columns:
+        if pd.api.types.is_integer_dtype(saida[col]):
+            saida[col] = saida[col].astype('Int64')  # código sem ".0" quando há vazios
+        saida[col] = saida[col].where(achou)
+    return saida
+
+
+def precificar(df, coluna, dados, uf=None, coluna_qtd=None, coluna_uf=None, aproximada=True, workers=8):
+    termos = normalizar_termos(df[coluna])
+    unicos = [t for t in termos.unique() if t]
+    print(f"{len(df)} linhas, {len(unicos)} termos distintos.")
+    inicio = time.perf_counter()
+    casados = casar_termos(unicos, dados, aproximada, workers)
+    print(f"Busca concluída em {time.perf_counter() - inicio:.2f}s.")
+
+    vazio = {nome: (-1, np.nan) for nome in CATALOGOS}
+    por_linha = [casados.get(t, vazio) for t in termos]
+    saida = df.reset_index(drop=True).copy()
+    notas = {}
+    for nome in CATALOGOS:
+        linhas = np.array([c[nome][0] for c in por_linha], dtype=np.int64)
+        notas[nome] = np.array([c[nome][1] for c in por_linha], dtype=np.float64)
+        for col, valores in colunas_catalogo(nome, dados[nome], linhas).items():
+            saida[col] = valores
+        if nome == 'SINAPI':
+            # Preço na UF da linha (coluna UF da planilha) ou na UF padrão
+            precos = dados['SINAPI_PRECOS']
+            ufs = pd.Series(uf or precos.ufs[0], index=saida.index)
+            if coluna_uf:
+                da_linha = saida[coluna_uf].astype(str).str.strip().str.upper()
+                ufs = da_linha.where(da_linha.isin(precos.ufs), ufs)
+            saida['sinapi_uf'] = ufs
+            saida['sinapi_preco'] = np.nan
+            for u, grupo in saida[linhas >= 0].groupby('sinapi_uf'):
+                valores = precos.precos(grupo['sinapi_codigo'], u)
+                # Pelo texto do float32, para sair 0.2034 e não 0.20340000093
+                saida.loc[grupo.index, 'sinapi_preco'] = valores.astype(np.float32).astype(str).astype(np.float64)
+        saida[f"{nome.lower()}_nota"] = notas[nome].round(3)
+
+    # Melhor catálogo da linha e o preço de referência dele (CATSER não tem
+    # preço). Os com preço vêm primeiro: argmax fica com o primeiro empatado
+    nomes = [nome for nome in CATALOGOS if nome != 'CATSER'] + ['CATSER']
+    matriz = np.column_stack([notas[nome] for nome in nomes])
+    melhor = np.where(np.isnan(matriz).all(axis=1), -1, np.argmax(np.nan_to_num(matriz, nan=-1), axis=1))
+    saida['melhor_catalogo'] = np.array(nomes + [''], dtype=object)[melhor]
+    # Na exata o termo inteiro está no item, então qualquer resultado vale
+    nota_melhor = np.where(melhor >= 0, matriz[np.arange(len(matriz)), np.maximum(melhor, 0)], np.nan)
+    aceita = (melhor >= 0) & ((nota_melhor >= NOTA_ACEITE - 1e-6) if aproximada else True)
+    saida['confianca'] = np.select([aceita, melhor >= 0], [CONFIANCA_ALTA, CONFIANCA_BAIXA], SEM_CORRESPONDENCIA)
+    saida['preco_referencia'] = np.select(
+        [aceita & (saida['melhor_catalogo'] == 'SINAPI'), aceita & (saida['melhor_catalogo'] == 'CMED')],
+        [saida['sinapi_preco'], saida['cmed_pmvg']], np.nan)
+    if coluna_qtd:
+        quantidade = pd.to_numeric(converter_serie(saida[coluna_qtd])[0], errors='coerce')
+        saida['valor_total'] = (quantidade * saida['preco_referencia']).round(2)
+    return saida
+
+
+def gravar_saida(df, caminho):
+    if caminho.lower().endswith('.xlsx'):
+        df.to_excel(caminho, index=False)
+    else:
+        df.to_csv(caminho, index=False, encoding='utf-8-sig')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Casa cada item de uma planilha de cotação com CATSER/SINAPI/CMED")
+    parser.add_argument('entrada', help="planilha de itens (.csv ou .xlsx)")
+    parser.add_argument('-o', '--saida', help="arquivo de saída (padrão: <entrada>_precificada.csv)")
+    parser.add_argument('--coluna', help="coluna com o termo de busca (padrão: Item/Descrição/Produto)")
+    parser.add_argument('--coluna-quantidade', help="coluna de quantidade (padrão: Quantidade/Qtd)")
+    parser.add_argument('--coluna-uf', help="coluna com a UF de cada linha (padrão: UF/Estado)")
+    parser.add_argument('--uf', type=str.upper, choices=UFS, help="UF dos preços do SINAPI (padrão: AC)")
+    parser.add_argument('--exata', action='store_true', help="exige o termo inteiro no texto (ordem por BM25)")
+    parser.add_argument('--workers', type=int, default=8, help="threads de busca (padrão: 8)")
+    args = parser.parse_args()
+
+    df = ler_entrada(args.entrada)
+    coluna = achar_coluna(df, COLUNAS_TERMO, args.coluna)
+    if coluna is None:
+        raise SystemExit(f"Erro: não achei a coluna dos itens, use --coluna. Colunas: {list(df.columns)}")
+    coluna_qtd = achar_coluna(df, COLUNAS_QUANTIDADE, args.coluna_quantidade)
+    coluna_uf = achar_coluna(df, COLUNAS_UF, args.coluna_uf)
+
+    dados = carregar_dados()
+    if dados is None:
+        raise SystemExit(1)
+
+    print(f"\nPrecificando '{coluna}'" + (f" (quantidade em '{coluna_qtd}')" if coluna_qtd else "") + "...")
+    saida = precificar(df, coluna, dados, args.uf, coluna_qtd, coluna_uf, not args.exata, args.workers)
+
+    destino = args.saida or f"{os.path.splitext(args.entrada)[0]}_precificada.csv"
+    gravar_saida(saida, destino)
+    casadas = (saida['confianca'] == CONFIANCA_ALTA).sum()
+    baixas = (saida['confianca'] == CONFIANCA_BAIXA).sum()
+    print(f"\n{casadas}/{len(saida)} linhas com item de referência ({baixas} de baixa confiança, sem preço)."
+          f" Resultado em {destino}")
@@ -1,50 +1,80 @@
 import pandas as pd
+import argparse
 import os
-import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
 
-base_path = r"c:\Users\freir\OneDrive\Área de Trabalho\Sistemas 2026\Média Fácil"
+import manifesto
+from instrumentacao import etapa
+from leitor_xlsx import iterar_linhas, localizar_cabecalho, em_blocos, gravar_blocos
+from limpeza import limpar_catser, normalizar_cmed
+from numeros_br import avisar_invalidos, converter_colunas
+from planilhas_limpas import gravacao_atomica
+
+# Pipeline de limpeza das planilhas de referência.
+#
+#   python process_planilhas.py --sources catser,sinapi,cmed --workers 3
+#
+# Cada fonte é limpa num processo separado (são independentes entre si e o
+# parse de XLSX é CPU-bound). Para adicionar uma fonte nova (SETOP, SIMPRO,
+# SIGTAP...) basta escrever clean_<fonte>(input_dir, output_dir) devolvendo
+# o número de linhas gravadas e registrá-la em FONTES e ARQUIVOS.
+#
+# Fontes cuja planilha e CSV limpo não mudaram desde a última rodada (hash
+# de conteúdo no manifesto.json da pasta de saída) são puladas; use --force
+# para refazer tudo.
+#
+# Os CSV limpos são gravados num temporário da mesma pasta e trocados com
+# os.replace (planilhas_limpas.gravacao_atomica): a busca aberta nunca
+# indexa um CSV pela metade.
+
+base_path = os.path.dirname(os.path.abspath(__file__))
 input_dir = os.path.join(base_path, "Planilhas_Itens")
 output_dir = os.path.join(base_path, "Planilhas_Limpas")
 
-if not os.path.exists(output_dir):
-    os.makedirs(output_dir)
+# Fonte -> (planilha de entrada, CSV limpo)
+ARQUIVOS = {
+    'catser': ("Lista CATSER.xlsx", "catser_limpo.csv"),
+    'sinapi': ("SINAPI_mao_de_obra_2025_12.xlsx", "sinapi_limpo.csv"),
+    'cmed': ("Média Facil - CMED.xlsx", "cmed_limpo.csv"),
+}
+
+# Linhas do CMED descartadas na normalização (EAN inválido, repetidas), com o motivo
+ARQUIVO_REJEITADAS_CMED = "cmed_rejeitadas.csv"
 
-def clean_catser():
+def clean_catser(input_dir, output_dir, streaming=True):
     print("Processando CATSER...")
-    path = os.path.join(input_dir, "Lista CATSER.xlsx")
-    # Pelo debug, cabeçalho está na linha 2
-    df = pd.read_excel(path, skiprows=2)
-    
-    # Renomear colunas
-    # A coluna 'Codigo                Descrição' parece estar junta em alguns casos ou mal formatada
-    # Vamos tentar identificar as colunas por posição se os nomes falharem
-    df.columns = ['grupo', 'classe', 'codigo_descricao', 'extra']
-    
-    # Separar codigo e descrição se estiverem na mesma coluna
-    # Ex: '15377                   INFRA-ESTRUTURA AEROPURTARIA'
-    def split_code(val):
-        if pd.isna(val): return None, None
-        match = re.match(r'(\d+)\s+(.*)', str(val))
-        if match:
-            return match.group(1), match.group(2).strip()
-        return None, str(val).strip()
-
-    df[['codigo', 'descricao']] = df['codigo_descricao'].apply(lambda x: pd.Series(split_code(x)))
-    
-    df_final = df[['grupo', 'classe', 'codigo', 'descricao']].dropna(subset=['codigo'])
-    df_final.to_csv(os.path.join(output_dir, "catser_limpo.csv"), index=False, encoding='utf-8-sig')
+    entrada, saida = ARQUIVOS['catser']
+    with etapa('limpeza.ler_planilha', fonte='catser') as e:
+        df_raw = pd.read_excel(os.path.join(input_dir, entrada), header=None)
+        e.definir(linhas=len(df_raw))
+    # Limpeza vetorizada (mesma regra código/descrição para os dois scripts)
+    with etapa('limpeza.limpar', fonte='catser', linhas=len(df_raw)):
+        df_final = limpar_catser(df_raw)
+    with etapa('limpeza.gravar_csv', fonte='catser', linhas=len(df_final)), \
+            gravacao_atomica(os.path.join(output_dir, saida)) as temporario:
+        df_final.to_csv(temporario, index=False, encoding='utf-8-sig')
     print(f"CATSER concluído: {len(df_final)} itens.")
+    return len(df_final)
 
-def clean_sinapi():
+def clean_sinapi(input_dir, output_dir, streaming=True):
     print("Processando SINAPI...")
-    path = os.path.join(input_dir, "SINAPI_mao_de_obra_2025_12.xlsx")
+    entrada, saida = ARQUIVOS['sinapi']
+    path = os.path.join(input_dir, entrada)
+    if streaming:
+        return clean_sinapi_streaming(path, os.path.join(output_dir, saida))
+
     # SINAPI costuma ter cabeçalho na linha 5
-    df = pd.read_excel(path, skiprows=5)
-    
+    with etapa('limpeza.ler_planilha', fonte='sinapi') as e:
+        df = pd.read_excel(path, skiprows=5)
+        e.definir(linhas=len(df))
+
     # Identificar colunas baseadas no padrão SINAPI
     # [DESCRICAO DA CLASSE, CODIGO, DESCRICAO, UNIDADE, PRECO_UF1, PRECO_UF2...]
     # Como o arquivo é "mão de obra", focar no código e descrição
-    
+
     # Vou renomear as primeiras colunas conhecidas
     new_cols = list(df.columns)
     new_cols[0] = 'classe'
@@ -52,75 +82,284 @@ def clean_sinapi():
     new_cols[2] = 'descricao'
     new_cols[3] = 'unidade'
     df.columns = new_cols
-    
+
     # Manter apenas essenciais + preços se existirem
     cols_to_keep = ['classe', 'codigo', 'descricao', 'unidade']
     # Adiciona colunas numéricas de preço (que costumam ser as UFs)
     for col in df.columns[4:]:
         if df[col].dtype in ['float64', 'int64']:
             cols_to_keep.append(col)
-            
+
     df_final = df[cols_to_keep].dropna(subset=['codigo'])
-    df_final.to_csv(os.path.join(output_dir, "sinapi_limpo.csv"), index=False, encoding='utf-8-sig')
+    with etapa('limpeza.gravar_csv', fonte='sinapi', linhas=len(df_final)), \
+            gravacao_atomica(os.path.join(output_dir, saida)) as temporario:
+        df_final.to_csv(temporario, index=False, encoding='utf-8-sig')
     print(f"SINAPI concluído: {len(df_final)} itens.")
+    return len(df_final)
+
+def clean_sinapi_streaming(path, caminho_saida):
+    # Mesmo resultado do modo pandas, lendo a planilha linha a linha
+    linhas = iterar_linhas(path)
+    with etapa('limpeza.localizar_cabecalho', fonte='sinapi'):
+        _, colunas, linhas = localizar_cabecalho(linhas, lambda t: 'DESCRI' in t and 'UNIDADE' in t)
+    if len(colunas) < 4:
+        raise ValueError("Cabeçalho do SINAPI não encontrado.")
 
-def clean_cmed():
+    posicoes = {'classe': 0, 'codigo': 1, 'descricao': 2, 'unidade': 3}
+    for i, c in enumerate(colunas[4:], start=4):
+        posicoes[c] = i
+    blocos = em_blocos(linhas, posicoes)
+
+    def limpar():
+        precos = None
+        formatos = {}
+        for bloco in blocos:
+            bloco = bloco.dropna(subset=['codigo']).infer_objects()
+            if precos is None:
+                # Colunas de preço (UFs) são as numéricas, decidido pelo primeiro bloco
+                precos = [c for c in bloco.columns[4:] if bloco[c].dtype in ['float64', 'int64']]
+            avisar_invalidos(converter_colunas(bloco, precos, formatos), 'SINAPI')
+            yield bloco[['classe', 'codigo', 'descricao', 'unidade'] + precos]
+
+    # Leitura, limpeza e gravação andam juntas, bloco a bloco
+    with etapa('limpeza.ler_limpar_gravar', fonte='sinapi') as e:
+        total = gravar_blocos(limpar(), caminho_saida, ['classe', 'codigo', 'descricao', 'unidade'])
+        e.definir(linhas=total)
+    print(f"SINAPI concluído: {total} itens.")
+    return total
+
+def mapear_colunas_cmed(colunas):
+    # Mapeamento flexível
+    mapping = {}
+    for c in colunas:
+        cu = str(c).upper()
+        if 'SUBST' in cu: mapping['substancia'] = c
+        # 'TIPO DE PRODUTO (STATUS DO PRODUTO)' é a categoria (Novo, Genérico...), não o nome
+        elif 'PRODUTO' in cu and 'TIPO' not in cu: mapping['produto'] = c
+        elif 'EAN' in cu: mapping['ean'] = c
+        elif 'FÁBRICA' in cu or ' PF ' in cu or cu.endswith(' PF'): mapping['pf'] = c
+        elif 'PMVG' in cu: mapping['pmvg'] = c
+    return mapping
+
+def limpar_bloco_cmed(df_final, formatos=None):
+    df_final = df_final.dropna(subset=['ean'])
+    # Limpar EAN para ser apenas números
+    df_final['ean'] = df_final['ean'].astype(str).str.replace(r'\.0$', '', regex=True)
+    # Preços vêm em pt-BR, às vezes com '*' no fim ('27,29*')
+    avisar_invalidos(converter_colunas(df_final, ['pf', 'pmvg'], formatos), 'CMED')
+    return df_final
+
+def clean_cmed(input_dir, output_dir, streaming=True):
     print("Processando CMED...")
-    path = os.path.join(input_dir, "Média Facil - CMED.xlsx")
-    # CMED é o mais complexo, vamos ler e tentar localizar 'SUBSTÂNCIA' ou 'PRODUTO'
-    # No debug, parecia estar muito bagunçado. Vou ler tudo e filtrar linhas que tem EAN
-    df = pd.read_excel(path, header=None)
-    
-    # Heurística: Procurar a linha que contém os nomes das colunas
-    header_row = 0
-    for i, row in df.iterrows():
-        row_str = " ".join(str(x) for x in row.values)
-        if 'SUBSTÂNCIA' in row_str.upper() and 'PRODUTO' in row_str.upper():
-            header_row = i
-            break
-            
-    df = pd.read_excel(path, skiprows=header_row)
-    
-    # Limpar nomes de colunas (remover quebras de linha e espaços extras)
-    df.columns = [str(c).replace('\n', ' ').strip() for c in df.columns]
-    
-    # Colunas de interesse CMED padrão:
-    # SUBSTÂNCIA, PRODUTO, APRESENTAÇÃO, EAN 1, PREÇO FÁBRICA, PMVG
-    # Vou usar o que encontrar de similar
-    cols = df.columns
-    mapped = {}
-    for c in cols:
-        cu = c.upper()
-        if 'SUBSTAN' in cu: mapped['substancia'] = c
-        elif 'PRODUTO' in cu: mapped['produto'] = c
-        elif 'APRESENTA' in cu: mapped['apresentacao'] = c
-        elif 'EAN' in cu: mapped['ean'] = c
-        elif 'FÁBRICA' in cu or 'PF' in cu: mapped['preco_fabrica'] = c
-        elif 'PMVG' in cu: mapped['pmvg'] = c
-
-    if mapped:
-        df_final = df[list(mapped.values())].copy()
-        df_final.columns = list(mapped.keys())
-        # Remover lixo (linhas que não são medicamentos)
-        df_final = df_final.dropna(subset=['ean', 'produto'])
-        df_final.to_csv(os.path.join(output_dir, "cmed_limpo.csv"), index=False, encoding='utf-8-sig')
-        print(f"CMED concluído: {len(df_final)} itens.")
+    entrada, saida = ARQUIVOS['cmed']
+    path = os.path.join(input_dir, entrada)
+    if streaming:
+        return clean_cmed_streaming(path, os.path.join(output_dir, saida))
+
+    # CMED é gigante e bagunçado. Vamos ler sem cabeçalho e procurar a linha com dados
+    # Média Facil - CMED.xlsx parece ter o cabeçalho espalhado
+    with etapa('limpeza.localizar_cabecalho', fonte='cmed'):
+        df_raw = pd.read_excel(path, header=None, nrows=100)
+
+        target_row = -1
+        for i, row in df_raw.iterrows():
+            row_str = " ".join(str(x).upper() for x in row.values)
+            if 'EAN' in row_str and ('PRODUTO' in row_str or 'SUBST' in row_str):
+                target_row = i
+                break
+
+    if target_row == -1:
+        # Se não achou, pode ser que o arquivo CMED do usuário tenha outro nome ou formato
+        # Vamos tentar ler a partir da linha 0 e ver o que tem
+        print("Aviso: Cabeçalho EAN não encontrado nas primeiras 100 linhas. Tentando modo heurístico.")
+    with etapa('limpeza.ler_planilha', fonte='cmed') as e:
+        df = pd.read_excel(path) if target_row == -1 else pd.read_excel(path, skiprows=target_row)
+        e.definir(linhas=len(df))
+
+    print(f"Colunas lidas CMED: {df.columns.tolist()[:10]}...")
+
+    with etapa('limpeza.mapear_colunas', fonte='cmed'):
+        mapping = mapear_colunas_cmed(df.columns)
+
+    if 'ean' not in mapping:
+        raise ValueError("Não consegui identificar a coluna EAN no CMED.")
+    with etapa('limpeza.limpar', fonte='cmed', linhas=len(df)):
+        df_final = df[list(mapping.values())].copy()
+        df_final.columns = list(mapping.keys())
+        df_final = limpar_bloco_cmed(df_final)
+    caminho_saida = os.path.join(output_dir, saida)
+    with etapa('limpeza.gravar_csv', fonte='cmed', linhas=len(df_final)), \
+            _intermediario_cmed(caminho_saida) as intermediario:
+        df_final.to_csv(intermediario, index=False, encoding='utf-8-sig')
+        total = finalizar_cmed(intermediario, caminho_saida)
+    print(f"CMED concluído: {total} itens.")
+    return total
+
+@contextmanager
+def _intermediario_cmed(caminho_saida):
+    # CSV com as linhas antes da normalização, na mesma pasta; some no fim
+    intermediario = f"{caminho_saida}.blocos-{os.getpid()}"
+    try:
+        yield intermediario
+    finally:
+        if os.path.exists(intermediario):
+            os.remove(intermediario)
+
+def finalizar_cmed(caminho_blocos, caminho_saida):
+    # Normalização sobre o CSV inteiro (uma linha por EAN não cabe nos blocos
+    # do streaming): lê as linhas de caminho_blocos e publica o CSV limpo e
+    # as rejeitadas ao lado dele
+    with etapa('limpeza.normalizar_cmed', fonte='cmed') as e:
+        df = pd.read_csv(caminho_blocos, dtype={'ean': str}, encoding='utf-8-sig')
+        limpo, rejeitadas = normalizar_cmed(df)
+        with gravacao_atomica(caminho_saida) as temporario:
+            limpo.to_csv(temporario, index=False, encoding='utf-8-sig')
+        caminho_rejeitadas = os.path.join(os.path.dirname(caminho_saida), ARQUIVO_REJEITADAS_CMED)
+        with gravacao_atomica(caminho_rejeitadas) as temporario:
+            rejeitadas.to_csv(temporario, index=False, encoding='utf-8-sig')
+        e.definir(linhas=len(df), rejeitadas=len(rejeitadas))
+    if len(rejeitadas):
+        motivos = ", ".join(f"{n} {m}" for m, n in rejeitadas['motivo'].value_counts().items())
+        print(f"CMED: {len(rejeitadas)} linhas rejeitadas ({motivos}), em {caminho_rejeitadas}")
+    return len(limpo)
+
+def clean_cmed_streaming(path, caminho_saida):
+    # Uma única passada pela planilha: cabeçalho nas primeiras 100 linhas e
+    # o restante limpo em blocos de tamanho fixo
+    linhas = iterar_linhas(path)
+    with etapa('limpeza.localizar_cabecalho', fonte='cmed'):
+        target_row, colunas, linhas = localizar_cabecalho(
+            linhas, lambda t: 'EAN' in t and ('PRODUTO' in t or 'SUBST' in t))
+    if target_row is None:
+        print("Aviso: Cabeçalho EAN não encontrado nas primeiras 100 linhas. Tentando modo heurístico.")
+
+    print(f"Colunas lidas CMED: {colunas[:10]}...")
+    with etapa('limpeza.mapear_colunas', fonte='cmed'):
+        mapping = mapear_colunas_cmed(colunas)
+
+    if 'ean' not in mapping:
+        raise ValueError("Não consegui identificar a coluna EAN no CMED.")
+    blocos = em_blocos(linhas, {k: colunas.index(c) for k, c in mapping.items()})
+    formatos = {}
+    limpos = (limpar_bloco_cmed(b.infer_objects(), formatos) for b in blocos)
+    # O CSV limpo só é publicado depois da normalização, de uma vez
+    with _intermediario_cmed(caminho_saida) as intermediario:
+        with etapa('limpeza.ler_limpar_gravar', fonte='cmed') as e:
+            e.definir(linhas=gravar_blocos(limpos, intermediario, list(mapping)))
+        total = finalizar_cmed(intermediario, caminho_saida)
+    print(f"CMED concluído: {total} itens.")
+    return total
+
+# Fontes disponíveis no pipeline (nome -> função de limpeza)
+FONTES = {
+    'catser': clean_catser,
+    'sinapi': clean_sinapi,
+    'cmed': clean_cmed,
+}
+
+def executar_fonte(nome, input_dir, output_dir, streaming=True):
+    # Roda dentro do processo do pool; devolve (linhas, segundos)
+    inicio = time.perf_counter()
+    with etapa('limpeza.fonte', fonte=nome, streaming=streaming) as e:
+        linhas = FONTES[nome](input_dir, output_dir, streaming=streaming)
+        e.definir(linhas=linhas)
+    return linhas, time.perf_counter() - inicio
+
+def fonte_inalterada(nome, input_dir, output_dir, registro):
+    # True quando a planilha e o CSV limpo têm o mesmo conteúdo da última rodada
+    entrada, saida = ARQUIVOS[nome]
+    caminho_entrada = os.path.join(input_dir, entrada)
+    caminho_saida = os.path.join(output_dir, saida)
+    if not registro or not os.path.exists(caminho_entrada) or not os.path.exists(caminho_saida):
+        return False
+    return (manifesto.hash_arquivo(caminho_entrada) == registro['entrada']
+            and manifesto.hash_arquivo(caminho_saida) == registro['saida'])
+
+def executar(fontes, input_dir, output_dir, workers=None, streaming=True, forcar=False):
+    # Retorna {fonte: {'linhas', 'segundos', 'erro', 'pulada'}}
+    os.makedirs(output_dir, exist_ok=True)
+    estado = manifesto.carregar(output_dir)
+    resultados = {}
+
+    pendentes = []
+    for nome in fontes:
+        registro = estado['fontes'].get(nome)
+        if not forcar and fonte_inalterada(nome, input_dir, output_dir, registro):
+            print(f"{nome.upper()} sem alterações desde a última rodada, pulando.")
+            resultados[nome] = {'linhas': registro['linhas'], 'segundos': 0.0, 'erro': None, 'pulada': True}
+        else:
+            pendentes.append(nome)
+
+    def concluir(nome, linhas, segundos):
+        entrada, saida = ARQUIVOS[nome]
+        estado['fontes'][nome] = {
+            'entrada': manifesto.hash_arquivo(os.path.join(input_dir, entrada)),
+            'saida': manifesto.hash_arquivo(os.path.join(output_dir, saida)),
+            'linhas': linhas,
+        }
+        resultados[nome] = {'linhas': linhas, 'segundos': segundos, 'erro': None, 'pulada': False}
+
+    def falhar(nome, erro, segundos):
+        print(f"Falha {nome.upper()}: {erro}")
+        estado['fontes'].pop(nome, None)
+        resultados[nome] = {'linhas': None, 'segundos': segundos, 'erro': str(erro), 'pulada': False}
+
+    workers = workers or min(len(pendentes), os.cpu_count() or 1)
+    if workers <= 1:
+        for nome in pendentes:
+            inicio = time.perf_counter()
+            try:
+                concluir(nome, *executar_fonte(nome, input_dir, output_dir, streaming))
+            except Exception as e:
+                falhar(nome, e, time.perf_counter() - inicio)
     else:
-        print("Erro: Não foi possível mapear as colunas do CMED.")
+        inicio = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futuros = {pool.submit(executar_fonte, nome, input_dir, output_dir, streaming): nome
+                       for nome in pendentes}
+            for futuro in as_completed(futuros):
+                nome = futuros[futuro]
+                try:
+                    concluir(nome, *futuro.result())
+                except Exception as e:
+                    falhar(nome, e, time.perf_counter() - inicio)
+
+    manifesto.salvar(output_dir, estado)
+    return resultados
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Limpeza das planilhas de referência (Média Fácil)")
+    parser.add_argument('--sources', default=",".join(FONTES),
+                        help=f"fontes separadas por vírgula (disponíveis: {', '.join(FONTES)})")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="processos em paralelo (padrão: uma por fonte, até o número de CPUs)")
+    parser.add_argument('--input-dir', default=input_dir, help="pasta com as planilhas originais")
+    parser.add_argument('--output-dir', default=output_dir, help="pasta onde os CSV limpos são gravados")
+    parser.add_argument('--no-streaming', action='store_true',
+                        help="lê as planilhas inteiras com pandas em vez do modo streaming")
+    parser.add_argument('--force', action='store_true',
+                        help="reprocessa mesmo as fontes que não mudaram")
+    args = parser.parse_args(argv)
+
+    fontes = [f.strip().lower() for f in args.sources.split(',') if f.strip()]
+    desconhecidas = [f for f in fontes if f not in FONTES]
+    if desconhecidas:
+        parser.error(f"fonte(s) desconhecida(s): {', '.join(desconhecidas)}")
 
-try:
-    clean_catser()
-except Exception as e:
-    print(f"Falha CATSER: {e}")
+    resultados = executar(fontes, args.input_dir, args.output_dir, args.workers,
+                          streaming=not args.no_streaming, forcar=args.force)
 
-try:
-    clean_sinapi()
-except Exception as e:
-    print(f"Falha SINAPI: {e}")
+    print("\nResumo:")
+    for nome in fontes:
+        r = resultados[nome]
+        status = f"{r['linhas']} linhas" if r['erro'] is None else f"FALHOU ({r['erro']})"
+        if r['pulada']:
+            status += " (sem alterações)"
+        print(f"- {nome.upper():<8} {r['segundos']:7.2f}s  {status}")
 
-try:
-    clean_cmed()
-except Exception as e:
-    print(f"Falha CMED: {e}")
+    falhas = [nome for nome, r in resultados.items() if r['erro'] is not None]
+    print("\nProcessamento finalizado!" if not falhas else f"\nProcessamento com falhas: {', '.join(falhas)}")
+    return 1 if falhas else 0
 
-print("\nProcessamento finalizado!")
+if __name__ == "__main__":
+    sys.exit(main())
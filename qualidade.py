@@ -0,0 +1,381 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from instrumentacao import etapa
+from limpeza import validar_gtin
+from numeros_br import converter_serie, detectar_formato
+from planilhas_limpas import PASTA_PADRAO, UFS, ler_planilha
+
+# Verificação de qualidade dos catálogos limpos, antes de irem para o banco.
+#
+#   python qualidade.py                          (catser, sinapi e cmed de Planilhas_Limpas)
+#   python qualidade.py cmed --limite 0.05
+#
+# O importar_para_supabase roda a mesma verificação em cada tabela e não
+# importa a que passar do limite de linhas em quarentena. As regras de cada
+# catálogo ficam em REGRAS:
+#
+#   obrigatorias - coluna vazia                               -> quarentena
+#   ean          - GTIN inválido -> quarentena; placeholder ('    -     ') -> vazio
+#   precos       - preço que não é número ou fora de (mín, máx) -> quarentena
+#   formatos     - valor fora do padrão da coluna (unidade)   -> quarentena
+#   rotulos      - rótulo de categoria numa coluna de nome (produto 'Novo',
+#                  'Biológico': a coluna TIPO DE PRODUTO no lugar de PRODUTO) -> quarentena
+#   chave        - chave natural repetida: fica a última (a que o upsert
+#                  gravaria), as outras vão para a quarentena
+#   texto        - texto com a codificação estragada, consertado (abaixo)
+#
+# Texto: a dupla decodificação ('SERVIÃ‡OS', UTF-8 lido como Latin-1/cp1252)
+# é desfeita byte a byte. Quando o caractere se perdeu ('SERVI¿S', a
+# planilha salva numa codificação sem os acentos), a palavra é reconstituída
+# pelas palavras acentuadas do próprio catálogo: cada '¿' vale de 1 a 3
+# letras, com pelo menos uma acentuada, e só se conserta quando um candidato
+# domina ('SERVIÇOS'); o resto fica como está e aparece como aviso.
+#
+# As regras de linha rodam em uma passada por blocos de BLOCO linhas, coluna
+# a coluna; texto e chave trabalham sobre os valores distintos e a coluna
+# inteira. O relatório (JSON) e a quarentena (CSV, com a coluna 'motivo')
+# vão para Planilhas_Limpas/qualidade/.
+
+PASTA_QUALIDADE = "qualidade"
+BLOCO = 1_000_000
+LIMITE_QUARENTENA = 0.01
+EXEMPLOS = 5
+
+TIPOS_PRODUTO_CMED = {'Genérico', 'Similar', 'Novo', 'Específico', 'Biológico', 'Fitoterápico',
+                      'Produto de Terapia Avançada', 'Radiofármaco'}
+
+REGRAS = {
+    'catser': {'obrigatorias': ['codigo', 'descricao'], 'chave': 'codigo',
+               'texto': ['descricao', 'Grupo', 'Classe']},
+    'sinapi': {'obrigatorias': ['codigo', 'descricao'], 'chave': 'codigo',
+               'texto': ['classe', 'descricao'],
+               'precos': {uf: (0, 1e6) for uf in UFS},
+               'formatos': {'unidade': r'[A-Z][A-Z0-9²³]{0,5}(X[A-Z]{1,3})?'}},
+    'cmed': {'obrigatorias': ['substancia'], 'ean': 'ean', 'chave': 'ean',
+             'texto': ['substancia', 'produto'],
+             'precos': {'pf': (0.01, 5e7), 'pmvg': (0.01, 5e7)},
+             'rotulos': {'produto': TIPOS_PRODUTO_CMED}},
+}
+
+# Bytes de UTF-8 lidos como cp1252/Latin-1: um 'Ã', 'Â' ou 'â' seguido de um
+# caractere que só aparece como byte de continuação (os de 0x80-0x9f no
+# cp1252 são letras e símbolos fora da faixa Latin-1)
+_CP1252_ALTOS = '€‚ƒ„…†‡ˆ‰Š‹ŒŽ‘’“”•–—˜™š›œžŸ'
+_CONTINUACAO = f'\x80-\xbf{_CP1252_ALTOS}'
+_DUPLA = f'[ÃÂâ][{_CONTINUACAO}]'
+_TRECHO_DUPLO = re.compile(f'[\x80-\xff{_CP1252_ALTOS}]{{2,}}')
+_PERDIDO = '[¿�]'
+_PALAVRA_PERDIDA = re.compile(r"[^\W\d_]*[¿�][^\W\d_¿�]*(?:[¿�][^\W\d_¿�]*)*")
+_PALAVRA_ACENTUADA = re.compile(r"[^\W\d_]*[^\x00-\x7f\W\d_][^\W\d_]*")
+_NAO_ASCII = '[^\x00-\x7f]'
+
+
+def _desfazer_dupla(texto):
+    # Cada trecho de caracteres altos volta a ser bytes e é lido como UTF-8;
+    # trechos que já eram acentos de verdade ('ÇÃO') não decodificam e ficam
+    def trecho(m):
+        t = m.group()
+        for _ in range(3):
+            for codec in ('cp1252', 'latin-1'):
+                try:
+                    t = t.encode(codec).decode('utf-8')
+                    break
+                except UnicodeError:
+                    continue
+            else:
+                break
+        return t
+    return _TRECHO_DUPLO.sub(trecho, texto)
+
+
+class _Vocabulario:
+    # Palavras acentuadas do catálogo (maiúsculas), para reconstituir as que
+    # perderam caracteres
+    def __init__(self, valores):
+        self.contagem = Counter()
+        for v in valores:
+            if not re.search(_PERDIDO, v):
+                self.contagem.update(_PALAVRA_ACENTUADA.findall(v.upper()))
+        self.por_tamanho = defaultdict(list)
+        for palavra in self.contagem:
+            self.por_tamanho[len(palavra)].append(palavra)
+        self._memo = {}
+
+    def reconstituir(self, token):
+        if token not in self._memo:
+            self._memo[token] = self._reconstituir(token)
+        return self._memo[token]
+
+    def _reconstituir(self, token):
+        pedacos = re.split(_PERDIDO, token.upper())
+        conhecidas, perdidos = sum(map(len, pedacos)), len(pedacos) - 1
+        if conhecidas < 3:
+            return None
+        padrao = re.compile('([^\\W\\d_]{1,3})'.join(map(re.escape, pedacos)))
+        candidatos = []
+        for tamanho in range(conhecidas + perdidos, conhecidas + 3 * perdidos + 1):
+            for palavra in self.por_tamanho[tamanho]:
+                m = padrao.fullmatch(palavra)
+                if m and all(re.search(_NAO_ASCII, g) for g in m.groups()):
+                    candidatos.append(palavra)
+        if not candidatos:
+            return None
+        candidatos.sort(key=lambda p: -self.contagem[p])
+        if len(candidatos) > 1 and self.contagem[candidatos[0]] < 3 * self.contagem[candidatos[1]]:
+            return None
+        palavra = candidatos[0]
+        letras = re.sub(_PERDIDO, '', token)
+        return palavra if letras.isupper() else palavra.lower() if letras.islower() else palavra.capitalize()
+
+    def consertar(self, texto):
+        return _PALAVRA_PERDIDA.sub(lambda m: self.reconstituir(m.group()) or m.group(), texto)
+
+
+def _distintos(serie):
+    # Valores de texto distintos (as categorias, se a coluna for categórica)
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return [str(v) for v in serie.cat.categories]
+    return [v for v in pd.unique(serie.dropna().to_numpy(dtype=object)) if isinstance(v, str)]
+
+
+def _por_valor(serie, funcao):
+    # Máscara por linha de funcao(valores distintos) -> array de bool,
+    # calculada uma vez por valor distinto (nulos ficam False)
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codigos, distintos = serie.cat.codes.to_numpy(), serie.cat.categories
+    else:
+        codigos, distintos = pd.factorize(serie)
+    resultado = np.append(np.asarray(funcao([str(v) for v in distintos]), dtype=bool), False)
+    return resultado[codigos]
+
+
+def _substituir(serie, mapa):
+    # Troca os valores de mapa na coluna (nas categorias, se for categórica)
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        novas = pd.Index([mapa.get(str(v), v) for v in serie.cat.categories])
+        unicas, posicoes = np.unique(novas.astype(str), return_inverse=True)
+        codigos = serie.cat.codes.to_numpy()
+        codigos = np.where(codigos >= 0, posicoes[np.maximum(codigos, 0)], -1)
+        return pd.Series(pd.Categorical.from_codes(codigos, categories=unicas), index=serie.index,
+                         name=serie.name)
+    alvo = serie.isin(mapa.keys())
+    if alvo.any():
+        serie = serie.copy()
+        serie[alvo] = serie[alvo].map(mapa)
+    return serie
+
+
+def _separar(valores, suspeitos, acentuados):
+    # Só o texto com algum caractere fora do ASCII passa pelas regex
+    estragado = re.compile(f'{_DUPLA}|{_PERDIDO}')
+    for v in valores:
+        if not v.isascii():
+            (suspeitos if estragado.search(v) else acentuados).add(v)
+
+
+def _vazios(serie):
+    nulos = serie.isna().to_numpy()
+    if pd.api.types.is_numeric_dtype(serie):
+        return nulos
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return nulos | _por_valor(serie, lambda vs: [not v.strip() for v in vs])
+    return nulos | np.fromiter((isinstance(v, str) and not v.strip() for v in serie.to_numpy(dtype=object)),
+                               dtype=bool, count=len(serie))
+
+
+class _Relatorio:
+    def __init__(self, linhas):
+        self.motivo = np.full(linhas, '', dtype=object)
+        self.regras = {}
+
+    def registrar(self, nome, acao, n, exemplos=()):
+        if not n:
+            return
+        r = self.regras.setdefault(nome, {'acao': acao, 'linhas': 0, 'exemplos': []})
+        r['linhas'] += int(n)
+        faltam = EXEMPLOS - len(r['exemplos'])
+        if faltam > 0:
+            r['exemplos'] += [str(e) for e in list(exemplos)[:faltam]]
+
+    def quarentena(self, nome, inicio, mascara, valores):
+        # mascara: linhas do bloco que começa em inicio; vale o primeiro motivo
+        if not mascara.any():
+            return
+        posicoes = np.flatnonzero(mascara)
+        livres = posicoes[self.motivo[inicio + posicoes] == '']
+        self.motivo[inicio + livres] = nome
+        self.registrar(nome, 'quarentena', len(posicoes), valores.iloc[posicoes[:EXEMPLOS]])
+
+
+def verificar(df, fonte, limite=LIMITE_QUARENTENA, bloco=BLOCO):
+    # Devolve (limpo, quarentena, relatorio): limpo com os reparos e sem as
+    # linhas em quarentena; quarentena com as linhas originais e o 'motivo'
+    inicio_s = time.perf_counter()
+    regras = REGRAS.get(fonte, {})
+    df = df.reset_index(drop=True)
+    original = df
+    relatorio = _Relatorio(len(df))
+
+    col_ean = regras.get('ean') if regras.get('ean') in df.columns else None
+    precos = {c: faixa for c, faixa in regras.get('precos', {}).items() if c in df.columns}
+    formatos_precos = {}
+    textos = [c for c in regras.get('texto', []) if c in df.columns]
+    suspeitos = {c: set() for c in textos}
+    acentuados = set()
+    eans = []
+
+    # Passada única pelas linhas, em blocos
+    for inicio in range(0, max(len(df), 1), bloco):
+        b = df.iloc[inicio:inicio + bloco]
+        for col in regras.get('obrigatorias', []):
+            if col in b.columns:
+                relatorio.quarentena('campo_vazio', inicio, _vazios(b[col]), b[col])
+        if col_ean:
+            ean, motivo = validar_gtin(b[col_ean])
+            invalido = motivo.ne('').to_numpy()
+            relatorio.quarentena('ean_invalido', inicio, invalido, b[col_ean])
+            placeholder = b[col_ean].notna().to_numpy() & ean.isna().to_numpy() & ~invalido
+            relatorio.registrar('ean_placeholder', 'reparo', placeholder.sum(),
+                                b[col_ean][placeholder].head(EXEMPLOS).map(repr))
+            eans.append(ean)
+        for col, (minimo, maximo) in precos.items():
+            serie = b[col]
+            if pd.api.types.is_numeric_dtype(serie):
+                valores, nao_numero = serie, np.zeros(len(serie), dtype=bool)
+            else:
+                if col not in formatos_precos:
+                    formatos_precos[col] = detectar_formato(serie)
+                valores, _ = converter_serie(serie, formatos_precos[col])
+                nao_numero = ~_vazios(serie) & valores.isna().to_numpy()
+            relatorio.quarentena('preco_invalido', inicio, nao_numero, serie)
+            fora = (valores.notna() & ~valores.between(minimo, maximo)).to_numpy()
+            relatorio.quarentena('preco_fora_da_faixa', inicio, fora, serie)
+        for col, padrao in regras.get('formatos', {}).items():
+            if col in b.columns:
+                fora = _por_valor(b[col], lambda vs: [not re.fullmatch(padrao, v) for v in vs])
+                relatorio.quarentena('categoria_invalida', inicio, fora, b[col])
+        for col, rotulos in regras.get('rotulos', {}).items():
+            if col in b.columns:
+                relatorio.quarentena('rotulo_de_categoria', inicio, b[col].isin(rotulos).to_numpy(), b[col])
+        for col in textos:
+            if isinstance(b[col].dtype, pd.CategoricalDtype):
+                continue
+            _separar(_distintos(b[col]), suspeitos[col], acentuados)
+
+    limpo = df.copy()
+    if col_ean:
+        limpo[col_ean] = pd.concat(eans).astype('Int64') if eans else limpo[col_ean]
+
+    # Texto: consertos calculados sobre os valores distintos
+    for col in textos:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            _separar(_distintos(df[col]), suspeitos[col], acentuados)
+    vocabulario = None
+    for col in textos:
+        if not suspeitos[col]:
+            continue
+        mapa, perdidos = {}, []
+        for valor in suspeitos[col]:
+            novo = _desfazer_dupla(valor)
+            if re.search(_PERDIDO, novo):
+                if vocabulario is None:
+                    vocabulario = _Vocabulario(acentuados)
+                novo = vocabulario.consertar(novo)
+                if re.search(_PERDIDO, novo):
+                    perdidos.append(novo)
+            if novo != valor:
+                mapa[valor] = novo
+        if mapa:
+            limpo[col] = _substituir(limpo[col], mapa)
+            n = int(df[col].isin(mapa.keys()).sum())
+            relatorio.registrar('texto_reparado', 'reparo', n,
+                                [f"{a} -> {d}" for a, d in sorted(mapa.items())[:EXEMPLOS]])
+        if perdidos:
+            restantes = set(perdidos) | (suspeitos[col] - mapa.keys())
+            n = int(limpo[col].isin(restantes).sum())
+            relatorio.registrar('texto_irrecuperavel', 'aviso', n, sorted(restantes)[:EXEMPLOS])
+
+    # Chave natural, sobre a coluna inteira (já com o EAN normalizado)
+    col_chave = regras.get('chave')
+    if col_chave in limpo.columns:
+        livres = relatorio.motivo == ''
+        chave = limpo[col_chave][livres]
+        repetida = chave.notna() & chave.duplicated(keep='last')
+        mascara = np.zeros(len(limpo), dtype=bool)
+        mascara[np.flatnonzero(livres)[repetida.to_numpy()]] = True
+        relatorio.quarentena('chave_duplicada', 0, mascara, limpo[col_chave])
+
+    em_quarentena = relatorio.motivo != ''
+    quarentena = original[em_quarentena].assign(motivo=relatorio.motivo[em_quarentena])
+    limpo = limpo[~em_quarentena].reset_index(drop=True)
+    fracao = float(em_quarentena.mean()) if len(df) else 0.0
+    resumo = {
+        'fonte': fonte, 'linhas': len(df), 'quarentena': int(em_quarentena.sum()),
+        'fracao_quarentena': round(fracao, 6), 'limite': limite, 'bloqueado': fracao > limite,
+        'regras': relatorio.regras, 'segundos': round(time.perf_counter() - inicio_s, 3),
+    }
+    return limpo, quarentena.reset_index(drop=True), resumo
+
+
+def aplicar(df, fonte, pasta=PASTA_PADRAO, limite=LIMITE_QUARENTENA):
+    # verificar() + relatório e quarentena gravados em pasta/qualidade;
+    # devolve (limpo, relatorio)
+    with etapa('qualidade.verificar', fonte=fonte, linhas=len(df)) as e:
+        limpo, quarentena, relatorio = verificar(df, fonte, limite)
+        e.definir(quarentena=relatorio['quarentena'], bloqueado=relatorio['bloqueado'])
+    destino = os.path.join(pasta, PASTA_QUALIDADE)
+    os.makedirs(destino, exist_ok=True)
+    with open(os.path.join(destino, f"{fonte}.json"), 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    caminho_quarentena = os.path.join(destino, f"{fonte}_quarentena.csv")
+    if len(quarentena):
+        quarentena.to_csv(caminho_quarentena, index=False, encoding='utf-8-sig')
+    elif os.path.exists(caminho_quarentena):
+        os.remove(caminho_quarentena)
+    imprimir(relatorio)
+    return limpo, relatorio
+
+
+def imprimir(relatorio):
+    status = "BLOQUEADO" if relatorio['bloqueado'] else "ok"
+    print(f"Qualidade {relatorio['fonte']}: {relatorio['linhas']} linhas, {relatorio['quarentena']} em quarentena "
+          f"({relatorio['fracao_quarentena']:.2%}, limite {relatorio['limite']:.2%}) - {status} "
+          f"[{relatorio['segundos']:.2f}s]")
+    for nome, r in relatorio['regras'].items():
+        if r['linhas']:
+            exemplos = f" ex.: {'; '.join(r['exemplos'][:3])}" if r['exemplos'] else ''
+            print(f"  {nome:<22} {r['acao']:<10} {r['linhas']:>8}{exemplos}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verificação de qualidade dos CSV limpos")
+    parser.add_argument('fontes', nargs='*', default=list(REGRAS), help=f"padrão: {', '.join(REGRAS)}")
+    parser.add_argument('--pasta', default=PASTA_PADRAO, help="pasta dos CSV limpos")
+    parser.add_argument('--limite', type=float, default=LIMITE_QUARENTENA,
+                        help=f"fração máxima de linhas em quarentena (padrão: {LIMITE_QUARENTENA})")
+    args = parser.parse_args(argv)
+
+    bloqueadas = []
+    for fonte in args.fontes:
+        caminho = os.path.join(args.pasta, f"{fonte}_limpo.csv")
+        if not os.path.exists(caminho):
+            print(f"Erro: {caminho} não encontrado.")
+            bloqueadas.append(fonte)
+            continue
+        _, relatorio = aplicar(ler_planilha(caminho, args.pasta), fonte, args.pasta, args.limite)
+        if relatorio['bloqueado']:
+            bloqueadas.append(fonte)
+    return 1 if bloqueadas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
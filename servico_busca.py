@@ -0,0 +1,348 @@
+import argparse
+import asyncio
+import contextlib
+import http
+import io
+import json
+import math
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+import testar_busca
+from instrumentacao import etapa
+from planilhas_limpas import PASTA_PADRAO, abrir_planilha, assinatura_arquivo
+from testar_busca import CATALOGOS, POR_PAGINA
+
+# Serviço HTTP local de busca nos catálogos de referência (JSON).
+#
+#   python servico_busca.py --porta 8765 --workers 4
+#   GET /buscar?q=dipirona&catalogo=CMED,SINAPI&uf=SP&limite=10&pagina=0&aproximada=1
+#   GET /buscar?q=limpeza&sinonimos=1   (termo + sinônimos; cada item diz o termo que o trouxe)
+#   GET /saude      (pid, gerações carregadas, linhas e cache do worker)
+#
+# Modelo pre-fork: o processo principal prepara os snapshots e índices da
+# geração atual em disco, abre o socket e sobe os workers (asyncio, um por
+# processo), que aceitam conexões no mesmo socket. Cada worker abre os
+# catálogos só com mmap (planilhas_limpas.abrir_planilha e os índices .npy),
+# então os dados ficam uma vez só no cache de páginas do sistema, não uma
+# cópia por worker; de cada catálogo só são decodificadas as linhas da
+# página pedida. Estruturas montadas sob demanda (vocabulário da busca
+# aproximada, estatísticas do SINAPI) e o cache de resultados continuam
+# sendo de cada worker.
+#
+# Troca de geração: a cada --intervalo segundos o principal confere as
+# assinaturas dos CSV. Quando mudam (e ficam estáveis por uma rodada, para
+# não pegar o cleaner no meio da gravação), ele prepara a geração nova, sobe
+# os workers novos e só depois que todos estão prontos pede aos antigos que
+# parem de aceitar conexões: as requisições em andamento terminam e as
+# conexões ociosas são fechadas. Cada resposta vem inteira de uma geração
+# (campo 'geracao'). Se os workers novos falharem, os antigos continuam.
+
+MAX_LIMITE = 100
+ESPERA_PRONTO = 300.0    # segundos para um worker carregar os catálogos
+ESPERA_DRENAGEM = 30.0   # segundos para as requisições em andamento terminarem
+MAX_CABECALHO = 64 * 1024
+
+
+class ErroRequisicao(Exception):
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+
+def _parametros(consulta):
+    # ?q=a&uf=SP -> {'q': 'a', 'uf': 'SP'} (vale o último valor repetido)
+    return {k: v[-1] for k, v in parse_qs(consulta, keep_blank_values=True).items()}
+
+
+def _inteiro(parametros, nome, padrao, minimo, maximo):
+    try:
+        valor = int(parametros.get(nome, padrao))
+    except ValueError:
+        raise ErroRequisicao(400, f"{nome} deve ser um número inteiro")
+    if not minimo <= valor <= maximo:
+        raise ErroRequisicao(400, f"{nome} deve estar entre {minimo} e {maximo}")
+    return valor
+
+
+def _valor(valor):
+    # NaN/NA -> None; o resto já sai como tipo do Python (Series.tolist)
+    return None if valor is pd.NA or (isinstance(valor, float) and math.isnan(valor)) else valor
+
+
+def _registros(nome, tabela):
+    # Linhas da página como dicts, coluna a coluna (a página é pequena: sai
+    # mais barato que o para_registros do carregador). Os preços do SINAPI vêm
+    # da matriz float32 e saem pelo texto do float32 (0.2034 e não
+    # 0.20340000093), como em PrecosSinapi.preco
+    colunas = list(tabela.columns)
+    valores = []
+    for i, col in enumerate(colunas):
+        serie = tabela[col]
+        if nome == 'SINAPI' and 3 <= i < len(colunas) - 1:
+            serie = serie.astype(np.float32).astype(str).astype(float)
+        valores.append(serie.tolist())
+    return [{col: _valor(v) for col, v in zip(colunas, linha)} for linha in zip(*valores)]
+
+
+def _resposta(status, corpo, manter):
+    conteudo = json.dumps(corpo, ensure_ascii=False, default=str).encode('utf-8')
+    cabecalho = (f"HTTP/1.1 {status} {http.HTTPStatus(status).phrase}\r\n"
+                 f"Content-Type: application/json; charset=utf-8\r\n"
+                 f"Content-Length: {len(conteudo)}\r\n"
+                 f"Connection: {'keep-alive' if manter else 'close'}\r\n\r\n")
+    return cabecalho.encode('latin-1') + conteudo
+
+
+class Servidor:
+    # Um worker: atende HTTP/1.1 (keep-alive) sobre os catálogos carregados
+    def __init__(self, dados):
+        self.dados = dados
+        self.geracao = dict(dados['GERACOES'])
+        self.conexoes = {}  # writer -> atendendo uma requisição agora
+        self.encerrando = False
+
+    def buscar(self, parametros):
+        termo = parametros.get('q', '').strip()
+        if not termo.lstrip('~'):
+            raise ErroRequisicao(400, "o parâmetro q (termo da busca) é obrigatório")
+        # '~' no começo pede a busca aproximada, como no testar_busca
+        aproximada = parametros.get('aproximada', '').lower() in ('1', 'true', 'sim') or termo.startswith('~')
+        sinonimos = parametros.get('sinonimos', '').lower() in ('1', 'true', 'sim')
+        aproximada = aproximada and not sinonimos
+        catalogos = [c.strip().upper() for c in parametros.get('catalogo', ','.join(CATALOGOS)).split(',')
+                     if c.strip()]
+        desconhecidos = [c for c in catalogos if c not in CATALOGOS]
+        if desconhecidos or not catalogos:
+            raise ErroRequisicao(400, f"catálogo desconhecido: {', '.join(desconhecidos)} "
+                                      f"(disponíveis: {', '.join(CATALOGOS)})")
+        limite = _inteiro(parametros, 'limite', POR_PAGINA, 1, MAX_LIMITE)
+        pagina = _inteiro(parametros, 'pagina', 0, 0, 10_000)
+        precos = self.dados['SINAPI_PRECOS']
+        uf = parametros.get('uf') or precos.ufs[0]
+        try:
+            precos.coluna_uf(uf)
+        except ValueError as e:
+            raise ErroRequisicao(400, str(e))
+
+        with etapa('servico.buscar', catalogos=len(catalogos), aproximada=aproximada, sinonimos=sinonimos):
+            res = testar_busca.resultados(termo.lstrip('~'), self.dados, uf, aproximada, pagina * limite, limite,
+                                          tuple(catalogos), atualizar=False, sinonimos=sinonimos)
+            return {'termo': termo.lstrip('~'), 'uf': uf.upper(), 'aproximada': aproximada, 'sinonimos': sinonimos,
+                    'pagina': pagina, 'limite': limite, 'geracao': self.geracao,
+                    'catalogos': {nome: {'total': int(total), 'itens': _registros(nome, tabela)}
+                                  for nome, (tabela, total) in res.items()}}
+
+    def saude(self):
+        cache = testar_busca.CACHE.estatisticas()
+        return {'pid': os.getpid(), 'geracao': self.geracao,
+                'linhas': {nome: len(self.dados[nome]) for nome in CATALOGOS},
+                'cache': {k: cache[k] for k in ('itens', 'acertos', 'falhas', 'taxa_acerto')}}
+
+    def responder(self, metodo, alvo):
+        # (status, corpo JSON)
+        url = urlsplit(alvo)
+        try:
+            if metodo != 'GET':
+                raise ErroRequisicao(405, "só GET é aceito")
+            if url.path == '/buscar':
+                return 200, self.buscar(_parametros(url.query))
+            if url.path == '/saude':
+                return 200, self.saude()
+            raise ErroRequisicao(404, "rotas: /buscar, /saude")
+        except ErroRequisicao as e:
+            return e.status, {'erro': str(e)}
+        except Exception as e:
+            print(f"Erro em {alvo}: {type(e).__name__}: {e}", file=sys.stderr)
+            return 500, {'erro': f"{type(e).__name__}: {e}"}
+
+    async def atender(self, reader, writer):
+        self.conexoes[writer] = False
+        try:
+            while not self.encerrando:
+                try:
+                    cabecalho = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                self.conexoes[writer] = True
+                linhas = cabecalho.decode('latin-1').split('\r\n')
+                campos = {}
+                for linha in linhas[1:]:
+                    nome, _, valor = linha.partition(':')
+                    campos[nome.strip().lower()] = valor.strip()
+                try:
+                    metodo, alvo, versao = linhas[0].split(' ')
+                    corpo = int(campos.get('content-length', 0))
+                except ValueError:
+                    writer.write(_resposta(400, {'erro': "requisição HTTP inválida"}, False))
+                    break
+                if corpo:
+                    await reader.readexactly(corpo)
+                conexao = campos.get('connection', '').lower()
+                manter = conexao == 'keep-alive' if versao == 'HTTP/1.0' else conexao != 'close'
+                # A busca é CPU pura: roda direto no laço (a concorrência vem dos workers)
+                status, resposta = self.responder(metodo, alvo)
+                manter = manter and not self.encerrando
+                writer.write(_resposta(status, resposta, manter))
+                await writer.drain()
+                self.conexoes[writer] = False
+                if not manter:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.conexoes.pop(writer, None)
+            writer.close()
+
+    async def servir(self, sock, pronto, parar, pai):
+        servidor = await asyncio.start_server(self.atender, sock=sock, limit=MAX_CABECALHO)
+        pronto.set()
+        # Para também se o processo principal sumir (morto sem drenar os workers)
+        while not parar.is_set() and os.getppid() == pai:
+            await asyncio.sleep(0.1)
+
+        # Drenagem: para de aceitar, fecha as conexões ociosas e espera as
+        # que estão no meio de uma requisição responderem
+        self.encerrando = True
+        servidor.close()
+        for writer, atendendo in list(self.conexoes.items()):
+            if not atendendo:
+                writer.close()
+        limite = time.monotonic() + ESPERA_DRENAGEM
+        while self.conexoes and time.monotonic() < limite:
+            await asyncio.sleep(0.05)
+
+
+def _worker(sock, pasta, pronto, parar, pai):
+    # Ctrl+C é do processo principal, que drena os workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    testar_busca.output_dir = pasta
+    with contextlib.redirect_stdout(io.StringIO()):
+        dados = testar_busca.carregar_dados(abrir_planilha)
+    if dados is None:
+        sys.exit(1)
+    asyncio.run(Servidor(dados).servir(sock, pronto, parar, pai))
+
+
+class Supervisor:
+    def __init__(self, sock, pasta, workers, intervalo):
+        self.sock = sock
+        self.pasta = pasta
+        self.workers = workers
+        self.intervalo = intervalo
+        self.contexto = multiprocessing.get_context('spawn')
+        self.grupo = []  # [(processo, parar)] servindo agora
+        self.geracao = None
+
+    def geracoes(self):
+        # Assinatura atual de cada CSV (None: sendo regravado)
+        atuais = {}
+        for nome, (arquivo, _) in CATALOGOS.items():
+            try:
+                atuais[nome] = assinatura_arquivo(os.path.join(self.pasta, arquivo))
+            except FileNotFoundError:
+                atuais[nome] = None
+        return atuais
+
+    def preparar(self):
+        # Monta snapshots e índices da geração atual em disco (os workers só abrem)
+        testar_busca.output_dir = self.pasta
+        dados = testar_busca.carregar_dados(abrir_planilha)
+        return None if dados is None else dict(dados['GERACOES'])
+
+    def subir(self, n):
+        # Sobe n workers e espera todos carregarem; None se algum falhar
+        grupo = []
+        for _ in range(n):
+            pronto, parar = self.contexto.Event(), self.contexto.Event()
+            processo = self.contexto.Process(target=_worker, daemon=True,
+                                             args=(self.sock, self.pasta, pronto, parar, os.getpid()))
+            processo.start()
+            grupo.append((processo, parar, pronto))
+        limite = time.monotonic() + ESPERA_PRONTO
+        for processo, _, pronto in grupo:
+            while not pronto.wait(0.2):
+                if not processo.is_alive() or time.monotonic() > limite:
+                    self.drenar([(p, s) for p, s, _ in grupo])
+                    return None
+        return [(p, s) for p, s, _ in grupo]
+
+    def drenar(self, grupo):
+        for _, parar in grupo:
+            parar.set()
+        for processo, _ in grupo:
+            processo.join(ESPERA_DRENAGEM + 5)
+            if processo.is_alive():
+                processo.terminate()
+
+    def trocar(self):
+        geracao = self.preparar()
+        if geracao is None:
+            print("Não foi possível carregar a geração nova; seguindo com a atual.")
+            return
+        novo = self.subir(self.workers)
+        if novo is None:
+            print("Workers da geração nova não subiram; seguindo com a atual.")
+            return
+        antigo, self.grupo, self.geracao = self.grupo, novo, geracao
+        self.drenar(antigo)
+        print(f"Geração em uso: {geracao}")
+
+    def rodar(self):
+        self.trocar()
+        if not self.grupo:
+            return 1
+        host, porta = self.sock.getsockname()[:2]
+        print(f"Servindo em http://{host}:{porta} com {self.workers} workers (Ctrl+C encerra)")
+        vista = self.geracoes()
+        # kill/systemd: mesma drenagem do Ctrl+C
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            while True:
+                time.sleep(self.intervalo)
+                # Worker que caiu é reposto com a mesma geração
+                mortos = [(p, s) for p, s in self.grupo if not p.is_alive()]
+                if mortos:
+                    print(f"{len(mortos)} worker(s) caíram, repondo.")
+                    self.grupo = [w for w in self.grupo if w not in mortos] + (self.subir(len(mortos)) or [])
+                atual = self.geracoes()
+                if atual != vista:
+                    vista = atual  # ainda mudando: espera estabilizar
+                    continue
+                if atual != self.geracao and None not in atual.values():
+                    print("\nCatálogos atualizados, trocando de geração...")
+                    self.trocar()
+        except KeyboardInterrupt:
+            print("\nEncerrando (terminando as requisições em andamento)...")
+            self.drenar(self.grupo)
+        return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serviço HTTP de busca nos catálogos CATSER, SINAPI e CMED")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="processos atendendo (padrão: um por CPU)")
+    parser.add_argument('--pasta', default=PASTA_PADRAO, help="pasta com os CSV limpos")
+    parser.add_argument('--intervalo', type=float, default=5.0,
+                        help="segundos entre as conferências de geração nova dos CSV")
+    args = parser.parse_args(argv)
+
+    sock = socket.create_server((args.host, args.porta), backlog=1024)
+    try:
+        return Supervisor(sock, args.pasta, max(1, args.workers), args.intervalo).rodar()
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+from planilhas_limpas import ler_matriz_uf
+
+# Preços do SINAPI por UF em memória.
+#
+# Os códigos ficam num array int64 ordenado (busca binária) e os preços numa
+# matriz float32 contígua (itens x 27 UFs) na mesma ordem, de modo que:
+#   - preço de um código numa UF: searchsorted + acesso direto, O(log n)
+#   - todos os códigos de uma UF: uma coluna da matriz, O(1) para obter
+#   - mínimo/mediana/máximo/IQR entre as UFs: calculados de uma vez para
+#     todos os itens (vetorizado) e consultados pela posição do código
+#
+# Preço zero (ou vazio) conta como "sem preço" na UF.
+
+ARQUIVO_SINAPI = "sinapi_limpo.csv"
+
+
+class PrecosSinapi:
+    def __init__(self, codigos, ufs, matriz):
+        codigos = np.asarray(codigos, dtype=np.int64)
+        ordem = np.argsort(codigos, kind='stable')
+        self.codigos = codigos[ordem]
+        self.matriz = np.ascontiguousarray(np.asarray(matriz, dtype=np.float32)[ordem])
+        # Preço zero no SINAPI é item sem preço naquela UF
+        self.matriz[self.matriz <= 0] = np.nan
+        self.ufs = list(ufs)
+        self._colunas = {uf: j for j, uf in enumerate(self.ufs)}
+        self._estatisticas = None
+
+    @classmethod
+    def carregar(cls, arquivo=ARQUIVO_SINAPI):
+        return cls(*ler_matriz_uf(arquivo))
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def coluna_uf(self, uf):
+        uf = uf.upper()
+        if uf not in self._colunas:
+            raise ValueError(f"UF desconhecida: {uf} (disponíveis: {', '.join(self.ufs)})")
+        return self._colunas[uf]
+
+    def posicoes(self, codigos):
+        # Posição de cada código na matriz, -1 quando não existe
+        codigos = np.asarray(codigos, dtype=np.int64)
+        pos = np.searchsorted(self.codigos, codigos)
+        pos = np.minimum(pos, len(self.codigos) - 1)
+        return np.where(self.codigos[pos] == codigos, pos, -1)
+
+    def precos(self, codigos, uf):
+        # Preços dos códigos na UF (NaN para código inexistente ou sem preço)
+        pos = self.posicoes(codigos)
+        valores = self.matriz[np.maximum(pos, 0), self.coluna_uf(uf)].astype(np.float64)
+        valores[pos < 0] = np.nan
+        return valores
+
+    def preco(self, codigo, uf):
+        valor = self.precos([codigo], uf)[0]
+        # Pelo texto do float32, para devolver 0.2034 e não 0.20340000093
+        return None if np.isnan(valor) else float(str(np.float32(valor)))
+
+    def por_uf(self, uf):
+        # (códigos, preços) de todos os itens com preço na UF
+        precos = self.matriz[:, self.coluna_uf(uf)]
+        tem_preco = ~np.isnan(precos)
+        return self.codigos[tem_preco], precos[tem_preco]
+
+    def estatisticas(self):
+        # DataFrame (um item por linha, na ordem dos códigos) com mínimo,
+        # quartis, mediana, máximo e IQR entre as UFs; calculado uma vez
+        if self._estatisticas is None:
+            # Cada linha ordenada (NaN vão para o fim); os quantis saem por
+            # interpolação linear entre posições, como no np.percentile
+            ordenada = np.sort(self.matriz, axis=1)
+            validos = (~np.isnan(ordenada)).sum(axis=1)
+            linhas = np.arange(len(ordenada))
+
+            def quantil(q):
+                pos = q * np.maximum(validos - 1, 0)
+                baixo = np.floor(pos).astype(np.int64)
+                alto = np.minimum(baixo + 1, np.maximum(validos - 1, 0))
+                peso = (pos - baixo).astype(np.float32)
+                valor = ordenada[linhas, baixo] * (1 - peso) + ordenada[linhas, alto] * peso
+                return np.where(validos > 0, valor, np.nan)
+
+            q1, mediana, q3 = quantil(0.25), quantil(0.5), quantil(0.75)
+            self._estatisticas = pd.DataFrame({
+                'codigo': self.codigos,
+                'min': quantil(0.0),
+                'q1': q1,
+                'mediana': mediana,
+                'q3': q3,
+                'max': quantil(1.0),
+                'iqr': q3 - q1,
+                'ufs_com_preco': validos,
+            })
+        return self._estatisticas
+
+    def estatisticas_codigos(self, codigos):
+        # Linhas de estatisticas() para os códigos pedidos (NaN se não existir)
+        pos = self.posicoes(codigos)
+        stats = self.estatisticas().iloc[np.maximum(pos, 0)].reset_index(drop=True)
+        stats.loc[pos < 0, ['min', 'q1', 'mediana', 'q3', 'max', 'iqr']] = np.nan
+        stats.loc[pos < 0, 'ufs_com_preco'] = 0
+        stats['codigo'] = np.asarray(codigos, dtype=np.int64)
+        return stats
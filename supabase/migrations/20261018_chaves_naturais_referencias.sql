@@ -0,0 +1,21 @@
+-- Chaves naturais únicas nas tabelas de referência importadas dos CSV limpos,
+-- para o importar_para_supabase.py gravar com upsert (on_conflict) e uma
+-- rodada repetida não duplicar linhas.
+
+-- 1. CMED: EANs de placeholder ('    -     ' etc.) viram NULL (NULL não conflita)
+UPDATE public.referencia_cmed SET ean = NULL WHERE ean IS NOT NULL AND ean !~ '^[0-9]+$';
+
+-- 2. Remove duplicatas antigas, mantendo a última linha gravada de cada chave
+DELETE FROM public.referencia_catser a USING public.referencia_catser b
+WHERE a.codigo = b.codigo AND a.ctid < b.ctid;
+
+DELETE FROM public.referencia_sinapi a USING public.referencia_sinapi b
+WHERE a.codigo = b.codigo AND a.ctid < b.ctid;
+
+DELETE FROM public.referencia_cmed a USING public.referencia_cmed b
+WHERE a.ean = b.ean AND a.ctid < b.ctid;
+
+-- 3. Índices únicos usados pelo ON CONFLICT
+CREATE UNIQUE INDEX IF NOT EXISTS referencia_catser_codigo_key ON public.referencia_catser (codigo);
+CREATE UNIQUE INDEX IF NOT EXISTS referencia_sinapi_codigo_key ON public.referencia_sinapi (codigo);
+CREATE UNIQUE INDEX IF NOT EXISTS referencia_cmed_ean_key ON public.referencia_cmed (ean);
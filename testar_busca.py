@@ -1,17 +1,76 @@
-import pandas as pd
+import numpy as np
+import argparse
 import os
+import re
+
+from busca_aproximada import BuscaAproximada
+from busca_ranqueada import BuscaRanqueada
+from busca_sinonimos import BuscaSinonimos
+from cache_busca import CacheLRU
+from indice_busca import normalizar_texto, obter_indice, textos_catalogo
+from indice_ean import obter_indice_ean
+from indice_palavras import obter_indice_palavras
+from instrumentacao import etapa
+from planilhas_limpas import UFS, assinatura_arquivo, ler_planilha
+from sinapi_precos import PrecosSinapi
 
 # Caminho da pasta onde os arquivos limpos foram gerados
 output_dir = r"Planilhas_Limpas"
 
-def carregar_dados():
+# Itens por página em cada catálogo
+POR_PAGINA = 5
+
+# Resultados recentes: (termo normalizado, catálogos, UF, aproximada, sinônimos, página)
+# -> tabelas, invalidados quando algum CSV ganha geração nova
+CACHE = CacheLRU(max_itens=512, max_bytes=32 * 2**20, ttl=600.0)
+
+# Catálogo -> (arquivo limpo, colunas pesquisáveis)
+CATALOGOS = {
+    'CATSER': ("catser_limpo.csv", ['descricao']),
+    'SINAPI': ("sinapi_limpo.csv", ['descricao']),
+    'CMED': ("cmed_limpo.csv", ['produto', 'substancia']),
+}
+
+# Termo que é um código de barras: no CMED vai direto ao índice de EAN
+TERMO_EAN = re.compile(r'\d{8,14}')
+
+def carregar_catalogo(nome, dados):
+    # Lê o CSV limpo e os índices do catálogo, anotando a geração carregada
+    with etapa('busca.carregar_catalogo', catalogo=nome) as e:
+        _carregar_catalogo(nome, dados)
+        e.definir(linhas=len(dados[nome]))
+
+def _carregar_catalogo(nome, dados):
+    arquivo, colunas = CATALOGOS[nome]
+    caminho = os.path.join(output_dir, arquivo)
+    geracao = assinatura_arquivo(caminho)
+    df = dados['LEITOR'](caminho)
+    dados[nome] = df
+    # Índice de n-gramas gravado ao lado do CSV (reconstruído só quando o CSV muda)
+    textos = lambda: textos_catalogo(df, colunas)
+    dados['INDICES'][nome] = obter_indice(nome, caminho, textos)
+    # Índice de palavras: ordenação por relevância e busca aproximada (~termo)
+    palavras = obter_indice_palavras(nome, caminho, textos)
+    dados['RANQUEADA'][nome] = BuscaRanqueada(dados['INDICES'][nome], palavras)
+    dados['APROXIMADA'][nome] = BuscaAproximada(palavras)
+    # Termo + sinônimos do dicionário numa varredura só do texto normalizado
+    dados['SINONIMOS'][nome] = BuscaSinonimos(dados['INDICES'][nome], dados['RANQUEADA'][nome])
+    if nome == 'SINAPI':
+        # Matriz de preços por UF do SINAPI (código ordenado x 27 UFs)
+        dados['SINAPI_PRECOS'] = PrecosSinapi.carregar(caminho)
+    if nome == 'CMED':
+        # EAN -> linha, para buscas por código de barras
+        dados['CMED_EAN'] = obter_indice_ean(nome, caminho, lambda: df['ean'].fillna(-1).to_numpy(np.int64))
+    dados['GERACOES'][nome] = geracao
+
+def carregar_dados(leitor=ler_planilha):
+    # leitor: ler_planilha (DataFrame) ou abrir_planilha (só mmap, servico_busca)
     print("\n[Média Fácil] Carregando bases de dados de referência...")
     try:
-        dados = {
-            'CATSER': pd.read_csv(os.path.join(output_dir, "catser_limpo.csv")),
-            'SINAPI': pd.read_csv(os.path.join(output_dir, "sinapi_limpo.csv")),
-            'CMED': pd.read_csv(os.path.join(output_dir, "cmed_limpo.csv"))
-        }
+        dados = {'INDICES': {}, 'RANQUEADA': {}, 'APROXIMADA': {}, 'SINONIMOS': {}, 'GERACOES': {},
+                 'LEITOR': leitor}
+        for nome in CATALOGOS:
+            carregar_catalogo(nome, dados)
         print("Bases carregadas com sucesso!")
         print(f"- CATSER: {len(dados['CATSER'])} itens")
         print(f"- SINAPI: {len(dados['SINAPI'])} itens")
@@ -21,70 +80,179 @@ def carregar_dados():
         print(f"\nErro: Certifique-se de que a pasta 'Planilhas_Limpas' contém os arquivos CSV. ({e})")
         return None
 
-def buscar(termo, dados):
+def atualizar_dados(dados):
+    # Recarrega os catálogos cujo CSV ganhou geração nova (cleaner rodou com o
+    # processo aberto) e devolve as gerações em uso, que entram no cache
+    for nome, (arquivo, _) in CATALOGOS.items():
+        try:
+            atual = assinatura_arquivo(os.path.join(output_dir, arquivo))
+        except FileNotFoundError:
+            continue  # CSV sendo regravado: segue com a geração carregada
+        if atual != dados['GERACOES'][nome]:
+            print(f"\n{nome} foi atualizado, recarregando...")
+            carregar_catalogo(nome, dados)
+    geracao = tuple(sorted(dados['GERACOES'].items()))
+    if geracao != dados.get('GERACAO_CACHE'):
+        CACHE.descartar_geracao(geracao)
+        dados['GERACAO_CACHE'] = geracao
+    return geracao
+
+def pesquisar(nome, termo, dados, aproximada=False, offset=0, limite=POR_PAGINA):
+    # (linhas, total, notas) de uma página do catálogo, da linha mais
+    # relevante para a menos. Exata: o termo aparece no texto, nota BM25;
+    # aproximada: tolera erros de digitação, nota de 0 a 1
+    if nome == 'CMED' and TERMO_EAN.fullmatch(termo):
+        linha = dados['CMED_EAN'].linha(int(termo))
+        if linha >= 0:
+            linhas = np.array([linha] if offset == 0 else [], dtype=np.int64)
+            return linhas, 1, np.ones(len(linhas))
+    busca = dados['APROXIMADA' if aproximada else 'RANQUEADA'][nome]
+    with etapa('busca.pesquisar', catalogo=nome, aproximada=aproximada) as e:
+        linhas, notas, total = busca.buscar(termo, limite=limite, offset=offset)
+        e.definir(total=total)
+    return linhas, total, notas
+
+def pesquisar_sinonimos(nome, termo, dados, offset=0, limite=POR_PAGINA):
+    # (linhas, total, notas, termos): como pesquisar, com o termo expandido
+    # pelo dicionário de sinônimos; termos diz qual termo trouxe cada linha
+    # (as que têm o termo digitado vêm antes das que só têm sinônimo)
+    with etapa('busca.pesquisar_sinonimos', catalogo=nome) as e:
+        linhas, notas, termos, total = dados['SINONIMOS'][nome].buscar(termo, limite=limite, offset=offset)
+        e.definir(total=total)
+    return linhas, total, notas, termos
+
+def _montar_resultados(termo, dados, uf, aproximada, offset, limite, catalogos, sinonimos=False):
+    resultado = {}
+    for nome in catalogos:
+        if sinonimos:
+            linhas, total, notas, termos = pesquisar_sinonimos(nome, termo, dados, offset, limite)
+        else:
+            linhas, total, notas = pesquisar(nome, termo, dados, aproximada, offset, limite)
+        # Só as linhas e colunas mostradas (o índice é a linha do CSV, então
+        # loc serve para o DataFrame e para a TabelaMapeada)
+        df = dados[nome]
+        if nome == 'SINAPI':
+            # Preço na UF escolhida e a mediana entre as UFs
+            precos = dados['SINAPI_PRECOS']
+            tabela = df.loc[linhas, ['codigo', 'descricao', 'unidade']].copy()
+            tabela[uf] = precos.precos(tabela['codigo'], uf)
+            tabela['mediana UFs'] = precos.estatisticas_codigos(tabela['codigo'])['mediana'].to_numpy()
+        elif nome == 'CMED':
+            tabela = df.loc[linhas, ['ean', 'produto', 'substancia', 'pmvg']].copy()
+        else:
+            tabela = df.loc[linhas, ['codigo', 'descricao']].copy()
+        tabela['nota'] = notas.round(2)
+        if sinonimos:
+            tabela['termo'] = termos
+        resultado[nome] = (tabela, total)
+    return resultado
+
+def resultados(termo, dados, uf=None, aproximada=False, offset=0, limite=POR_PAGINA, catalogos=tuple(CATALOGOS),
+               atualizar=True, sinonimos=False):
+    # {catálogo: (tabela da página, total)}, passando pelo cache. As tabelas
+    # são compartilhadas entre chamadas: não devem ser alteradas.
+    # atualizar=False: segue com a geração carregada (quem troca é o chamador).
+    # sinonimos=True: expande o termo pelo dicionário (ignora aproximada)
+    termo = normalizar_texto(termo).strip()
+    uf = (uf or dados['SINAPI_PRECOS'].ufs[0]).upper()
+    geracao = atualizar_dados(dados) if atualizar else tuple(sorted(dados['GERACOES'].items()))
+    aproximada = aproximada and not sinonimos
+    chave = (termo, tuple(catalogos), uf, aproximada, sinonimos, offset, limite)
+    with etapa('busca.resultados', aproximada=aproximada, sinonimos=sinonimos, pagina=offset // limite):
+        return CACHE.obter_ou_calcular(
+            chave, lambda: _montar_resultados(termo, dados, uf, aproximada, offset, limite, catalogos, sinonimos),
+            geracao)
+
+def rodape(total, offset):
+    # "... e mais N itens." depois da página mostrada
+    restantes = total - offset - POR_PAGINA
+    if restantes > 0: print(f"... e mais {restantes} itens. (digite 'mais' para ver)")
+
+def mostrar(tabela, total, offset, nenhum="Nenhum item encontrado."):
+    if len(tabela):
+        print(tabela.to_string(index=False))
+        rodape(total, offset)
+    else:
+        print(nenhum if not total else "Sem mais itens.")
+
+def buscar(termo, dados, uf=None, aproximada=False, pagina=0, sinonimos=False):
     termo = termo.lower().strip()
     if not termo: return
+    offset = pagina * POR_PAGINA
+    res = resultados(termo, dados, uf, aproximada, offset, sinonimos=sinonimos)
     
     print(f"\n" + "="*50)
-    print(f"RESULTADOS PARA: '{termo.upper()}'")
+    print(f"RESULTADOS PARA: '{termo.upper()}'"
+          + (" (com sinônimos)" if sinonimos else " (aproximada)" if aproximada else "")
+          + (f" - página {pagina + 1}" if pagina else ""))
     print("="*50)
     
     # Busca CATSER
-    # Forçar conversão para string para evitar erro .str accessor
-    df_catser = dados['CATSER'].copy()
-    df_catser['descricao'] = df_catser['descricao'].astype(str)
-    res_catser = df_catser[df_catser['descricao'].str.contains(termo, case=False, na=False)]
-    
     print(f"\n[CATSER - Catálogo de Serviços/Materiais]")
-    if not res_catser.empty:
-        print(res_catser[['codigo', 'descricao']].head(5).to_string(index=False))
-        if len(res_catser) > 5: print(f"... e mais {len(res_catser)-5} itens.")
-    else:
-        print("Nenhum item encontrado.")
-    
-    # Busca SINAPI
-    df_sinapi = dados['SINAPI'].copy()
-    df_sinapi['descricao'] = df_sinapi['descricao'].astype(str)
-    res_sinapi = df_sinapi[df_sinapi['descricao'].str.contains(termo, case=False, na=False)]
+    mostrar(*res['CATSER'], offset)
     
+    # Busca SINAPI (preço na UF escolhida, padrão: a primeira, AC)
     print(f"\n[SINAPI - Construção Civil]")
-    if not res_sinapi.empty:
-        cols = ['codigo', 'descricao', 'unidade']
-        precos = [c for c in res_sinapi.columns if c not in cols and c not in ['classe']]
-        if precos: cols.append(precos[0])
-
-        print(res_sinapi[cols].head(5).to_string(index=False))
-        if len(res_sinapi) > 5: print(f"... e mais {len(res_sinapi)-5} itens.")
-    else:
-        print("Nenhum item encontrado.")
-    
-    # Busca CMED (Medicamentos)
-    df_cmed = dados['CMED'].copy()
-    df_cmed['produto'] = df_cmed['produto'].astype(str)
-    df_cmed['substancia'] = df_cmed['substancia'].astype(str)
-    
-    res_cmed = df_cmed[
-        df_cmed['produto'].str.contains(termo, case=False, na=False) | 
-        df_cmed['substancia'].str.contains(termo, case=False, na=False)
-    ]
+    mostrar(*res['SINAPI'], offset)
     
+    # Busca CMED (Medicamentos) - produto e substância ficam no mesmo índice
     print(f"\n[CMED - Medicamentos ANVISA]")
-    if not res_cmed.empty:
-        print(res_cmed[['produto', 'substancia', 'pmvg']].head(5).to_string(index=False))
-        if len(res_cmed) > 5: print(f"... e mais {len(res_cmed)-5} itens.")
-    else:
-        print("Nenhum item medicinal encontrado.")
+    mostrar(*res['CMED'], offset, "Nenhum item medicinal encontrado.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Busca interativa nas bases de referência")
+    parser.add_argument('--uf', type=str.upper, choices=UFS, help="UF dos preços do SINAPI (padrão: AC)")
+    parser.add_argument('--aproximada', action='store_true',
+                        help="usa a busca tolerante a erros de digitação em todas as buscas")
+    parser.add_argument('--sinonimos', action='store_true',
+                        help="expande todas as buscas pelo dicionário de sinônimos (JSON próprio: "
+                             "variável de ambiente SINONIMOS)")
+    parser.add_argument('--cache-itens', type=int, default=CACHE.max_itens,
+                        help=f"buscas guardadas no cache (padrão: {CACHE.max_itens})")
+    parser.add_argument('--cache-mb', type=float, default=CACHE.max_bytes / 2**20,
+                        help=f"memória máxima do cache em MB (padrão: {CACHE.max_bytes // 2**20})")
+    parser.add_argument('--cache-ttl', type=float, default=CACHE.ttl,
+                        help=f"validade de uma busca no cache, em segundos (padrão: {CACHE.ttl:.0f})")
+    args = parser.parse_args()
+    CACHE.max_itens, CACHE.max_bytes, CACHE.ttl = args.cache_itens, int(args.cache_mb * 2**20), args.cache_ttl
+
     bd = carregar_dados()
     if bd:
+        uf = args.uf
+        ultima, pagina = None, 0
         print("\nDigite o termo da busca (Ex: Cimento, Dipirona, Limpeza) ou 'sair' para encerrar.")
+        print("Para trocar a UF dos preços do SINAPI digite 'uf SP'.")
+        print("Para tolerar erros de digitação comece com '~' (Ex: ~dipirona sodca).")
+        print("Para incluir sinônimos comece com '+' (Ex: +limpeza).")
+        print("'cache' mostra os acertos/falhas do cache de buscas.")
         while True:
             try:
                 entrada = input("\n🔍 Buscar: ")
                 if entrada.lower() == 'sair':
                     print("Encerrando busca. Até logo!")
                     break
-                buscar(entrada, bd)
+                if entrada.lower().startswith('uf '):
+                    try:
+                        bd['SINAPI_PRECOS'].coluna_uf(entrada[3:].strip())
+                        uf = entrada[3:].strip().upper()
+                        print(f"Preços do SINAPI em {uf}.")
+                    except ValueError as e:
+                        print(e)
+                    continue
+                if entrada.lower().strip() == 'cache':
+                    e = CACHE.estatisticas()
+                    print(f"{e['itens']} buscas ({e['bytes'] / 2**20:.1f} MB), {e['acertos']} acertos, "
+                          f"{e['falhas']} falhas ({e['taxa_acerto']:.0%}), {e['despejos']} despejos, "
+                          f"{e['expirados']} expirados, {e['invalidados']} invalidados")
+                    continue
+                if entrada.lower().strip() == 'mais' and ultima:
+                    # Próxima página da última busca
+                    pagina += 1
+                    buscar(ultima[0], bd, uf, ultima[1], pagina, ultima[2])
+                    continue
+                aproximada = args.aproximada or entrada.startswith('~')
+                sinonimos = args.sinonimos or entrada.startswith('+')
+                ultima, pagina = (entrada.lstrip('~+'), aproximada, sinonimos), 0
+                buscar(ultima[0], bd, uf, aproximada, sinonimos=sinonimos)
             except KeyboardInterrupt:
                 break
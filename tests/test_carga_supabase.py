@@ -0,0 +1,29 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from carga_supabase import _apagar_sql
+
+
+class _Cursor:
+    def __init__(self):
+        self.comandos = []
+
+    def execute(self, sql, parametros=None):
+        self.comandos.append((sql, parametros))
+
+
+def test_apagar_chave_simples_com_nulos():
+    cur = _Cursor()
+    _apagar_sql(cur, 'referencia_cmed', ['ean'], [['7891'], [None], ['7892']], lote=1)
+    assert cur.comandos == [('DELETE FROM public.referencia_cmed WHERE "ean" = ANY(%s)', (['7891'],)),
+                            ('DELETE FROM public.referencia_cmed WHERE "ean" = ANY(%s)', (['7892'],)),
+                            ('DELETE FROM public.referencia_cmed WHERE "ean" IS NULL', None)]
+
+
+def test_apagar_chave_composta():
+    cur = _Cursor()
+    _apagar_sql(cur, 'tabela', ['a', 'b'], [[1, None], [2, 'x']])
+    assert cur.comandos == [('DELETE FROM public.tabela WHERE "a" = %s AND "b" IS NULL', [1]),
+                            ('DELETE FROM public.tabela WHERE "a" = %s AND "b" = %s', [2, 'x'])]
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cesta_precos import estatisticas_cesta
+
+
+def _cotacoes(precos_barato):
+    # 20.000 itens caros (1e5 a 1e6) ordenados antes de um item barato
+    rng = np.random.default_rng(0)
+    caros = pd.DataFrame({'item': np.repeat(np.arange(20_000), 3),
+                          'preco': rng.uniform(1e5, 1e6, 60_000)})
+    barato = pd.DataFrame({'item': 99999, 'preco': precos_barato})
+    return pd.concat([caros, barato], ignore_index=True)
+
+
+def test_item_barato_depois_de_caros_nao_perde_precisao():
+    precos = [10.01, 10.02, 10.03, 10.02, 10.01, 10.02]
+    resumo, cotacoes = estatisticas_cesta(_cotacoes(precos), metodo='zscore')
+    linha = resumo.set_index('item').loc[99999]
+    assert not cotacoes.loc[cotacoes['item'] == 99999, 'excluida'].any()
+    assert linha['usadas'] == 6
+    assert np.isclose(linha['media'], np.mean(precos))
+    assert np.isclose(linha['desvio'], np.std(precos, ddof=1))
+    assert np.isclose(linha['media_saneada'], np.mean(sorted(precos)))
+
+
+def test_desvio_com_cinco_cotacoes():
+    precos = [10.01, 10.02, 10.03, 10.02, 10.01]
+    resumo, _ = estatisticas_cesta(_cotacoes(precos), metodo='zscore')
+    linha = resumo.set_index('item').loc[99999]
+    assert np.isclose(linha['desvio'], np.std(precos, ddof=1))
+    assert np.isclose(linha['desvio'], 0.0084, atol=1e-4)
@@ -0,0 +1,56 @@
+import asyncio
+import json
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+from coletar_pncp import coletar
+from servidor_pncp import ServidorPNCP
+
+
+def _coletar(servidor, gravar, modalidades, checkpoint, tamanho_buffer):
+    return asyncio.run(coletar(gravar, modalidades, ['20260101', '20260331'], checkpoint, base_url=servidor.url,
+                               taxa=500.0, tamanho_buffer=tamanho_buffer))
+
+
+def _chaves(linhas):
+    return [(l['link_pncp'], l['item_nome']) for l in linhas]
+
+
+def test_paginas_e_429(tmp_path):
+    gravadas = []
+    with ServidorPNCP({6: 120, 8: 55}, itens_por_contrato=2, erro_429_a_cada=7) as servidor:
+        total, falhas = _coletar(servidor, gravadas.extend, [6, 8], str(tmp_path / 'checkpoint.json'), 40)
+    assert not falhas
+    assert total == len(gravadas) == (120 + 55) * 2
+    assert len(set(_chaves(gravadas))) == len(gravadas)
+    assert servidor.respostas_429 > 0
+    assert sorted(set(servidor.paginas)) == [(6, 1), (6, 2), (6, 3), (8, 1), (8, 2)]
+
+
+def test_retoma_do_ultimo_contrato(tmp_path):
+    caminho = str(tmp_path / 'checkpoint.json')
+    gravadas = []
+
+    def gravar_e_cair(linhas):
+        # Grava 3 lotes de 5 contratos e depois falha
+        if len(gravadas) >= 30:
+            raise RuntimeError("gravação indisponível")
+        gravadas.extend(linhas)
+
+    with ServidorPNCP({6: 120}, itens_por_contrato=2) as servidor:
+        total, falhas = _coletar(servidor, gravar_e_cair, [6], caminho, 10)
+        assert falhas and total == 30
+        with open(caminho, encoding='utf-8') as f:
+            estado = json.load(f)['modalidades']['6']
+        # O 15º contrato (órgão 3, sequencial 6005) divide o sequencial com os
+        # dois anteriores, de outros órgãos
+        assert estado == {'pagina': 1, 'ultimo_contrato': ['00000000000003', 2026, 6005]}
+
+        total, falhas = _coletar(servidor, gravadas.extend, [6], caminho, 10)
+    assert not falhas
+    assert total == len(gravadas) == 240
+    assert len(set(_chaves(gravadas))) == 240
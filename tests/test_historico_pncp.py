@@ -0,0 +1,25 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import historico_pncp
+
+LINHA = {'item_nome': 'caneta', 'item_descricao': 'caneta azul', 'unidade': 'UN', 'quantidade': 10,
+         'valor_unitario': 2.5, 'valor_total': 25.0, 'data_publicacao': '2026-03-05', 'orgao_nome': 'Prefeitura',
+         'orgao_cnpj': '123', 'municipio': 'Belo Horizonte', 'uf': 'MG', 'modalidade': 'Pregão',
+         'sequencial_compra': '1', 'ano_compra': 2026, 'link_pncp': 'https://pncp.gov.br/1'}
+
+
+def test_segmento_com_dicionario_todo_nulo(tmp_path):
+    pasta = str(tmp_path)
+    historico_pncp.adicionar([LINHA], pasta)
+    historico_pncp.adicionar([dict(LINHA, modalidade=None, municipio=None)], pasta)
+
+    df = historico_pncp.consultar(pasta=pasta)
+    assert len(df) == 2
+    assert df['modalidade'].isna().sum() == 1 and df['municipio'].isna().sum() == 1
+
+    assert historico_pncp.compactar(pasta) == 1
+    df = historico_pncp.consultar(pasta=pasta)
+    assert sorted(df['modalidade'].dropna()) == ['Pregão'] and df['municipio'].isna().sum() == 1
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from numeros_br import BR, SIMPLES, converter_serie
+
+
+def test_simbolos_fora_de_posicao_sao_invalidos():
+    valores, invalidos = converter_serie(pd.Series(['1-2', '5-', '1$2', '12R', '*5', '1*2'], dtype=object), BR)
+    assert valores.isna().all()
+    assert invalidos == 6
+
+
+def test_prefixo_e_sufixo_aceitos():
+    casos = ['R$ 1.234,56', 'R$ -1.234,56*', '-R$ 5,00', '27,29*', '  12,5 ']
+    valores, invalidos = converter_serie(pd.Series(casos, dtype=object), BR)
+    assert np.allclose(valores, [1234.56, -1234.56, -5.0, 27.29, 12.5])
+    assert invalidos == 0
+
+
+def test_formato_simples():
+    valores, invalidos = converter_serie(pd.Series(['0.2034', 'R$ 3.5*', '1-2'], dtype=object), SIMPLES)
+    assert valores.iloc[0] == 0.2034 and valores.iloc[1] == 3.5 and np.isnan(valores.iloc[2])
+    assert invalidos == 1
+
+
+def test_separador_de_milhar_fora_de_posicao_e_invalido():
+    valores, invalidos = converter_serie(pd.Series(['12.34', '1.234.5', '1.2.3,4', '1.234.567,8'], dtype=object), BR)
+    assert valores.iloc[:3].isna().all() and valores.iloc[3] == 1234567.8
+    assert invalidos == 3
+
+    valores, invalidos = converter_serie(pd.Series(['0,2034', '1,5', '1,234.5'], dtype=object), SIMPLES)
+    assert valores.iloc[:2].isna().all() and valores.iloc[2] == 1234.5
+    assert invalidos == 2
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from precificar_planilha import CONFIANCA_BAIXA, SEM_CORRESPONDENCIA, ler_entrada, precificar, termo_busca
+from testar_busca import carregar_dados
+
+
+@pytest.fixture(scope='module')
+def dados():
+    atual = os.getcwd()
+    os.chdir(RAIZ)
+    try:
+        yield carregar_dados()
+    finally:
+        os.chdir(atual)
+
+
+def test_termo_sem_palavras_vazias():
+    assert termo_busca('grampeador de mesa') == 'grampeador mesa'
+    assert termo_busca('papel a4 branco') == 'papel a4 branco'
+    assert termo_busca('de') == ''
+
+
+def test_sem_preco_quando_so_palavras_soltas_casam(dados):
+    df = ler_entrada(os.path.join(RAIZ, 'Planilha_Teste_MediaFacil.xlsx'))
+    saida = precificar(df, 'Item', dados, 'SP', 'Quantidade', workers=2).set_index('Item')
+    for item in ['Grampeador de Mesa', 'Cadeira de Escritório Giratória', 'Detergente Líquido']:
+        assert saida.loc[item, 'confianca'] in (CONFIANCA_BAIXA, SEM_CORRESPONDENCIA)
+        assert pd.isna(saida.loc[item, 'preco_referencia']) and pd.isna(saida.loc[item, 'valor_total'])
+
+
+def test_item_casado_tem_preco(dados):
+    df = pd.DataFrame({'Item': ['Pedreiro com encargos complementares'], 'Quantidade': [2]})
+    saida = precificar(df, 'Item', dados, 'SP', 'Quantidade', workers=1)
+    assert saida.loc[0, 'confianca'] == 'alta' and saida.loc[0, 'melhor_catalogo'] == 'SINAPI'
+    assert saida.loc[0, 'valor_total'] == round(2 * saida.loc[0, 'preco_referencia'], 2)
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qualidade import _desfazer_dupla, verificar
+
+
+def test_dupla_decodificacao_com_altos_do_cp1252():
+    assert _desfazer_dupla('IMPRESSÃƒO') == 'IMPRESSÃO'
+    assert _desfazer_dupla('MANUTENÃ‡ÃƒO') == 'MANUTENÇÃO'
+    assert _desfazer_dupla('PAGAMENTO Ã€ VISTA') == 'PAGAMENTO À VISTA'
+    assert _desfazer_dupla('SERVIÇO DE MANUTENÇÃO') == 'SERVIÇO DE MANUTENÇÃO'
+
+
+def test_verificar_repara_texto_duplo():
+    df = pd.DataFrame({'codigo': ['1', '2', '3'],
+                       'descricao': ['SERVIÃ‡O DE IMPRESSÃƒO', 'MANUTENÃ‡ÃƒO PREDIAL', 'LIMPEZA']})
+    limpo, quarentena, relatorio = verificar(df, 'catser')
+    assert limpo['descricao'].tolist() == ['SERVIÇO DE IMPRESSÃO', 'MANUTENÇÃO PREDIAL', 'LIMPEZA']
+    assert quarentena.empty
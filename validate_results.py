@@ -1,17 +1,21 @@
-import pandas as pd
 import os
 
+import qualidade
+from planilhas_limpas import ler_planilha
+
 output_dir = r"c:\Users\freir\OneDrive\Área de Trabalho\Sistemas 2026\Média Fácil\Planilhas_Limpas"
 
 def validate(file_name):
     path = os.path.join(output_dir, file_name)
     print(f"\n--- Amostra: {file_name} ---")
     if os.path.exists(path):
-        df = pd.read_csv(path)
+        df = ler_planilha(path)
         print(f"Total de linhas: {len(df)}")
         print("Colunas:", df.columns.tolist())
         print("Primeiras 3 linhas:")
         print(df.head(3).to_string(index=False))
+        # Regras de qualidade (relatório e quarentena em output_dir/qualidade)
+        qualidade.aplicar(df, file_name.replace('_limpo.csv', ''), output_dir)
     else:
         print(f"Erro: {file_name} não encontrado.")
 
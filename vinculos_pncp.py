@@ -0,0 +1,352 @@
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from historico_pncp import PASTA_HISTORICO, consultar, segmentos_particao
+from indice_busca import normalizar_serie, textos_catalogo
+from indice_palavras import PALAVRA, obter_indice_palavras
+from numeros_br import converter_serie
+from planilhas_limpas import PASTA_PADRAO, assinatura_arquivo, gravar_snapshot, ler_planilha, ler_snapshot
+from testar_busca import CATALOGOS
+
+# Vínculo dos itens do PNCP (só texto livre em item_nome) com o CMED e o
+# CATSER, calculado em lote para que conferir um preço contra o teto do CMED
+# (pmvg) seja um join, e não uma busca aproximada por linha.
+#
+# A unidade de trabalho é o nome normalizado do item (sem acento, minúsculo,
+# espaços simples): o histórico repete muito os mesmos nomes, e o vínculo
+# gravado por nome vale para todas as linhas que o usam, inclusive as que
+# ainda vão chegar e as que uma compactação do histórico mudar de lugar.
+#
+# Sem comparar todos com todos:
+#   bloco - cada nome só é comparado com as linhas do catálogo que contêm
+#           uma das CHAVES_BLOCO palavras mais raras dele (palavras que
+#           aparecem em mais de MAX_BLOCO linhas do catálogo não bloqueiam);
+#   nota  - Dice ponderado pelo IDF entre as palavras do nome e as da linha,
+#           calculado com o índice de palavras que a busca já mantém
+#           (palavras que o catálogo não tem pesam PESO_AUSENTE).
+# Fica a melhor linha de cada catálogo por nome (empate: ordem do CSV).
+#
+# O CMED limpo não tem apresentação nem dose, só substância e produto: o
+# vínculo é com o texto, e a linha gravada é uma das apresentações dele (a
+# primeira com EAN). Na hora de conferir preços vale a faixa do pmvg entre
+# todas as linhas com o mesmo texto, e o teto só é conferido quando o PNCP
+# cotou a embalagem (o pmvg é por caixa, não por comprimido ou ampola).
+#
+# Os vínculos ficam em Planilhas_Limpas/vinculos_pncp/<geracao>/<segmento>/,
+# onde a geração junta as assinaturas dos CSV do CMED e do CATSER: se algum
+# catálogo mudar, os vínculos antigos são descartados e refeitos. Cada
+# execução só calcula os nomes que ainda não têm vínculo e grava um
+# segmento novo.
+
+PASTA_VINCULOS = os.path.join(PASTA_PADRAO, "vinculos_pncp")
+
+ALVOS = ('CMED', 'CATSER')
+COLUNA_CHAVE = {'CMED': 'ean', 'CATSER': 'codigo'}
+CHAVES_BLOCO = 3      # palavras mais raras do nome usadas como chave de bloco
+MAX_BLOCO = 500       # linhas do catálogo acima das quais a palavra não bloqueia
+TAMANHO_MINIMO = 3    # palavras menores que isso não bloqueiam
+NOTA_MINIMA = 0.45
+# Peso de uma palavra do nome que o catálogo não tem (dose, forma, marca):
+# pesa contra o vínculo, mas menos que uma palavra rara do catálogo, senão
+# "amoxicilina 500mg capsula" nunca chegaria a "AMOXICILINA" no CMED
+PESO_AUSENTE = 2.0
+LOTE = 20000          # nomes por lote (limita a memória dos pares candidatos)
+# Unidades do PNCP (normalizadas) que são a embalagem, comparáveis ao pmvg
+UNIDADE_EMBALAGEM = r'(caixa|cx|embalage|emb\b)'
+
+_contador = itertools.count()
+
+
+class Alvo:
+    # Catálogo de destino: índice de palavras, pesos IDF e as palavras de cada linha
+    def __init__(self, nome, df, palavras, representante):
+        self.nome = nome
+        self.df = df
+        self.palavras = palavras
+        # Linhas com o mesmo texto têm a mesma nota: só uma de cada é comparada
+        self.representante = representante
+        n = len(palavras)
+        offsets = np.asarray(palavras.offsets)
+        self.documentos = np.diff(offsets)
+        self.idf = np.log(1 + (n - self.documentos + 0.5) / (self.documentos + 0.5))
+        self.vocabulario = pd.Index(palavras.palavras())
+        self.tamanhos = np.array([len(p) for p in palavras.palavras()], dtype=np.int64)
+
+        # Índice direto (linha -> palavras distintas) a partir das postings
+        linhas = np.asarray(palavras.linhas)
+        ids = np.repeat(np.arange(len(self.documentos)), self.documentos)
+        ordem = np.argsort(linhas, kind='stable')
+        self.palavras_linha = ids[ordem]
+        self.offsets_linha = np.searchsorted(linhas[ordem], np.arange(n + 1)).astype(np.int64)
+        self.peso_linha = np.bincount(linhas, weights=self.idf[ids], minlength=n)
+
+
+def carregar_alvo(nome, pasta=PASTA_PADRAO):
+    arquivo, colunas = CATALOGOS[nome]
+    caminho = os.path.join(pasta, arquivo)
+    df = ler_planilha(caminho)
+    textos = pd.Series(textos_catalogo(df, colunas))
+    palavras = obter_indice_palavras(nome, caminho, lambda: textos.tolist())
+    # Representante de cada texto: a primeira linha com chave (o CMED tem
+    # muitas apresentações da mesma substância, quase todas sem EAN)
+    chave = pd.to_numeric(df[COLUNA_CHAVE[nome]], errors='coerce')
+    ordem = np.lexsort((np.arange(len(df)), chave.isna().to_numpy()))
+    representante = np.zeros(len(df), dtype=bool)
+    representante[ordem[~textos.iloc[ordem].duplicated().to_numpy()]] = True
+    return Alvo(nome, df, palavras, representante)
+
+
+def _expandir(inicios, tamanhos):
+    # Posições inicio..inicio+tamanho-1 de cada faixa, concatenadas
+    total = int(tamanhos.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    deslocamento = np.repeat(inicios - np.concatenate([[0], np.cumsum(tamanhos)[:-1]]), tamanhos)
+    return np.arange(total, dtype=np.int64) + deslocamento
+
+
+def vincular_nomes(nomes, alvo, nota_minima=NOTA_MINIMA):
+    # nomes: textos já normalizados (distintos). Devolve (linha, nota) por
+    # nome, com linha -1 / nota NaN quando nada passou da nota mínima
+    n_nomes = len(nomes)
+    melhor_linha = np.full(n_nomes, -1, dtype=np.int64)
+    melhor_nota = np.full(n_nomes, np.nan)
+    if not n_nomes or not len(alvo.palavras):
+        return melhor_linha, melhor_nota
+
+    tokens = pd.Series(list(nomes), dtype=object).str.findall(PALAVRA.pattern).explode().dropna()
+    pares = pd.DataFrame({'nome': tokens.index.to_numpy(np.int64), 'palavra': tokens.to_numpy()})
+    pares = pares.drop_duplicates()
+    nome = pares['nome'].to_numpy()
+    ids = alvo.vocabulario.get_indexer(pares['palavra'].to_numpy())
+    conhecida = ids >= 0
+    peso = np.where(conhecida, alvo.idf[np.maximum(ids, 0)], PESO_AUSENTE)
+    peso_nome = np.bincount(nome, weights=peso, minlength=n_nomes)
+
+    # Chaves de bloco: as palavras conhecidas mais raras de cada nome
+    documentos = alvo.documentos[np.maximum(ids, 0)]
+    bloqueia = conhecida & (documentos <= MAX_BLOCO) & (alvo.tamanhos[np.maximum(ids, 0)] >= TAMANHO_MINIMO)
+    chave_nome, chave_id, chave_docs = nome[bloqueia], ids[bloqueia], documentos[bloqueia]
+    ordem = np.lexsort((chave_id, chave_docs, chave_nome))
+    chave_nome, chave_id = chave_nome[ordem], chave_id[ordem]
+    inicio_nome = np.searchsorted(chave_nome, chave_nome, side='left')
+    fica = np.arange(len(chave_nome)) - inicio_nome < CHAVES_BLOCO
+    chave_nome, chave_id = chave_nome[fica], chave_id[fica]
+
+    # Pares (nome, linha) candidatos: as postings das chaves, sem repetição
+    offsets = np.asarray(alvo.palavras.offsets)
+    inicios = offsets[chave_id]
+    tamanhos = offsets[chave_id + 1] - inicios
+    linhas = np.asarray(alvo.palavras.linhas)[_expandir(inicios, tamanhos)].astype(np.int64)
+    representa = alvo.representante[linhas]
+    n_linhas = len(alvo.palavras)
+    candidatos = np.sort(np.repeat(chave_nome, tamanhos)[representa] * n_linhas + linhas[representa])
+    # Sem np.unique: a versão por hash do numpy 2 é bem mais lenta que ordenar
+    candidatos = candidatos[np.r_[True, candidatos[1:] != candidatos[:-1]]] if len(candidatos) else candidatos
+    if not len(candidatos):
+        return melhor_linha, melhor_nota
+    par_nome, par_linha = np.divmod(candidatos, n_linhas)
+
+    # Peso das palavras em comum: percorre as palavras de cada linha
+    # candidata e confere se o nome também as tem
+    tamanho_vocabulario = len(alvo.documentos)
+    chaves_nome = np.sort(nome[conhecida] * tamanho_vocabulario + ids[conhecida])
+    inicios = alvo.offsets_linha[par_linha]
+    tamanhos = alvo.offsets_linha[par_linha + 1] - inicios
+    palavra_linha = alvo.palavras_linha[_expandir(inicios, tamanhos)]
+    par = np.repeat(np.arange(len(candidatos)), tamanhos)
+    chave = par_nome[par] * tamanho_vocabulario + palavra_linha
+    pos = np.minimum(np.searchsorted(chaves_nome, chave), len(chaves_nome) - 1)
+    comum = chaves_nome[pos] == chave
+    peso_comum = np.bincount(par[comum], weights=alvo.idf[palavra_linha[comum]], minlength=len(candidatos))
+    notas = 2 * peso_comum / (peso_nome[par_nome] + alvo.peso_linha[par_linha])
+
+    # Melhor linha de cada nome: os candidatos vêm ordenados por (nome,
+    # linha), então é a primeira linha do grupo com a nota máxima
+    inicio_grupo = np.flatnonzero(np.r_[True, par_nome[1:] != par_nome[:-1]])
+    grupo = np.repeat(np.arange(len(inicio_grupo)), np.diff(np.r_[inicio_grupo, len(par_nome)]))
+    maxima = np.maximum.reduceat(notas, inicio_grupo)
+    empata = np.flatnonzero(notas == maxima[grupo])
+    escolhido = empata[np.r_[True, grupo[empata][1:] != grupo[empata][:-1]]]
+    passa = notas[escolhido] >= nota_minima
+    melhor_linha[par_nome[escolhido[passa]]] = par_linha[escolhido[passa]]
+    melhor_nota[par_nome[escolhido[passa]]] = notas[escolhido[passa]]
+    return melhor_linha, melhor_nota
+
+
+def normalizar_nomes(serie):
+    # Chave do vínculo: nome sem acento/maiúscula e com espaços simples
+    return normalizar_serie(serie).str.replace(r'\s+', ' ', regex=True).str.strip()
+
+
+def vincular(nomes, alvos, nota_minima=NOTA_MINIMA):
+    # DataFrame com uma linha por nome normalizado distinto e, por catálogo,
+    # a linha casada, a chave (EAN no CMED, código no CATSER) e a nota
+    nomes = pd.Index(nomes).dropna().unique()
+    nomes = nomes[nomes != '']
+    saida = pd.DataFrame({'chave': nomes.to_numpy(dtype=object)})
+    for alvo in alvos:
+        linha = np.full(len(nomes), -1, dtype=np.int64)
+        nota = np.full(len(nomes), np.nan)
+        for inicio in range(0, len(nomes), LOTE):
+            fim = inicio + LOTE
+            linha[inicio:fim], nota[inicio:fim] = vincular_nomes(nomes[inicio:fim], alvo, nota_minima)
+        prefixo = alvo.nome.lower()
+        achou = linha >= 0
+        tabela = alvo.df.iloc[np.where(achou, linha, 0)]
+        saida[f"{prefixo}_linha"] = linha
+        coluna_chave = COLUNA_CHAVE[alvo.nome]
+        chave = pd.to_numeric(tabela[coluna_chave].to_numpy(), errors='coerce')
+        saida[f"{prefixo}_{coluna_chave}"] = pd.array(chave, dtype='Int64')
+        saida.loc[~achou, f"{prefixo}_{coluna_chave}"] = pd.NA
+        saida[f"{prefixo}_nota"] = nota.round(4)
+    return saida
+
+
+def geracao_alvos(pasta=PASTA_PADRAO):
+    return '_'.join(assinatura_arquivo(os.path.join(pasta, CATALOGOS[nome][0])) for nome in ALVOS)
+
+
+def carregar_vinculos(pasta=PASTA_VINCULOS, geracao=None):
+    # Vínculos da geração atual dos catálogos (DataFrame vazio se não houver)
+    geracao = geracao or geracao_alvos()
+    base = os.path.join(pasta, geracao)
+    segmentos = sorted(s for s in os.listdir(base) if not s.startswith('.tmp-')) if os.path.isdir(base) else []
+    partes = [ler_snapshot(os.path.join(base, s)) for s in segmentos]
+    if not partes:
+        return pd.DataFrame(columns=['chave'])
+    return pd.concat(partes, ignore_index=True)
+
+
+def nomes_historico(pasta=PASTA_HISTORICO):
+    # Nomes normalizados distintos do histórico, lendo só a coluna item_nome
+    # de um segmento por vez
+    nomes = pd.Index([], dtype=object)
+    for mes in sorted(os.listdir(pasta)) if os.path.isdir(pasta) else []:
+        for uf in sorted(os.listdir(os.path.join(pasta, mes))):
+            particao = os.path.join(pasta, mes, uf)
+            for segmento in segmentos_particao(particao):
+                try:
+                    coluna = ler_snapshot(os.path.join(particao, segmento), ['item_nome'])['item_nome']
+                except FileNotFoundError:
+                    continue
+                unicos = pd.Series(pd.unique(coluna.dropna().to_numpy(dtype=object)), dtype=object)
+                nomes = nomes.append(pd.Index(normalizar_nomes(unicos).to_numpy(dtype=object))).unique()
+    return nomes
+
+
+def atualizar(pasta_historico=PASTA_HISTORICO, pasta=PASTA_VINCULOS, nota_minima=NOTA_MINIMA):
+    # Vincula os nomes do histórico que ainda não têm vínculo na geração
+    # atual dos catálogos; devolve (nomes novos, total de vínculos)
+    geracao = geracao_alvos()
+    base = os.path.join(pasta, geracao)
+    if os.path.isdir(pasta):
+        for antiga in os.listdir(pasta):
+            if antiga != geracao:
+                shutil.rmtree(os.path.join(pasta, antiga), ignore_errors=True)
+    existentes = carregar_vinculos(pasta, geracao)
+    nomes = nomes_historico(pasta_historico)
+    novos = nomes.difference(pd.Index(existentes['chave'].astype(object)), sort=False)
+    if len(novos):
+        alvos = [carregar_alvo(nome) for nome in ALVOS]
+        df = vincular(novos, alvos, nota_minima)
+        nome = f"{time.time_ns():x}-{os.getpid()}-{next(_contador)}"
+        temporaria = os.path.join(base, f".tmp-{nome}")
+        gravar_snapshot(df, temporaria, categoricas=set())
+        with open(os.path.join(temporaria, 'parametros.json'), 'w', encoding='utf-8') as f:
+            json.dump({'nota_minima': nota_minima, 'chaves_bloco': CHAVES_BLOCO, 'max_bloco': MAX_BLOCO,
+                       'peso_ausente': PESO_AUSENTE}, f)
+        os.rename(temporaria, os.path.join(base, nome))
+    return len(novos), len(existentes) + len(novos)
+
+
+def anexar_vinculos(df, vinculos, cmed=None):
+    # Junta às linhas do histórico (coluna item_nome) os vínculos pelo nome
+    # normalizado. Com o DataFrame do CMED, traz também a faixa do pmvg das
+    # apresentações com o texto vinculado e, nas cotações por embalagem,
+    # marca as acima do maior pmvg (acima do teto de qualquer apresentação);
+    # nas demais acima_pmvg fica vazio
+    chave = normalizar_nomes(df['item_nome'].astype(object))
+    saida = df.reset_index(drop=True).copy()
+    tabela = vinculos.drop_duplicates('chave').set_index('chave')
+    posicao = tabela.index.get_indexer(chave)
+    achou = posicao >= 0
+    for col in tabela.columns:
+        valores = tabela[col].iloc[np.maximum(posicao, 0)].reset_index(drop=True)
+        saida[col] = valores.where(achou)
+    if cmed is not None and 'cmed_linha' in tabela.columns:
+        linha = saida['cmed_linha'].fillna(-1).astype(np.int64).to_numpy()
+        vinculada = linha >= 0
+        texto, _ = pd.factorize(pd.Series(textos_catalogo(cmed, CATALOGOS['CMED'][1])))
+        pmvg = converter_serie(cmed['pmvg'])[0].to_numpy(np.float64)
+        faixa = pd.DataFrame({'texto': texto, 'pmvg': pmvg}).groupby('texto')['pmvg'].agg(['min', 'max', 'count'])
+        grupo = texto[np.maximum(linha, 0)]
+        for col in ('min', 'max'):
+            saida[f'cmed_pmvg_{col}'] = np.where(vinculada, faixa[col].to_numpy()[grupo], np.nan)
+        saida['cmed_apresentacoes'] = np.where(vinculada, faixa['count'].to_numpy()[grupo], 0)
+        teto = saida['cmed_pmvg_max'].to_numpy()
+        unidade = normalizar_nomes(saida.get('unidade', pd.Series('', index=saida.index)).astype(object))
+        embalagem = unidade.str.match(UNIDADE_EMBALAGEM).fillna(False).to_numpy(bool)
+        comparavel = vinculada & embalagem & ~np.isnan(teto)
+        acima = pd.array(saida['valor_unitario'].to_numpy(np.float64) > teto, dtype='boolean')
+        acima[~comparavel] = pd.NA
+        saida['acima_pmvg'] = acima
+    return saida
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vínculos dos itens do PNCP com CMED (EAN) e CATSER (código)")
+    parser.add_argument('--historico', default=PASTA_HISTORICO)
+    parser.add_argument('--pasta', default=PASTA_VINCULOS)
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p = sub.add_parser('atualizar', help="vincula os nomes do histórico ainda sem vínculo")
+    p.add_argument('--nota-minima', type=float, default=NOTA_MINIMA)
+
+    p = sub.add_parser('teto', help="cotações por embalagem acima do pmvg do CMED vinculado")
+    p.add_argument('termo', nargs='?', help="trecho do nome do item")
+    p.add_argument('--uf', action='append', type=str.upper)
+    p.add_argument('--desde', help="AAAA-MM-DD")
+    p.add_argument('-o', '--saida', help="grava as linhas em .csv")
+    args = parser.parse_args(argv)
+
+    if args.comando == 'atualizar':
+        inicio = time.perf_counter()
+        novos, total = atualizar(args.historico, args.pasta, args.nota_minima)
+        print(f"{novos} nomes novos vinculados em {time.perf_counter() - inicio:.1f}s ({total} no total).")
+        vinculos = carregar_vinculos(args.pasta)
+        for nome in ALVOS:
+            coluna = f"{nome.lower()}_linha"
+            if coluna in vinculos.columns:
+                print(f"- {nome}: {int((vinculos[coluna] >= 0).sum())} nomes vinculados")
+        return 0
+
+    vinculos = carregar_vinculos(args.pasta)
+    if vinculos.empty:
+        print("Nenhum vínculo na geração atual dos catálogos; rode 'atualizar' antes.")
+        return 1
+    df = consultar(args.termo, args.desde, None, args.uf, pasta=args.historico)
+    cmed = ler_planilha(os.path.join(PASTA_PADRAO, CATALOGOS['CMED'][0]))
+    df = anexar_vinculos(df, vinculos, cmed)
+    acima = df[df['acima_pmvg'].fillna(False)]
+    print(f"{len(df)} linhas, {int(df['cmed_linha'].ge(0).sum())} vinculadas ao CMED, "
+          f"{int(df['acima_pmvg'].notna().sum())} cotadas por embalagem, {len(acima)} acima do pmvg.")
+    if len(acima):
+        print(acima[['data_publicacao', 'uf', 'item_nome', 'unidade', 'valor_unitario', 'cmed_pmvg_min',
+                     'cmed_pmvg_max', 'cmed_nota']].head(20).to_string(index=False))
+    if args.saida:
+        acima.to_csv(args.saida, index=False, encoding='utf-8-sig')
+        print(f"Linhas gravadas em {args.saida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())